@@ -0,0 +1,286 @@
+'''
+    Microbenchmarks for the pure-Python hot paths of the mining game.
+
+    Runs offline: nothing here talks to Discord or the database. Every benchmark
+    is timed over representative inputs and compared against the stored baseline.
+
+    Usage (from the repository root):
+        python -m benchmarks.hot_paths                  Compare against baseline.json
+        python -m benchmarks.hot_paths --save           Record a new baseline
+        python -m benchmarks.hot_paths --threshold 0.5  Allow 50% slowdown before failing
+        python -m benchmarks.hot_paths -k stats         Only run benchmarks matching "stats"
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+from collections import defaultdict
+from copy import copy
+
+from data.catalog import get_catalog
+from data.caves import Cave
+from data.equipment import Equipment
+from data.rows import EquipmentRow
+from data.shop import Shop
+from data.stats import get_total_stats_batch
+from data.user import User
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_THRESHOLD = 0.25
+LUCK_VALUES = [0, 25, 100, 350, 1000]
+EXP_VALUES = [0, 1, 164, 165, 5000, 123456, 10 ** 7, 10 ** 9]
+
+
+def _max_bonus(base_equipment):
+    # A fresh equipment at 5 lines always rerolls into 5 lines.
+    return Equipment.get_bonus_for_weapon(base_equipment['name'], 5)
+
+
+def build_loadouts():
+    '''
+        Returns a list of equipment lists, one per loadout.
+        Each set gets a loadout with every piece of the set equipped at max stars with 5 line bonuses,
+        plus a loadout of set-less gear and a large mixed inventory.
+    '''
+    by_set = defaultdict(dict)
+    for e in get_catalog().equipment:
+        by_set[e['set']].setdefault(e['type'].value, e)
+    loadouts = []
+    instance_id = 0
+    for pieces in by_set.values():
+        equipment_list = []
+        for location, base_equipment in pieces.items():
+            instance_id += 1
+            equipment_list.append(EquipmentRow(
+                equipment_instance_id=instance_id,
+                equipment_id=base_equipment['id'],
+                user_id=0,
+                location=location,
+                bonus=_max_bonus(base_equipment),
+                stars=base_equipment['max_stars'],
+                updated_at=None))
+        loadouts.append(equipment_list)
+    inventory = []
+    for base_equipment in get_catalog().equipment:
+        instance_id += 1
+        inventory.append(EquipmentRow(
+            equipment_instance_id=instance_id,
+            equipment_id=base_equipment['id'],
+            user_id=0,
+            location='inventory',
+            bonus=_max_bonus(base_equipment),
+            stars=base_equipment['max_stars'],
+            updated_at=None))
+    loadouts.append(loadouts[0] + inventory)
+    return loadouts
+
+
+def build_benchmarks():
+    '''
+        Returns a mapping of benchmark name to a zero argument callable.
+        Each callable runs its function once over every representative input.
+    '''
+    random.seed(0)
+    loadouts = build_loadouts()
+    # Copies with a huge quantity so limited caves stay on their decrementing path without running dry.
+    caves = []
+    for cave in get_catalog().caves:
+        cave = copy(cave)
+        if cave['current_quantity'] > 0:
+            cave['current_quantity'] = sys.maxsize
+        caves.append(Cave(cave))
+    equipped_names = [
+        (equipment_list, Equipment.get_equipment_from_id(e.equipment_id)['name'])
+        for equipment_list in loadouts
+        for e in equipment_list
+        if e.location != 'inventory'
+    ]
+    set_counts = [
+        (set_name, count)
+        for set_name, bonuses in get_catalog().sets.items()
+        for count in range(len(bonuses) + 1)
+    ]
+    max_stars = max(e['max_stars'] for e in get_catalog().equipment)
+    # Every loadout once per user, as one batch of rows.
+    batch_user_ids = list(range(len(loadouts)))
+    batch_rows = [
+        e._replace(user_id=user_id) for user_id, equipment_list in enumerate(loadouts) for e in equipment_list]
+    batch_blessings = {user_id: 10 for user_id in batch_user_ids}
+
+    def total_stats():
+        for equipment_list in loadouts:
+            User.get_total_stats(None, equipment_list, 10)
+
+    def total_stats_batch():
+        get_total_stats_batch(batch_user_ids, batch_rows, batch_blessings)
+
+    def mine_cave():
+        for cave in caves:
+            for luck in LUCK_VALUES:
+                cave.mine_cave(luck)
+
+    def exp_to_level():
+        for exp in EXP_VALUES:
+            User.exp_to_level(exp)
+
+    def exp_to_levels():
+        User.exp_to_levels(EXP_VALUES)
+
+    def level_to_exp():
+        for level in range(0, 120, 7):
+            User.level_to_exp(level)
+
+    def exp_bar():
+        for exp in EXP_VALUES:
+            User.get_exp_bar(exp)
+
+    def star_bonus():
+        for stars in range(max_stars + 1):
+            Equipment.get_star_bonus(stars)
+
+    def bonus_for_weapon():
+        for base_equipment in get_catalog().equipment:
+            for lines in range(6):
+                Equipment.get_bonus_for_weapon(base_equipment['name'], lines)
+
+    def equipment_stats_str():
+        for equipment_list, name in equipped_names:
+            User.get_equipment_stats_str(equipment_list, name)
+
+    def equipped_gear_str():
+        for equipment_list in loadouts:
+            User.get_equipped_gear_str(equipment_list)
+
+    def inventory_list():
+        for equipment_list in loadouts:
+            User.get_inventory_list(equipment_list)
+
+    def set_bonus_str():
+        for set_name, count in set_counts:
+            Equipment.get_set_bonus_str(set_name, count)
+
+    def base_equipment_stats_str():
+        for base_equipment in get_catalog().equipment:
+            Equipment.get_base_equipment_stats_str(base_equipment['name'])
+
+    def caves_by_level():
+        for level in (0, 10, 50, 100):
+            Cave.list_caves_by_level(level)
+
+    def shop_str_list():
+        Shop.get_shop_str_list()
+
+    return {
+        'user.get_total_stats': total_stats,
+        'stats.get_total_stats_batch': total_stats_batch,
+        'cave.mine_cave': mine_cave,
+        'user.exp_to_level': exp_to_level,
+        'user.exp_to_levels': exp_to_levels,
+        'user.level_to_exp': level_to_exp,
+        'user.get_exp_bar': exp_bar,
+        'equipment.get_star_bonus': star_bonus,
+        'equipment.get_bonus_for_weapon': bonus_for_weapon,
+        'user.get_equipment_stats_str': equipment_stats_str,
+        'user.get_equipped_gear_str': equipped_gear_str,
+        'user.get_inventory_list': inventory_list,
+        'equipment.get_set_bonus_str': set_bonus_str,
+        'equipment.get_base_equipment_stats_str': base_equipment_stats_str,
+        'cave.list_caves_by_level': caves_by_level,
+        'shop.get_shop_str_list': shop_str_list,
+    }
+
+
+def time_benchmark(func, repeat: int, min_time: float):
+    '''
+        Returns the best time in microseconds for one call of func.
+        The loop count is scaled so a single measurement takes at least min_time seconds.
+    '''
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def load_baseline(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: dict):
+    baseline = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results_us': {name: round(value, 3) for name, value in results.items()},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=4, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    '''
+        Returns a list of (name, baseline_us, current_us) for every benchmark slower than its
+        baseline by more than threshold (0.25 is 25%).
+    '''
+    regressions = []
+    for name, current in results.items():
+        previous = baseline['results_us'].get(name)
+        if previous is not None and current > previous * (1 + threshold):
+            regressions.append((name, previous, current))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pure-Python hot paths.')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline file to compare with or save to.')
+    parser.add_argument('--save', action='store_true', help='Save the results as the new baseline.')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=float(os.getenv('BENCH_THRESHOLD', DEFAULT_THRESHOLD)),
+        help='Allowed slowdown as a fraction of the baseline before failing. (default: 0.25)')
+    parser.add_argument('--repeat', type=int, default=5, help='Measurements per benchmark, best is kept.')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Minimum seconds per measurement.')
+    parser.add_argument('-k', dest='keyword', default='', help='Only run benchmarks containing this keyword.')
+    args = parser.parse_args(argv)
+
+    benchmarks = build_benchmarks()
+    results = {}
+    for name, func in benchmarks.items():
+        if args.keyword in name:
+            results[name] = time_benchmark(func, args.repeat, args.min_time)
+
+    baseline = load_baseline(args.baseline)
+    for name, value in results.items():
+        line = f'{name:<42} {value:>12.2f} us'
+        if baseline and name in baseline['results_us']:
+            change = value / baseline['results_us'][name] - 1
+            line += f'  ({change:+.1%})'
+        print(line)
+
+    if args.save:
+        if baseline and args.keyword:
+            baseline['results_us'].update(results)
+            results = baseline['results_us']
+        save_baseline(args.baseline, results)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+    if baseline is None:
+        print(f'No baseline at {args.baseline}. Run with --save to create one.')
+        return 0
+    if baseline.get('python') != platform.python_version() or baseline.get('machine') != platform.machine():
+        print(f'Warning: baseline was recorded on Python {baseline.get("python")} ({baseline.get("machine")}).')
+    regressions = compare(results, baseline, args.threshold)
+    for name, previous, current in regressions:
+        print(f'REGRESSION {name}: {previous:.2f} us -> {current:.2f} us (threshold {args.threshold:.0%})')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
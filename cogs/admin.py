@@ -1,10 +1,15 @@
 import discord
+import typing
 from discord.ext import commands
 import util.dbutil as db
+import util.guild_members as guild_members
+from data.enums import GrantOutcome
 from data.equipment import Equipment
 from data.caves import Cave
-from data.user import User
 from data.blacklist import blacklist as bl
+import util.metrics as metrics
+from util.cadence import cadence
+from util.cave_stats import cave_stats
 
 
 class Admin(commands.Cog):
@@ -31,17 +36,73 @@ class Admin(commands.Cog):
         elif type.lower() == 'equipment':
             base_equipment = Equipment.get_equipment_from_id(value)
             if base_equipment:
-                equipment_list = await db.get_equipment_for_user(ctx.author.id)
-                equipment = User.get_equipment_from_id(equipment_list, value)
-                if equipment:
-                    if equipment['stars'] < base_equipment['max_stars']:
-                        await db.update_equipment_stars(ctx.author.id, value, 1)
-                else:
-                    await db.insert_equipment(user.id, value, 'inventory')
-                    await ctx.send('Given.')
+                outcome, stars = await db.grant_equipment(
+                    user.id,
+                    value,
+                    base_equipment['max_stars'],
+                    base_equipment['value'])
+                await ctx.send(f'Given. ({outcome.value}, {stars} stars)')
             else:
                 await ctx.send('Invalid equipment.')
 
+    @staticmethod
+    async def get_target_ids(guild, targets):
+        '''
+            Returns the set of user ids of the members and the members of the roles in targets.
+            The string "guild" targets every member of the guild.
+        '''
+        user_ids = set()
+        roles = set()
+        for target in targets:
+            if isinstance(target, discord.Member):
+                user_ids.add(target.id)
+            elif isinstance(target, discord.Role):
+                roles.add(target.id)
+            else:
+                user_ids.update(await guild_members.load_guild(guild))
+        if roles and guild.chunked:
+            for role_id in roles:
+                user_ids.update(m.id for m in guild.get_role(role_id).members)
+        elif roles:
+            # Without a full member cache the member list is requested once and not kept.
+            members = await guild.chunk(cache=False) or []
+            user_ids.update(m.id for m in members if any(r.id in roles for r in m.roles))
+        return user_ids
+
+    @commands.command(name='give-bulk')
+    @commands.guild_only()
+    @commands.check(check_if_me)
+    async def give_bulk(self, ctx, type: str, value: int, *targets: typing.Union[discord.Member, discord.Role, str]):
+        if not targets:
+            await ctx.send('Give to whom? Mention members or roles, or use guild.')
+            return
+        unknown = [t for t in targets if isinstance(t, str) and t.lower() != 'guild']
+        if unknown:
+            await ctx.send(f'Unknown targets: {", ".join(unknown)}')
+            return
+        user_ids = list(await Admin.get_target_ids(ctx.guild, targets))
+        if type.lower() in ('gold', 'exp'):
+            with metrics.timed('admin.give_bulk'):
+                updated, created = await db.bulk_update_users(user_ids, type.lower(), value)
+            await ctx.send(f'Given {value} {type.lower()} to {updated} users ({created} new).')
+        elif type.lower() == 'equipment':
+            base_equipment = Equipment.get_equipment_from_id(value)
+            if base_equipment:
+                with metrics.timed('admin.give_bulk'):
+                    outcomes = await db.bulk_grant_equipment(
+                        user_ids,
+                        value,
+                        base_equipment['max_stars'],
+                        base_equipment['value'])
+                await ctx.send(
+                    f'Given {base_equipment["name"]} to {len(user_ids)} users. '
+                    f'({outcomes[GrantOutcome.NEW]} new, {outcomes[GrantOutcome.STAR]} stars, '
+                    f'{outcomes[GrantOutcome.REFUND]} refunded)')
+            else:
+                await ctx.send('Invalid equipment.')
+        else:
+            await ctx.send('Type must be gold, exp or equipment.')
+
     @commands.command(name='blacklist')
     @commands.check(check_if_me)
     async def blacklist(self, ctx, user: discord.Member):
@@ -64,11 +125,90 @@ class Admin(commands.Cog):
         Cave.populate_caves()
         await ctx.send('Caves reset.')
 
+    @commands.command(name='metrics')
+    @commands.check(check_if_me)
+    async def metrics(self, ctx, prefix: str = ''):
+        paginator = commands.Paginator(prefix='```', suffix='```', max_size=1900)
+        for line in metrics.snapshot(prefix) or ['No metrics recorded.']:
+            paginator.add_line(line)
+        for page in paginator.pages:
+            await ctx.send(page)
+
+    @commands.command(name='cadence')
+    @commands.check(check_if_me)
+    async def cadence(self, ctx, user: discord.User = None):
+        if user is not None:
+            await ctx.send(f'{user}: {cadence.score(user.id)}')
+            return
+        paginator = commands.Paginator(prefix='```', suffix='```', max_size=1900)
+        for user_id, score in cadence.top(20):
+            flag = ' SUSPICIOUS' if score.suspicious else ''
+            paginator.add_line(f'{user_id}: {score}{flag}')
+        if not cadence.histories:
+            paginator.add_line('No mines recorded.')
+        for page in paginator.pages:
+            await ctx.send(page)
+
+    @commands.command(name='cavestats')
+    @commands.check(check_if_me)
+    async def cavestats(self, ctx, *, cave_name: str = ''):
+        paginator = commands.Paginator(prefix='```', suffix='```', max_size=1900)
+        if cave_name:
+            match = Cave.match_name(cave_name)
+            if match.name is None:
+                await ctx.send(f'There is no cave named {cave_name}. {match.did_you_mean()}'.strip())
+                return
+            lines = cave_stats.details(match.name, Cave.drop_weights)
+        else:
+            lines = cave_stats.summary()
+        for line in lines:
+            paginator.add_line(line)
+        for page in paginator.pages:
+            await ctx.send(page)
+
+    @commands.command(name='prefix')
+    @commands.guild_only()
+    async def prefix(self, ctx, prefix: str = ''):
+        if not prefix:
+            await ctx.send(f'The prefix of this server is `{self.client.prefixes.get(ctx.guild.id)}`.')
+            return
+        if not ctx.author.guild_permissions.manage_guild:
+            await ctx.send('You need the Manage Server permission to change the prefix.')
+            return
+        if prefix.lower() == 'reset':
+            await self.client.prefixes.reset(ctx.guild.id)
+        else:
+            problem = self.client.prefixes.validate(prefix)
+            if problem:
+                await ctx.send(problem)
+                return
+            await self.client.prefixes.set(ctx.guild.id, prefix)
+        await ctx.send(f'The prefix of this server is now `{self.client.prefixes.get(ctx.guild.id)}`.')
+
+    @commands.command(name='jobs')
+    @commands.check(check_if_me)
+    async def jobs(self, ctx):
+        paginator = commands.Paginator(prefix='```', suffix='```', max_size=1900)
+        for job in self.client.scheduler.jobs.values():
+            state = 'running' if job.running else 'idle'
+            paginator.add_line(f'{job.name}: {state}, next {job.next_run:%Y-%m-%d %H:%M:%S} UTC, last {job.last_run}')
+        if not self.client.scheduler.jobs:
+            paginator.add_line('No jobs scheduled.')
+        for page in paginator.pages:
+            await ctx.send(page)
+
     @give.error
     async def give_error(self, ctx, error):
         if isinstance(error, commands.errors.MemberNotFound):
             await ctx.send('Not a member.')
 
+    @give_bulk.error
+    async def give_bulk_error(self, ctx, error):
+        if isinstance(error, commands.BadArgument):
+            await ctx.send(str(error))
+        else:
+            print(error)
+
     @blacklist.error
     async def blacklist_error(self, ctx, error):
         if isinstance(error, commands.errors.MemberNotFound):
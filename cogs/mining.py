@@ -1,8 +1,10 @@
 import discord
 import asyncio
+import typing
 from discord.ext import commands
 import random
 from data.caves import Cave, Drop
+from data.enums import GrantOutcome
 from data.equipment import Equipment
 from data.user import User
 from util.custom_cooldown_mapping import CustomCooldownMapping
@@ -10,13 +12,77 @@ import util.dbutil as db
 from collections import Counter
 from data.blacklist import blacklist
 from util.menu import PageMenu, ConfirmationMenu
-from datetime import datetime
-import pytz
+from data.modifiers import Modifiers
+from util.scheduler import Scheduler
+import util.guild_members as guild_members
+from util.guild_members import TTLCache
+from util.names import NameResolver
+import util.metrics as metrics
+from util.user_locks import user_locks
+from util.edits import edits
+from util.cadence import cadence
+from util.cave_stats import cave_stats
+from util.digest import Digests, DEFAULT_WINDOW, TICK as DIGEST_TICK
+
+BONUS_COST = 1000
+MAX_BONUS_ROLLS = 100
+# UTC hours at which limited caves are refilled to their max quantity.
+CAVE_REFILL_HOURS = {0}
+LEADERBOARD_SIZE = 50
+# Chance of a monster challenge after a mine, for accounts util.cadence finds suspicious and for the rest.
+SUSPICIOUS_MONSTER_ODDS = 0.25
+MONSTER_ODDS = 0.005
+# Seconds a server leaderboard is reused before it is queried again.
+GUILD_LEADERBOARD_TTL = 60
+# Seconds between attempts to load the digest channels, until one succeeds.
+DIGEST_LOAD_RETRY = 30
+BONUS_KEEP_DESCRIPTIONS = {
+    'latest': 'latest bonus',
+    'lines': 'bonus with the most lines',
+}
 
 
 class Mining(commands.Cog):
     def __init__(self, client):
         self.client = client
+        self.names = NameResolver(client)
+        self.digests = Digests(client)
+        Modifiers.update_happy_hour(Scheduler.now())
+        self.client.scheduler.cron('happy-hour', self.update_happy_hour, minute=0)
+        self.client.scheduler.cron('refill-caves', self.refill_caves, minute=0, hours=CAVE_REFILL_HOURS)
+        self.client.scheduler.every('sweep-guild-cache', GUILD_LEADERBOARD_TTL, self.sweep_guild_cache)
+        self.client.scheduler.every('flush-digests', DIGEST_TICK, self.digests.flush)
+        # Retried until the digest channels are loaded. The scheduler prints and counts failures.
+        self.client.scheduler.every('load-digests', DIGEST_LOAD_RETRY, self.load_digests, run_now=True)
+        self.client.scheduler.every('sweep-cadence', 3600, self.sweep_cadence)
+        # Guilds that were already available when the cog was (re)loaded.
+        for guild in self.client.guilds:
+            if guild_members.get(guild.id) is None:
+                guild_members.add_guild(guild)
+
+    def cog_unload(self):
+        self.client.scheduler.remove('happy-hour')
+        self.client.scheduler.remove('refill-caves')
+        self.client.scheduler.remove('sweep-guild-cache')
+        self.client.scheduler.remove('flush-digests')
+        self.client.scheduler.remove('load-digests')
+        self.client.scheduler.remove('sweep-cadence')
+
+    async def update_happy_hour(self):
+        Modifiers.update_happy_hour(Scheduler.now())
+
+    async def refill_caves(self):
+        Cave.populate_caves()
+
+    async def sweep_guild_cache(self):
+        TTLCache.sweep()
+
+    async def load_digests(self):
+        await self.digests.load()
+        self.client.scheduler.remove('load-digests')
+
+    async def sweep_cadence(self):
+        cadence.sweep()
 
     monster_failures = Counter()
 
@@ -24,83 +90,145 @@ class Mining(commands.Cog):
         def __init__(self):
             async def mining_cooldown(message):
                 equipment_list = await db.get_equipment_for_user(message.author.id)
-                total_stats = User.get_total_stats(message.author.id, equipment_list)
-                speed = total_stats['speed']
-                cooldown = max(10 - 10 * (speed / 500), 3)
-                return commands.Cooldown(1, cooldown, commands.BucketType.user)
+                return commands.Cooldown(1, self.get_cooldown(equipment_list), commands.BucketType.user)
             self.mapping = CustomCooldownMapping(mining_cooldown)
+            # Users whose cached cooldown was computed from an older catalog.
+            self.stale = set()
+
+        @staticmethod
+        def get_cooldown(equipment_list):
+            total_stats = User.get_total_stats(None, equipment_list)
+            speed = total_stats['speed']
+            return max(10 - 10 * (speed / 500), 3)
+
+        def refresh(self, user_id, equipment_list):
+            self.mapping.update_per(user_id, self.get_cooldown(equipment_list))
+            self.stale.discard(user_id)
+
+        def mark_stale(self):
+            '''
+                Has every cached cooldown recomputed on its user's next ;mine, keeping the current windows.
+            '''
+            self.stale.update(self.mapping.keys())
+
+        def get_per(self, user_id):
+            return self.mapping.get_per(user_id) or 0.0
 
         async def __call__(self, ctx: commands.Context):
+            if ctx.author.id in self.stale:
+                self.refresh(ctx.author.id, await db.get_equipment_for_user(ctx.author.id))
             bucket = await self.mapping.get_bucket(ctx.message)
             retry_after = bucket.update_rate_limit()
             if retry_after:
                 raise commands.CommandOnCooldown(bucket, retry_after)
             return True
 
+    mining_cooldown = MiningCooldown()
+
+    @commands.Cog.listener()
+    async def on_catalog_reload(self, old, new):
+        # Cached cooldowns were computed from the old equipment stats.
+        self.mining_cooldown.mark_stale()
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        guild_members.add_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        guild_members.add_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        guild_members.remove_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        if channel.id in self.digests.channels:
+            await self.digests.forget_channel(channel.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        guild_members.add_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        guild_members.remove_member(member.guild.id, member.id)
+
     @commands.command(name='mine')
-    @commands.check(MiningCooldown())
+    @commands.check(mining_cooldown)
     async def mine(self, ctx):
         message_embed = discord.Embed(title='Mine!', color=discord.Color.dark_orange())
         if ctx.author.id in blacklist:
             message_embed.description = 'You are blacklisted.'
             await ctx.send(embed=message_embed)
             return
-        user = await db.get_user(ctx.author.id)
-        cave = Cave.from_cave_name(user['cave'])
-        if cave.cave['current_quantity'] == 0:
-            message_embed.description = f'{cave.cave["name"]} cannot be mined anymore.'
-            await ctx.send(embed=message_embed)
-            return
-        equipment_list = await db.get_equipment_for_user(ctx.author.id)
-        total_stats = User.get_total_stats(ctx.author.id, equipment_list, user['blessings'])
-        drop_type, drop_value = cave.mine_cave(total_stats['luck'])
-        message_embed.description = f'**{ctx.author.mention} mined at {cave.cave["name"]} and found:**\n'
-        m = 1  # multiplier
-        odds = random.randrange(100)
-        if odds <= total_stats['crit'] * 0.25:
-            m *= 2
-            message_embed.description += 'Critical mine! Extra exp gained.\n'
-        if datetime.now(pytz.utc).hour == 23:
-            m *= 2
-            message_embed.title = 'Happy Hour Mining!'
-        if cave.cave['exp'] > 0:
-            exp_gained = cave.cave['exp'] + total_stats['exp']
-            exp_gained *= m
-            exp_gained = int(exp_gained)
-            await db.update_user_exp(ctx.author.id, exp_gained)
-            message_embed.description += f'`{exp_gained} exp '
-            message_embed.description += f'({int(cave.cave["exp"] * m)} + {int(total_stats["exp"] * m)})`'
-            message_embed.description += '\n'
-        if drop_type == Drop.GOLD:
-            gold = drop_value + total_stats['power']
-            await db.update_user_gold(ctx.author.id, gold)
-            message_embed.description += f'`{gold} gold ({drop_value} + {total_stats["power"]})`\n'
-        elif drop_type == Drop.EQUIPMENT:
+        async with user_locks.hold(ctx.author.id):
+            user = await db.get_user(ctx.author.id)
+            cave = Cave.from_cave_name(user.cave)
+            if cave.current_quantity == 0:
+                message_embed.description = f'{cave.cave["name"]} cannot be mined anymore.'
+                await ctx.send(embed=message_embed)
+                return
             equipment_list = await db.get_equipment_for_user(ctx.author.id)
-            equipment = User.get_equipment_from_id(equipment_list, drop_value)
-            base_equipment = Equipment.get_equipment_from_id(drop_value)
-            if equipment:
-                if equipment['stars'] < base_equipment['max_stars']:
-                    await db.update_equipment_stars(ctx.author.id, drop_value, 1)
+            total_stats = User.get_total_stats(ctx.author.id, equipment_list, user.blessings)
+            drop_type, drop_value = cave.mine_cave(total_stats['luck'])
+            gold_emitted, exp_emitted, equipment_emitted = 0, 0, 0
+            message_embed.description = f'**{ctx.author.mention} mined at {cave.cave["name"]} and found:**\n'
+            m = 1  # multiplier
+            odds = random.randrange(100)
+            if odds <= total_stats['crit'] * 0.25:
+                m *= 2
+                message_embed.description += 'Critical mine! Extra exp gained.\n'
+            if Modifiers.happy_hour:
+                m *= 2
+                message_embed.title = 'Happy Hour Mining!'
+            if cave.cave['exp'] > 0:
+                exp_gained = cave.cave['exp'] + total_stats['exp']
+                exp_gained *= m
+                exp_gained = int(exp_gained)
+                exp_emitted += exp_gained
+                await db.update_user_exp(ctx.author.id, exp_gained)
+                message_embed.description += f'`{exp_gained} exp '
+                message_embed.description += f'({int(cave.cave["exp"] * m)} + {int(total_stats["exp"] * m)})`'
+                message_embed.description += '\n'
+            if drop_type == Drop.GOLD:
+                gold = drop_value + total_stats['power']
+                gold_emitted += gold
+                await db.update_user_gold(ctx.author.id, gold)
+                message_embed.description += f'`{gold} gold ({drop_value} + {total_stats["power"]})`\n'
+            elif drop_type == Drop.EQUIPMENT:
+                base_equipment = Equipment.get_equipment_from_id(drop_value)
+                outcome, stars = await db.grant_equipment(
+                    ctx.author.id,
+                    drop_value,
+                    base_equipment['max_stars'],
+                    base_equipment['value'])
+                equipment_emitted += 1
+                if outcome == GrantOutcome.STAR:
                     message_embed.description += f'`{base_equipment["name"]}. Equipment star level increased!`\n'
-                else:
+                elif outcome == GrantOutcome.REFUND:
+                    gold_emitted += base_equipment['value']
                     message_embed.description += f'`{base_equipment["name"]}. Equipment is already at max star level.'
                     message_embed.description += 'Gold recieved instead.`'
                     message_embed.description += f'\n`{base_equipment["value"]} gold`'
-                    await db.update_user_gold(ctx.author.id, base_equipment["value"])
-            else:
-                await db.insert_equipment(ctx.author.id, drop_value, 'inventory')
-                message_embed.description += f'`You mined a {base_equipment["name"]}!`\n'
-        elif drop_type == Drop.EXP:
-            exp_gained = drop_value + total_stats['exp']
-            exp_gained *= m
-            exp_gained = int(exp_gained)
-            await db.update_user_exp(ctx.author.id, exp_gained)
-            message_embed.description += f'`{exp_gained} exp ({int(drop_value * m)} + {int(total_stats["exp"] * m)})`\n'
-        await ctx.send(embed=message_embed)
-        # Monster attack to prevent automation.
-        odds = random.randrange(100)
-        if odds <= 5:
+                else:
+                    message_embed.description += f'`You mined a {base_equipment["name"]}!`\n'
+            elif drop_type == Drop.EXP:
+                exp_gained = drop_value + total_stats['exp']
+                exp_gained *= m
+                exp_gained = int(exp_gained)
+                exp_emitted += exp_gained
+                await db.update_user_exp(ctx.author.id, exp_gained)
+                message_embed.description += f'`{exp_gained} exp '
+                message_embed.description += f'({int(drop_value * m)} + {int(total_stats["exp"] * m)})`\n'
+            cave_stats.record_mine(cave.cave['name'], gold_emitted, exp_emitted, equipment_emitted)
+        if not self.digests.add_mine(ctx.channel, message_embed.description):
+            await ctx.send(embed=message_embed)
+        # Monster attack to prevent automation, mostly for accounts that mine like a script.
+        score = cadence.record(ctx.author.id, cooldown=self.mining_cooldown.get_per(ctx.author.id))
+        if random.random() < (SUSPICIOUS_MONSTER_ODDS if score.suspicious else MONSTER_ODDS):
+            metrics.increment('mining.monsters')
             emoji_list = ['🤡', '👹', '👽', '👾', '🤖', '👻', '💩']
             action_list = [emoji_list.pop(random.randrange(len(emoji_list))) for i in range(3)]
             correct_action = random.choice(action_list)
@@ -121,41 +249,49 @@ class Mining(commands.Cog):
                 if reaction.emoji != correct_action:
                     raise(asyncio.TimeoutError)
             except asyncio.TimeoutError:
-                await db.set_user_gold(ctx.author.id, int(user['gold'] * 0.9))
-                exp_lost = (user['exp'] - User.level_to_exp(User.exp_to_level(user['exp']))) * 0.1
-                await db.update_user_exp(ctx.author.id, -exp_lost)
+                # The penalty is taken from the user's state after the wait, not from before the mine.
+                async with user_locks.hold(ctx.author.id):
+                    user = await db.get_user(ctx.author.id)
+                    gold_lost = user.gold // 10
+                    exp_lost = int((user.exp - User.level_to_exp(User.exp_to_level(user.exp))) * 0.1)
+                    await db.update_user_gold(ctx.author.id, -gold_lost)
+                    await db.update_user_exp(ctx.author.id, -exp_lost)
                 message_embed.description = f'''
                     Ouch! You did not react correctly.
-                    You lost {int(user["gold"] * 0.9)} gold!
+                    You lost {gold_lost} gold!
                     You also lost {exp_lost} exp!'''
-                await message.edit(embed=message_embed)
+                edits.edit(message, embed=message_embed)
                 self.monster_failures[ctx.author.id] += 1
                 if self.monster_failures[ctx.author.id] >= 5:
                     blacklist[ctx.author.id] = True
             else:
                 message_embed.description = 'Whew! You defended yourself against the monster!'
-                await message.edit(embed=message_embed)
+                edits.edit(message, embed=message_embed)
                 self.monster_failures[ctx.author.id] = 0
 
     @commands.command(name='cave')
     async def cave(self, ctx, *, cave_name=''):
-        cave_name = cave_name.title()
+        match = Cave.match_name(cave_name)
+        cave_name = match.name or cave_name.title()
         user = await db.get_user(ctx.author.id)
-        cave = Cave.from_cave_name(user['cave'])
-        cave_quantity = cave.cave['current_quantity']
-        user_level = User.exp_to_level(user['exp'])
+        cave = Cave.from_cave_name(user.cave)
+        cave_quantity = cave.current_quantity
+        user_level = User.exp_to_level(user.exp)
         if cave_quantity == -1:
             cave_quantity = 'Infinite'
         message_embed = discord.Embed(title='Cave', color=discord.Color.dark_orange())
         to_cave = Cave.from_cave_name(cave_name)
         if cave_name and Cave.verify_cave(cave_name) and user_level >= to_cave.cave['level_requirement']:
-            await db.update_user_cave(ctx.author.id, cave_name)
+            async with user_locks.hold(ctx.author.id):
+                await db.update_user_cave(ctx.author.id, cave_name)
             message_embed.description = f'You have switched to {cave_name}.'
             await ctx.send(embed=message_embed)
         else:
             paginator = commands.Paginator('', '', 1800, '\n')
+            if match.suggestions:
+                paginator.add_line(match.did_you_mean())
             paginator.add_line(
-                f'''**Current Cave**: `{user["cave"]}`\n
+                f'''**Current Cave**: `{user.cave}`\n
                 **Remaining Mines:**`{cave_quantity}`\n
                 **__Available Caves:__**\n''')
             for cave in Cave.list_caves_by_level(user_level):
@@ -163,6 +299,47 @@ class Mining(commands.Cog):
             menu = PageMenu('Caves', discord.Color.dark_orange(), paginator.pages)
             await menu.start(ctx)
 
+    @commands.command(name='events')
+    async def events(self, ctx):
+        now = Scheduler.now()
+        message_embed = discord.Embed(title='Events', color=discord.Color.dark_orange())
+        active = Modifiers.active()
+        message_embed.description = '**__Active:__**\n'
+        message_embed.description += '\n'.join(f'`{modifier}`' for modifier in active) if active else '`None`'
+        next_happy_hour = Modifiers.next_happy_hour(now)
+        if next_happy_hour:
+            message_embed.description += f'\n**Next Happy Hour:** <t:{int(next_happy_hour.timestamp())}:R>'
+        next_refill = self.client.scheduler.next_run('refill-caves')
+        if next_refill:
+            message_embed.description += f'\n**Next Cave Refill:** <t:{int(next_refill.timestamp())}:R>'
+        await ctx.send(embed=message_embed)
+
+    @commands.command(name='digest')
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_channels=True)
+    async def digest(self, ctx, mode: str = '', channel: typing.Optional[discord.TextChannel] = None,
+                     seconds: int = DEFAULT_WINDOW):
+        channel = channel or ctx.channel
+        message_embed = discord.Embed(title='Digest', color=discord.Color.dark_orange())
+        if mode.lower() == 'on':
+            window = await self.digests.enable(ctx.guild.id, channel.id, seconds)
+            message_embed.description = f'Mine results in {channel.mention} are now summarized every {window} seconds.'
+        elif mode.lower() == 'off':
+            if await self.digests.disable(channel.id):
+                message_embed.description = f'Mine results in {channel.mention} are sent one by one again.'
+            else:
+                message_embed.description = f'{channel.mention} is not in digest mode.'
+        else:
+            channels = self.digests.get_guild_channels(ctx.guild.id)
+            message_embed.description = '**__Digest Channels:__**\n'
+            message_embed.description += '\n'.join(
+                f'<#{channel_id}>: every {window} seconds' for channel_id, window in channels.items()) or '`None`'
+            message_embed.description += (
+                f'\nUse `{ctx.prefix}digest on [channel] [seconds]` or `{ctx.prefix}digest off [channel]`.')
+            if not self.digests.loaded:
+                message_embed.description += '\nSaved digest channels are not loaded yet.'
+        await ctx.send(embed=message_embed)
+
     @commands.command(name='stats')
     async def stats(self, ctx, member: discord.Member = None):
         if not member:
@@ -173,13 +350,13 @@ class Mining(commands.Cog):
         user_stats = '\n'.join(
             [f'`{key}`: `{value}`'
                 for key, value
-                in User.get_total_stats(user, equipment_list, user['blessings']).items()])
+                in User.get_total_stats(user, equipment_list, user.blessings).items()])
         stats = f'''
-            `Level: {User.exp_to_level(user["exp"])}` \n
-            `{User.get_exp_bar(user["exp"])}`\n
-            `Total EXP: {user["exp"]}`\n
-            `Gold: {user["gold"]}` \n
-            `Blessings: {user["blessings"]}`\n
+            `Level: {user.level}` \n
+            `{User.get_exp_bar(user.exp)}`\n
+            `Total EXP: {user.exp}`\n
+            `Gold: {user.gold}` \n
+            `Blessings: {user.blessings}`\n
             **__Stats:__**\n
             {user_stats}
         '''
@@ -188,29 +365,32 @@ class Mining(commands.Cog):
 
     @commands.command(name='equip')
     async def equip(self, ctx, *, equipment_name):
-        equipment_name = equipment_name.title()
+        match = Equipment.match_name(equipment_name)
+        equipment_name = match.name or equipment_name.title()
         message_embed = discord.Embed(title='Equip', color=discord.Color.from_rgb(245, 211, 201))  # peachy color
-        equipment_list = await db.get_equipment_for_user(ctx.author.id)
-        equipment = User.get_equipment_from_name(equipment_list, equipment_name)
-        if equipment:
-            type = Equipment.get_equipment_from_name(equipment_name)['type'].value
-            current_in_location = User.get_equipment_in_location(equipment_list, type)
-            if current_in_location:
-                await db.update_equipment_location(ctx.author.id, current_in_location['equipment_id'], 'inventory')
-            await db.update_equipment_location(ctx.author.id, equipment['equipment_id'], type)
+        base_equipment = Equipment.get_equipment_from_name(equipment_name)
+        loadout = None
+        if base_equipment:
+            async with user_locks.hold(ctx.author.id):
+                loadout = await db.equip_equipment(ctx.author.id, base_equipment['id'], base_equipment['type'].value)
+                if loadout is not None:
+                    self.mining_cooldown.refresh(ctx.author.id, loadout)
+        if loadout is not None:
             message_embed.description = f'You have equipped your {equipment_name}'
         else:
-            message_embed.description = 'You do not have this equipment!'
+            message_embed.description = f'You do not have this equipment! {match.did_you_mean()}'
         await ctx.send(embed=message_embed)
 
     @commands.command(name='gear')
     async def gear(self, ctx, *, equipment_name=''):
-        equipment_name = equipment_name.title()
+        match = Equipment.match_name(equipment_name)
+        equipment_name = match.name or equipment_name.title()
         message_embed = discord.Embed(title='Gear', color=discord.Color.from_rgb(245, 211, 201))  # peachy color
         equipment_list = await db.get_equipment_for_user(ctx.author.id)
         gear_str = User.get_equipment_stats_str(equipment_list, equipment_name)
         if equipment_name and gear_str:
-            message_embed.color = Equipment.lines_to_color[User.get_lines_for_equipment(equipment_list, equipment_name)]
+            message_embed.color = discord.Color(
+                Equipment.lines_to_color[User.get_lines_for_equipment(equipment_list, equipment_name)])
             message_embed.description = gear_str
             file_name = equipment_name.replace(' ', '_') + '.png'
             try:
@@ -221,12 +401,14 @@ class Mining(commands.Cog):
             message_embed.set_thumbnail(url=f'attachment://{file_name}')
             await ctx.send(file=image_file, embed=message_embed)
         else:
-            message_embed.description = '**__Equipped Gear__**:\n' + User.get_equipped_gear_str(equipment_list)
+            message_embed.description = f'{match.did_you_mean()}\n' if match.suggestions else ''
+            message_embed.description += '**__Equipped Gear__**:\n' + User.get_equipped_gear_str(equipment_list)
             await ctx.send(embed=message_embed)
 
     @commands.command(name='inventory')
     async def inventory(self, ctx, *, equipment_name=''):
-        equipment_name = equipment_name.title()
+        match = Equipment.match_name(equipment_name)
+        equipment_name = match.name or equipment_name.title()
         message_embed = discord.Embed(title='Inventory', color=discord.Color.from_rgb(245, 211, 201))  # peachy color
         equipment_list = await db.get_equipment_for_user(ctx.author.id)
         equipment_str = User.get_equipment_stats_str(equipment_list, equipment_name)
@@ -235,51 +417,115 @@ class Mining(commands.Cog):
             await ctx.send(embed=message_embed)
         else:
             paginator = commands.Paginator('', '', 1800, '\n')
+            if match.suggestions:
+                paginator.add_line(match.did_you_mean())
             for item in User.get_inventory_list(equipment_list):
                 paginator.add_line(item)
             menu = PageMenu('Inventory', discord.Color.from_rgb(245, 211, 201), paginator.pages)
             await menu.start(ctx)
 
-    @commands.command(name='leaderboard')
-    async def leaderboard(self, ctx):
-        user_list = await db.get_top_users_for_exp(50)
+    async def get_guild_leaderboard(self, guild):
+        '''
+            Top users by exp among the members of the guild. Reused for GUILD_LEADERBOARD_TTL seconds.
+        '''
+        user_list = TTLCache.get('leaderboard', guild.id)
+        if user_list is None:
+            member_ids = await guild_members.load_guild(guild)
+            with metrics.timed('leaderboard.guild'):
+                user_list = await db.get_top_users_for_exp_among(list(member_ids), LEADERBOARD_SIZE)
+            TTLCache.set('leaderboard', guild.id, user_list, GUILD_LEADERBOARD_TTL)
+        return user_list
+
+    @staticmethod
+    def get_leaderboard_pages(user_list, names):
         leaderboard_str = ''
         pages = []
         count = 0
         for i in range(len(user_list)):
-            leaderboard_str += f'**{i + 1}.** `{self.client.get_user(user_list[i]["user_id"])}` '
-            leaderboard_str += f'**Level**: `{User.exp_to_level(user_list[i]["exp"])}` '
-            leaderboard_str += f'**EXP:** `{user_list[i]["exp"]}`\n'
+            leaderboard_str += f'**{i + 1}.** `{names[user_list[i].user_id]}` '
+            leaderboard_str += f'**Level**: `{user_list[i].level}` '
+            leaderboard_str += f'**EXP:** `{user_list[i].exp}`\n'
             count += 1
             if count >= 10:
                 pages.append(leaderboard_str)
                 leaderboard_str = ''
                 count = 0
         pages.append(leaderboard_str)
-        menu = PageMenu('Leaderboard', discord.Color.blue(), pages)
+        return pages
+
+    @commands.command(name='leaderboard')
+    async def leaderboard(self, ctx, scope=''):
+        title = 'Leaderboard'
+        if scope.lower() == 'server':
+            if ctx.guild is None:
+                await ctx.send('The server leaderboard can only be viewed in a server.')
+                return
+            title = f'{ctx.guild.name} Leaderboard'
+            user_list = await self.get_guild_leaderboard(ctx.guild)
+        else:
+            user_list = await db.get_top_users_for_exp(LEADERBOARD_SIZE)
+        names, backfill = await self.names.resolve([u.user_id for u in user_list])
+        menu = PageMenu(title, discord.Color.blue(), Mining.get_leaderboard_pages(user_list, names))
         await menu.start(ctx)
+        if backfill is not None:
+            names.update(await backfill)
+            await menu.update_pages(Mining.get_leaderboard_pages(user_list, names))
+
+    @staticmethod
+    def parse_bonus_args(args: str):
+        '''
+            Splits "<equipment name> [xN] [keep policy]" into (equipment name, rolls, keep policy).
+        '''
+        words = args.split()
+        rolls = 1
+        keep = 'latest'
+        while len(words) > 1:
+            word = words[-1].lower()
+            if word[0] == 'x' and word[1:].isdigit():
+                rolls = max(min(int(word[1:]), MAX_BONUS_ROLLS), 1)
+            elif word in Equipment.keep_policies or word in Equipment.stat_types:
+                keep = word
+            else:
+                break
+            words.pop()
+        return (' '.join(words), rolls, keep)
 
     @commands.command(name='bonus')
     async def bonus(self, ctx, *, equipment_name):
-        equipment_name = equipment_name.title()
-        user = await db.get_user(ctx.author.id)
+        equipment_name, rolls, keep = Mining.parse_bonus_args(equipment_name)
+        match = Equipment.match_name(equipment_name)
+        equipment_name = match.name or equipment_name.title()
         equipment_list = await db.get_equipment_for_user(ctx.author.id)
         equipment = User.get_equipment_from_name(equipment_list, equipment_name)
         message_embed = discord.Embed(title='Equipment Bonusing', color=discord.Color.from_rgb(245, 211, 201))
         if equipment:
-            message_embed.description = f'Would you like to bonus your {equipment_name} for 1000 gold?'
+            cost = rolls * BONUS_COST
+            if rolls == 1:
+                message_embed.description = f'Would you like to bonus your {equipment_name} for {cost} gold?'
+            else:
+                message_embed.description = f'Would you like to bonus your {equipment_name} {rolls} times '
+                keep_description = BONUS_KEEP_DESCRIPTIONS.get(keep, f'bonus with the most {keep}')
+                message_embed.description += f'for {cost} gold, keeping the {keep_description}?'
             result = await ConfirmationMenu(message_embed).prompt(ctx)
             if result:
-                if user['gold'] >= 1000:
-                    await db.update_user_gold(ctx.author.id, -1000)
-                    current_lines = User.get_lines_for_equipment(equipment_list, equipment_name)
-                    bonus = Equipment.get_bonus_for_weapon(equipment_name, current_lines)
-                    await db.update_equipment_bonus(ctx.author.id, equipment['equipment_id'], bonus)
+                async with user_locks.hold(ctx.author.id):
+                    # Roll from the current bonus, which may have changed while the prompt was open.
                     equipment_list = await db.get_equipment_for_user(ctx.author.id)
-                    message_embed.description = User.get_equipment_stats_str(equipment_list, equipment_name)
-                    message_embed.color = Equipment.lines_to_color[User.get_lines_for_equipment(
+                    current_lines = User.get_lines_for_equipment(equipment_list, equipment_name)
+                    bonus, kept_roll = Equipment.roll_bonus_for_weapon(equipment_name, current_lines, rolls, keep)
+                    updated = await db.apply_equipment_bonus(ctx.author.id, equipment.equipment_id, bonus, cost)
+                if updated:
+                    equipment_list = [
+                        updated if e.equipment_instance_id == updated.equipment_instance_id else e
+                        for e in equipment_list]
+                    message_embed.description = ''
+                    if rolls > 1:
+                        message_embed.description += f'`Rolled {rolls} times for {cost} gold. '
+                        message_embed.description += f'Kept roll #{kept_roll}.`\n'
+                    message_embed.description += User.get_equipment_stats_str(equipment_list, equipment_name)
+                    message_embed.color = discord.Color(Equipment.lines_to_color[User.get_lines_for_equipment(
                         equipment_list,
-                        equipment_name)]
+                        equipment_name)])
                     file_name = equipment_name.replace(' ', '_') + '.png'
                     try:
                         image_file = discord.File(f'assets/images/{file_name}', f'{file_name}')
@@ -292,26 +538,31 @@ class Mining(commands.Cog):
                 else:
                     message_embed.description = 'You do not have enough gold...'
         else:
-            message_embed.description = 'You do not own this piece of equipment...'
+            message_embed.description = f'You do not own this piece of equipment... {match.did_you_mean()}'
         await ctx.send(embed=message_embed)
 
     @commands.command(name='reset')
     async def reset(self, ctx):
         user = await db.get_user(ctx.author.id)
-        level = User.exp_to_level(user['exp'])
+        level = User.exp_to_level(user.exp)
         blessings = max(int((level - 50) / 5), 0)
         message_embed = discord.Embed(title='Resetting', color=discord.Color.from_rgb(245, 211, 201))
         message_embed.description = f'{ctx.author.mention}, you will recieve {blessings} blessings if you reset exp. '
         message_embed.description += 'You gain 1% exp stat for each blessing you have.'
         result = await ConfirmationMenu(message_embed).prompt(ctx)
         if result:
-            await db.set_user_exp(ctx.author.id, 0)
-            await db.update_user_blessings(ctx.author.id, blessings)
-            await db.update_user_cave(ctx.author.id, 'Beginner Cave')
+            async with user_locks.hold(ctx.author.id):
+                user = await db.get_user(ctx.author.id)
+                blessings = max(int((User.exp_to_level(user.exp) - 50) / 5), 0)
+                await db.set_user_exp(ctx.author.id, 0)
+                await db.update_user_blessings(ctx.author.id, blessings)
+                await db.update_user_cave(ctx.author.id, 'Beginner Cave')
 
     @mine.error
     async def mine_error(self, ctx, error):
         if isinstance(error, commands.CommandOnCooldown):
+            if self.digests.add_cooldown(ctx.channel, ctx.author, error.retry_after):
+                return
             message_embed = discord.Embed(
                 color=discord.Color.dark_orange(),
                 title='Mine',
@@ -320,6 +571,14 @@ class Mining(commands.Cog):
         else:
             print(error)
 
+    @digest.error
+    async def digest_error(self, ctx, error):
+        if isinstance(error, (commands.MissingPermissions, commands.NoPrivateMessage, commands.BadArgument)):
+            message_embed = discord.Embed(color=discord.Color.dark_orange(), title='Digest', description=str(error))
+            await ctx.send(embed=message_embed)
+        else:
+            print(error)
+
     @stats.error
     async def stats_error(self, ctx, error):
         if isinstance(error, commands.errors.MemberNotFound):
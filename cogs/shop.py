@@ -4,8 +4,9 @@ from util.menu import PageMenu, ConfirmationMenu
 from data.shop import Shop as SD
 from data.equipment import Equipment
 from data.caves import Drop
-from data.user import User
+from data.enums import GrantOutcome
 import util.dbutil as db
+from util.user_locks import user_locks
 
 
 class Shop(commands.Cog):
@@ -16,7 +17,8 @@ class Shop(commands.Cog):
     async def shop(self, ctx, *, item_name: str = None):
         message_embed = discord.Embed(title='Shop', color=discord.Color.gold())
         if item_name:
-            item_name = item_name.title()
+            match = SD.match_name(item_name)
+            item_name = match.name or item_name.title()
             shop_item = SD.get_shop_item_from_name(item_name)
             if shop_item:
                 if shop_item['type'] == Drop.EQUIPMENT:
@@ -30,6 +32,9 @@ class Shop(commands.Cog):
                     message_embed.description = Equipment.get_base_equipment_stats_str(item_name)
                     message_embed.description += f'**Cost:** `{shop_item["cost"][1]} {shop_item["cost"][0].value}`'
                 await ctx.send(file=image_file, embed=message_embed)
+            else:
+                message_embed.description = f'{item_name} is not in the shop. {match.did_you_mean()}'
+                await ctx.send(embed=message_embed)
         else:
             paginator = commands.Paginator('', '', 1800, '\n')
             for item in SD.get_shop_str_list():
@@ -39,8 +44,8 @@ class Shop(commands.Cog):
 
     @commands.command(name='buy')
     async def buy(self, ctx, *, item_name: str):
-        item_name = item_name.title()
-        user = await db.get_user(ctx.author.id)
+        match = SD.match_name(item_name)
+        item_name = match.name or item_name.title()
         message_embed = discord.Embed(title='Buy Shop Item', color=discord.Color.gold())
         shop_item = SD.get_shop_item_from_name(item_name)
         if shop_item:
@@ -48,29 +53,33 @@ class Shop(commands.Cog):
             message_embed.description += f'for {shop_item["cost"][1]} {shop_item["cost"][0].value}'
             result = await ConfirmationMenu(message_embed).prompt(ctx)
             if result:
-                if shop_item['cost'][0] == Drop.GOLD:
-                    if user['gold'] >= shop_item['cost'][1]:
-                        await db.update_user_gold(ctx.author.id, -shop_item['cost'][1])
-                    else:
-                        message_embed.description = 'Not enough gold!'
-                        await ctx.send(embed=message_embed)
-                        return
-                if shop_item['type'] == Drop.EQUIPMENT:
-                    equipment_list = await db.get_equipment_for_user(ctx.author.id)
-                    equipment = User.get_equipment_from_id(equipment_list, shop_item['id'])
-                    base_equipment = Equipment.get_equipment_from_id(shop_item['id'])
-                    if equipment:
-                        if equipment['stars'] < base_equipment['max_stars']:
-                            await db.update_equipment_stars(ctx.author.id, shop_item['id'], 1)
-                            message_embed.description = f'{base_equipment["name"]}\'s star level increased!\n'
+                async with user_locks.hold(ctx.author.id):
+                    user = await db.get_user(ctx.author.id)
+                    if shop_item['cost'][0] == Drop.GOLD:
+                        if user.gold >= shop_item['cost'][1]:
+                            await db.update_user_gold(ctx.author.id, -shop_item['cost'][1])
                         else:
+                            message_embed.description = 'Not enough gold!'
+                            await ctx.send(embed=message_embed)
+                            return
+                    if shop_item['type'] == Drop.EQUIPMENT:
+                        base_equipment = Equipment.get_equipment_from_id(shop_item['id'])
+                        outcome, stars = await db.grant_equipment(
+                            ctx.author.id,
+                            shop_item['id'],
+                            base_equipment['max_stars'],
+                            shop_item['cost'][1] if shop_item['cost'][0] == Drop.GOLD else 0)
+                        if outcome == GrantOutcome.STAR:
+                            message_embed.description = f'{base_equipment["name"]}\'s star level increased!\n'
+                        elif outcome == GrantOutcome.REFUND:
                             message_embed.description = f'{base_equipment["name"]} is already at max star level.\n'
                             message_embed.description += 'You have been refunded.'
-                            await db.update_user_gold(ctx.author.id, shop_item['cost'][1])
-                    else:
-                        await db.insert_equipment(ctx.author.id, shop_item['id'], 'inventory')
-                        message_embed.description = f'You have recieved {base_equipment["name"]}'
-                    await ctx.send(embed=message_embed)
+                        else:
+                            message_embed.description = f'You have recieved {base_equipment["name"]}'
+                        await ctx.send(embed=message_embed)
+        else:
+            message_embed.description = f'{item_name} is not in the shop. {match.did_you_mean()}'
+            await ctx.send(embed=message_embed)
 
 
 def setup(client):
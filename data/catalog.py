@@ -0,0 +1,339 @@
+'''
+    Loads the game catalog (caves, equipment, sets and the shop) from the json files in data/catalog.
+
+    The files are validated and converted on first load, and the result is written to a binary
+    cache in the .cache folder next to them, keyed by the hash of the files. Later loads with unchanged files
+    read the cache directly and skip parsing and validation.
+
+    The active catalog can be swapped at runtime with reload_catalog. A command pins the catalog
+    that was active when it started with pin_catalog, so it keeps that version until it finishes.
+    Remaining cave quantities are the exception: they are only read and changed through active_cave,
+    so a command that pinned an older catalog still mines the caves that replaced it.
+'''
+import contextvars
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from data.enums import Drop, Rarity, EquipmentType
+from data.name_index import NameIndex
+
+CATALOG_DIR = os.path.join(os.path.dirname(__file__), 'catalog')
+CACHE_DIR_NAME = '.cache'
+CATALOG_FILES = ['caves.json', 'equipment.json', 'sets.json', 'shop.json']
+# Version of the json file format this loader understands.
+FORMAT_VERSION = 1
+# Bump when the cached structure changes so old caches are ignored.
+CACHE_VERSION = 1
+STAT_MODIFIERS = ['+', '%']
+
+
+class CatalogError(Exception):
+    def __init__(self, problems):
+        super().__init__('Invalid catalog:\n' + '\n'.join(problems))
+        self.problems = problems
+
+
+class Catalog:
+    '''
+        A loaded version of the catalog and the indexes derived from it.
+        The digest identifies the version and is the hash of the files it was loaded from.
+    '''
+
+    def __init__(self, digest, caves, equipment, sets, shop):
+        self.digest = digest
+        self.caves = caves
+        self.equipment = equipment
+        self.sets = sets
+        self.shop = shop
+        self.equipment_by_id = {e['id']: e for e in equipment}
+        self.equipment_by_name = {e['name']: e for e in equipment}
+        self.cave_by_name = {c['name']: c for c in caves}
+        self.equipment_names = NameIndex(e['name'] for e in equipment)
+        self.cave_names = NameIndex(c['name'] for c in caves)
+        self.shop_names = NameIndex(
+            self.equipment_by_id[i['id']]['name'] for i in shop if i['type'] == Drop.EQUIPMENT)
+
+    @property
+    def version(self):
+        return self.digest[:12]
+
+
+def _file_digest(directory: str):
+    '''
+        Returns the hash of the catalog files in directory. Raises CatalogError if one cannot be read.
+    '''
+    digest = hashlib.sha256()
+    digest.update(f'{CACHE_VERSION}'.encode())
+    problems = []
+    for file_name in CATALOG_FILES:
+        try:
+            with open(os.path.join(directory, file_name), 'rb') as f:
+                digest.update(f.read())
+        except OSError as exception:
+            problems.append(f'{file_name}: cannot be read [{exception}]')
+    if problems:
+        raise CatalogError(problems)
+    return digest.hexdigest()
+
+
+def _read_file(directory: str, file_name: str, key: str, problems: list):
+    try:
+        with open(os.path.join(directory, file_name), encoding='utf-8') as f:
+            content = json.load(f)
+    except OSError as exception:
+        problems.append(f'{file_name}: cannot be read [{exception}]')
+        return None
+    except ValueError as exception:
+        problems.append(f'{file_name}: not valid json [{exception}]')
+        return None
+    if not isinstance(content, dict):
+        problems.append(f'{file_name}: must be an object with "version" and "{key}"')
+        return None
+    if content.get('version') != FORMAT_VERSION:
+        problems.append(f'{file_name}: unsupported version {content.get("version")}, expected {FORMAT_VERSION}')
+    if key not in content:
+        problems.append(f'{file_name}: missing "{key}"')
+        return None
+    return content[key]
+
+
+def _check_stats(where: str, stats, problems: list):
+    if not isinstance(stats, dict):
+        problems.append(f'{where}: stats must be an object')
+        return
+    for key, value in stats.items():
+        stat, _, modifier = key.partition('|')
+        if not stat or modifier not in STAT_MODIFIERS:
+            problems.append(f'{where}: stat "{key}" must look like "<stat>|+" or "<stat>|%"')
+        if not isinstance(value, int):
+            problems.append(f'{where}: stat "{key}" must be an integer')
+
+
+def _parse_equipment(raw_equipment, problems: list):
+    equipment = []
+    ids = set()
+    names = set()
+    for e in raw_equipment:
+        where = f'equipment {e.get("id")} ({e.get("name")})'
+        missing = [k for k in ('id', 'name', 'type', 'stats', 'level', 'set', 'value', 'max_stars') if k not in e]
+        if missing:
+            problems.append(f'{where}: missing {", ".join(missing)}')
+            continue
+        if e['id'] in ids:
+            problems.append(f'{where}: duplicate id')
+        if e['name'] in names:
+            problems.append(f'{where}: duplicate name')
+        ids.add(e['id'])
+        names.add(e['name'])
+        try:
+            equipment_type = EquipmentType(e['type'])
+        except ValueError:
+            problems.append(f'{where}: unknown type "{e["type"]}"')
+            continue
+        for key in ('level', 'value', 'max_stars'):
+            if not isinstance(e[key], int) or e[key] < 0:
+                problems.append(f'{where}: {key} must be a non-negative integer')
+        _check_stats(where, e['stats'], problems)
+        equipment.append(dict(e, type=equipment_type))
+    return equipment
+
+
+def _parse_sets(raw_sets, problems: list):
+    if not isinstance(raw_sets, dict):
+        problems.append('sets must be an object of set name to bonus list')
+        return {}
+    for set_name, bonuses in raw_sets.items():
+        if not isinstance(bonuses, list):
+            problems.append(f'set {set_name}: bonuses must be a list')
+            continue
+        for i, bonus in enumerate(bonuses):
+            _check_stats(f'set {set_name} bonus {i + 1}', bonus, problems)
+    return raw_sets
+
+
+def _parse_drop(where: str, raw_drop, equipment_ids: set, problems: list):
+    if not isinstance(raw_drop, list) or len(raw_drop) != 2:
+        problems.append(f'{where}: drops must be [type, value] pairs')
+        return None
+    try:
+        drop_type = Drop(raw_drop[0])
+    except ValueError:
+        problems.append(f'{where}: unknown drop type "{raw_drop[0]}"')
+        return None
+    if drop_type == Drop.EQUIPMENT and raw_drop[1] not in equipment_ids:
+        problems.append(f'{where}: unknown equipment id {raw_drop[1]}')
+    return (drop_type, raw_drop[1])
+
+
+def _parse_caves(raw_caves, equipment_ids: set, problems: list):
+    caves = []
+    names = set()
+    for c in raw_caves:
+        where = f'cave {c.get("name")}'
+        missing = [k for k in ('name', 'level_requirement', 'exp', 'drop_odds', 'drops', 'max_quantity') if k not in c]
+        if missing:
+            problems.append(f'{where}: missing {", ".join(missing)}')
+            continue
+        if c['name'] in names:
+            problems.append(f'{where}: duplicate name')
+        names.add(c['name'])
+        odds = c['drop_odds']
+        if len(odds) != len(Rarity) + 1 or any(o < 0 for o in odds) or sum(odds) <= 0:
+            problems.append(f'{where}: drop_odds must be {len(Rarity) + 1} non-negative weights with a positive sum')
+        if not isinstance(c['max_quantity'], int) or c['max_quantity'] < -1:
+            problems.append(f'{where}: max_quantity must be -1 (infinite) or a non-negative integer')
+        cave = {
+            'name': c['name'],
+            'level_requirement': c['level_requirement'],
+            'exp': c['exp'],
+            'drop_odds': list(odds),
+        }
+        for rarity in Rarity:
+            drops = [_parse_drop(where, d, equipment_ids, problems) for d in c['drops'].get(rarity.value, [])]
+            cave[rarity] = [d for d in drops if d]
+        cave['current_quantity'] = c['max_quantity']
+        cave['max_quantity'] = c['max_quantity']
+        caves.append(cave)
+    return caves
+
+
+def _parse_shop(raw_shop, equipment_ids: set, problems: list):
+    shop = []
+    for i in raw_shop:
+        where = f'shop item {i.get("id")}'
+        try:
+            item_type = Drop(i['type'])
+            cost_type = Drop(i['cost'][0])
+        except (KeyError, IndexError, ValueError):
+            problems.append(f'{where}: needs a valid type and a [type, amount] cost')
+            continue
+        if item_type == Drop.EQUIPMENT and i.get('id') not in equipment_ids:
+            problems.append(f'{where}: unknown equipment id')
+        shop.append({'type': item_type, 'id': i['id'], 'cost': (cost_type, i['cost'][1])})
+    return shop
+
+
+def parse_catalog(directory: str = CATALOG_DIR):
+    '''
+        Reads and validates the catalog files. Returns the (caves, equipment, sets, shop) parts.
+        Raises CatalogError listing every problem found.
+    '''
+    problems = []
+    raw_equipment = _read_file(directory, 'equipment.json', 'equipment', problems) or []
+    raw_sets = _read_file(directory, 'sets.json', 'sets', problems) or {}
+    raw_caves = _read_file(directory, 'caves.json', 'caves', problems) or []
+    raw_shop = _read_file(directory, 'shop.json', 'shop', problems) or []
+    equipment = _parse_equipment(raw_equipment, problems)
+    equipment_ids = {e['id'] for e in equipment}
+    sets = _parse_sets(raw_sets, problems)
+    caves = _parse_caves(raw_caves, equipment_ids, problems)
+    shop = _parse_shop(raw_shop, equipment_ids, problems)
+    if problems:
+        raise CatalogError(problems)
+    return caves, equipment, sets, shop
+
+
+def _write_cache(path: str, parts):
+    '''
+        Writes parts to the cache file path and removes the older caches in the same folder.
+    '''
+    cache_dir = os.path.dirname(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(parts, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith('.pickle') and os.path.join(cache_dir, file_name) != path:
+            os.remove(os.path.join(cache_dir, file_name))
+
+
+def load_catalog(directory: str = CATALOG_DIR, use_cache: bool = True):
+    '''
+        Returns a new Catalog for the files in directory, using the compiled cache in its .cache folder
+        when it matches.
+    '''
+    digest = _file_digest(directory)
+    cache_path = os.path.join(directory, CACHE_DIR_NAME, f'catalog-{digest}.pickle')
+    parts = None
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                parts = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            parts = None
+    if parts is None:
+        parts = parse_catalog(directory)
+        if use_cache:
+            try:
+                _write_cache(cache_path, parts)
+            except OSError as exception:
+                print(f'Catalog cache could not be written. [{exception}]')
+    return Catalog(digest, *parts)
+
+
+_catalog = None
+_pinned_catalog = contextvars.ContextVar('pinned_catalog', default=None)
+
+
+def _active_catalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = load_catalog()
+    return _catalog
+
+
+def active_cave(cave_name: str):
+    '''
+        Returns the cave named cave_name in the active catalog, whatever catalog the command pinned.
+        Use it for current_quantity, which a reload only copies once.
+    '''
+    return _active_catalog().cave_by_name.get(cave_name)
+
+
+def get_catalog():
+    '''
+        Returns the catalog pinned by the current command, or the active catalog.
+        The active catalog is loaded on first use.
+    '''
+    pinned = _pinned_catalog.get()
+    if pinned is not None:
+        return pinned
+    return _active_catalog()
+
+
+def pin_catalog():
+    '''
+        Pins the active catalog to the current task, so a reload does not change it halfway through a command.
+        The bot calls it from a global check, which runs before the checks of every command.
+    '''
+    _pinned_catalog.set(_active_catalog())
+
+
+def reload_catalog(directory: str = CATALOG_DIR):
+    '''
+        Loads the catalog files again and makes the result the active catalog.
+        Remaining cave quantities carry over, capped by the new max quantity.
+        Raises CatalogError and keeps the active catalog if the files are invalid or drop a cave of the
+        active catalog, since players can still be in it.
+        Returns (old catalog, new catalog).
+    '''
+    global _catalog
+    old = _active_catalog()
+    new = load_catalog(directory)
+    missing = [name for name in old.cave_by_name if name not in new.cave_by_name]
+    if missing:
+        raise CatalogError([f'cave {name}: missing, players can still be in it' for name in missing])
+    for cave in new.caves:
+        old_cave = old.cave_by_name.get(cave['name'])
+        if old_cave is None or cave['max_quantity'] == -1:
+            continue
+        if old_cave['current_quantity'] == -1:
+            cave['current_quantity'] = cave['max_quantity']
+        else:
+            cave['current_quantity'] = min(old_cave['current_quantity'], cave['max_quantity'])
+    _catalog = new
+    return old, new
@@ -0,0 +1,30 @@
+from enum import Enum
+
+
+class Drop(Enum):
+    GOLD = 'gold'
+    ITEM = 'item'
+    EQUIPMENT = 'equipment'
+    EXP = 'exp'
+
+
+class Rarity(Enum):
+    COMMON = 'common'
+    RARE = 'rare'
+    EPIC = 'epic'
+    LEGENDARY = 'legendary'
+
+
+class EquipmentType(Enum):
+    PICKAXE = 'pickaxe'
+    HELMET = 'helmet'
+    VEST = 'vest'
+    PANTS = 'pants'
+    BOOTS = 'boots'
+    GLOVES = 'gloves'
+
+
+class GrantOutcome(Enum):
+    NEW = 'new'  # First copy, added to the inventory.
+    STAR = 'star'  # Duplicate, star level increased.
+    REFUND = 'refund'  # Duplicate at max stars, gold credited instead.
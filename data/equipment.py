@@ -1,623 +1,36 @@
-from enum import Enum
 import random
-import discord
-
-
-class EquipmentType(Enum):
-    PICKAXE = 'pickaxe'
-    HELMET = 'helmet'
-    VEST = 'vest'
-    PANTS = 'pants'
-    BOOTS = 'boots'
-    GLOVES = 'gloves'
+from data.enums import EquipmentType  # noqa: F401 re-exported for older imports
+from data.catalog import get_catalog
 
 
 class Equipment:
 
+    # RGB values of the embed color for an equipment with that many bonus lines.
+    # Same values as discord.Color light_gray, green, blue, purple, orange and red.
     lines_to_color = {
-        0: discord.Color.light_gray(),
-        1: discord.Color.green(),
-        2: discord.Color.blue(),
-        3: discord.Color.purple(),
-        4: discord.Color.orange(),
-        5: discord.Color.red(),
-    }
-
-    _equipment = [
-        {
-            'id': 1000,
-            'name': 'Developer Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'speed|+': 350,
-                'crit|+': 50,
-            },
-            'level': 0,
-            'set': None,
-            'value': 0,
-            'max_stars': 24
-        },
-        {
-            'id': 1100,
-            'name': 'Beginner Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'power|+': 1,
-            },
-            'level': 0,
-            'set': None,
-            'value': 100,
-            'max_stars': 5
-        },
-        {
-            'id': 1200,
-            'name': 'Amateur Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'power|+': 3
-            },
-            'level': 3,
-            'set': None,
-            'value': 150,
-            'max_stars': 7
-        },
-        {
-            'id': 1300,
-            'name': 'Dark Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'power|+': 10,
-                'exp|+': 5,
-                'crit|+': 5,
-            },
-            'level': 10,
-            'set': 'Dark',
-            'value': 400,
-            'max_stars': 12
-        },
-        {
-            'id': 1400,
-            'name': 'Ice Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'power|+': 15,
-                'speed|+': 5,
-            },
-            'level': 20,
-            'set': None,
-            'value': 1000,
-            'max_stars': 18
-        },
-        {
-            'id': 1450,
-            'name': 'Sky Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'speed|+': 30,
-                'speed|%': 7,
-            },
-            'level': 30,
-            'set': None,
-            'value': 1250,
-            'max_stars': 18
-        },
-        {
-            'id': 1500,
-            'name': 'Obsidian Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'exp|+': 60,
-                'power|+': 45,
-                'exp|%': 5,
-            },
-            'level': 40,
-            'set': None,
-            'value': 1500,
-            'max_stars': 24
-        },
-        {
-            'id': 1600,
-            'name': 'Trailblazer Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'power|+': 30,
-            },
-            'level': 30,
-            'set': 'Damian',
-            'value': 2000,
-            'max_stars': 24
-        },
-        {
-            'id': 1700,
-            'name': 'Ancient Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'power|+': 90,
-                'exp|+': 30,
-            },
-            'level': 30,
-            'set': 'Ancient',
-            'value': 25000,
-            'max_stars': 18
-        },
-        {
-            'id': 1800,
-            'name': 'Origin Pickaxe',
-            'type': EquipmentType.PICKAXE,
-            'stats': {
-                'exp|+': 120,
-                'speed|+': 20,
-            },
-            'level': 60,
-            'set': 'Origin',
-            'value': 40000,
-            'max_stars': 32
-        },
-        {
-            'id': 2100,
-            'name': 'Dark Helmet',
-            'type': EquipmentType.HELMET,
-            'stats': {
-                'power|+': 1,
-            },
-            'level': 10,
-            'set': 'Dark',
-            'value': 400,
-            'max_stars': 12
-        },
-        {
-            'id': 2150,
-            'name': 'Ancient Helmet',
-            'type': EquipmentType.HELMET,
-            'stats': {
-                'power|+': 30,
-                'exp|+': 30,
-                'crit|+': 30,
-                'luck|+': 30,
-                'luck|%': 20,
-            },
-            'level': 30,
-            'set': 'Ancient',
-            'value': 25000,
-            'max_stars': 18
-        },
-        {
-            'id': 2175,
-            'name': 'Brave Helmet',
-            'type': EquipmentType.HELMET,
-            'stats': {
-                'power|+': 30,
-            },
-            'level': 30,
-            'set': None,
-            'value': 1000,
-            'max_stars': 18
-        },
-        {
-            'id': 2200,
-            'name': 'Absolute Helmet',
-            'type': EquipmentType.HELMET,
-            'stats': {
-                'power|+': 67,
-                'power|%': 5,
-            },
-            'level': 100,
-            'set': 'Absolute',
-            'value': 10000,
-            'max_stars': 24
-        },
-        {
-            'id': 2300,
-            'name': 'Damian Helmet',
-            'type': EquipmentType.HELMET,
-            'stats': {
-                'power|+': 10,
-                'power|%': 5,
-            },
-            'level': 30,
-            'set': 'Damian',
-            'value': 2000,
-            'max_stars': 24
-        },
-        {
-            'id': 2400,
-            'name': 'Royal Crown Helmet',
-            'type': EquipmentType.HELMET,
-            'stats': {
-                'power|+': 150,
-                'luck|+': 50,
-                'power|%': 20,
-            },
-            'level': 60,
-            'set': 'Royal',
-            'value': 10000,
-            'max_stars': 32
-        },
-        {
-            'id': 3100,
-            'name': 'Dark Vest',
-            'type': EquipmentType.VEST,
-            'stats': {
-                'power|+': 3,
-                'exp|+': 2,
-            },
-            'level': 10,
-            'set': 'Dark',
-            'value': 400,
-            'max_stars': 12
-        },
-        {
-            'id': 3200,
-            'name': 'Beetle Armor Vest',
-            'type': EquipmentType.VEST,
-            'stats': {
-                'power|+': 20,
-                'exp|+': 4,
-            },
-            'level': 30,
-            'set': None,
-            'value': 400,
-            'max_stars': 18
-        },
-        {
-            'id': 3300,
-            'name': 'Blazer Vest',
-            'type': EquipmentType.VEST,
-            'stats': {
-                'power|+': 25,
-            },
-            'level': 30,
-            'set': 'Damian',
-            'value': 2000,
-            'max_stars': 24
-        },
-        {
-            'id': 3400,
-            'name': 'Ancient Vest',
-            'type': EquipmentType.VEST,
-            'stats': {
-                'power|+': 50,
-                'exp|+': 50,
-
-            },
-            'level': 30,
-            'set': 'Ancient',
-            'value': 25000,
-            'max_stars': 18
-        },
-        {
-            'id': 3500,
-            'name': 'Royal Vest',
-            'type': EquipmentType.VEST,
-            'stats': {
-                'power|+': 150,
-                'luck|+': 20,
-                'power|%': 10
-            },
-            'level': 60,
-            'set': 'Royal',
-            'value': 10000,
-            'max_stars': 32
-        },
-        {
-            'id': 3600,
-            'name': 'Origin Vest',
-            'type': EquipmentType.VEST,
-            'stats': {
-                'exp|+': 75,
-            },
-            'level': 50,
-            'set': 'Origin',
-            'value': 40000,
-            'max_stars': 32
-        },
-        {
-            'id': 4100,
-            'name': 'Dark Pants',
-            'type': EquipmentType.PANTS,
-            'stats': {
-                'power|+': 2,
-                'exp|+': 3,
-            },
-            'level': 10,
-            'set': 'Dark',
-            'value': 400,
-            'max_stars': 12
-        },
-        {
-            'id': 4200,
-            'name': 'Damian Pants',
-            'type': EquipmentType.PANTS,
-            'stats': {
-                'power|+': 32,
-                'exp|+': 5,
-                'speed|+': 5,
-            },
-            'level': 30,
-            'set': 'Damian',
-            'value': 4500,
-            'max_stars': 24
-        },
-        {
-            'id': 4300,
-            'name': 'Ancient Pants',
-            'type': EquipmentType.PANTS,
-            'stats': {
-                'power|+': 50,
-                'luck|+': 30,
-                'power|%': 10,
-            },
-            'level': 30,
-            'set': 'Ancient',
-            'value': 25000,
-            'max_stars': 18
-        },
-        {
-            'id': 4400,
-            'name': 'Royal Pants',
-            'type': EquipmentType.PANTS,
-            'stats': {
-                'power|+': 100,
-                'luck|+': 40,
-                'luck|%': 10
-            },
-            'level': 60,
-            'set': 'Royal',
-            'value': 10000,
-            'max_stars': 32
-        },
-        {
-            'id': 4500,
-            'name': 'Origin Pants',
-            'type': EquipmentType.PANTS,
-            'stats': {
-                'exp|+': 50,
-                'speed|+': 25,
-            },
-            'level': 50,
-            'set': 'Origin',
-            'value': 40000,
-            'max_stars': 32
-        },
-        {
-            'id': 5100,
-            'name': 'Dark Boots',
-            'type': EquipmentType.BOOTS,
-            'stats': {
-                'exp|+': 1,
-            },
-            'level': 10,
-            'set': 'Dark',
-            'value': 400,
-            'max_stars': 12
-        },
-        {
-            'id': 5200,
-            'name': 'Damian Boots',
-            'type': EquipmentType.BOOTS,
-            'stats': {
-                'power|+': 20,
-                'exp|%': 10,
-            },
-            'level': 30,
-            'set': 'Damian',
-            'value': 4500,
-            'max_stars': 24
-        },
-        {
-            'id': 5300,
-            'name': 'Ancient Boots',
-            'type': EquipmentType.BOOTS,
-            'stats': {
-                'power|+': 10,
-                'exp|+': 10,
-                'power|%': 10,
-                'exp|+': 10,
-            },
-            'level': 30,
-            'set': 'Ancient',
-            'value': 25000,
-            'max_stars': 18
-        },
-        {
-            'id': 5400,
-            'name': 'Void Walker Boots',
-            'type': EquipmentType.BOOTS,
-            'stats': {
-                'exp|+': 200,
-                'exp|%': 25,
-            },
-            'level': 100,
-            'set': None,
-            'value': 50000,
-            'max_stars': 12
-        },
-        {
-            'id': 5500,
-            'name': 'Origin Boots',
-            'type': EquipmentType.BOOTS,
-            'stats': {
-                'exp|+': 75,
-                'exp|%': 10,
-            },
-            'level': 50,
-            'set': 'Origin',
-            'value': 40000,
-            'max_stars': 32
-        },
-        {
-            'id': 6100,
-            'name': 'Dark Gloves',
-            'type': EquipmentType.GLOVES,
-            'stats': {
-                'power|%': 5,
-                'crit|+': 5,
-            },
-            'level': 10,
-            'set': 'Dark',
-            'value': 400,
-            'max_stars': 12
-        },
-        {
-            'id': 6200,
-            'name': 'Pure Gloves',
-            'type': EquipmentType.GLOVES,
-            'stats': {
-            },
-            'level': 30,
-            'set': None,
-            'value': 400,
-            'max_stars': 18
-        },
-        {
-            'id': 6300,
-            'name': 'Superior Pure Gloves',
-            'type': EquipmentType.GLOVES,
-            'stats': {
-            },
-            'level': 60,
-            'set': None,
-            'value': 8000,
-            'max_stars': 24
-        },
-        {
-            'id': 6400,
-            'name': 'Mastercrafted Pure Gloves',
-            'type': EquipmentType.GLOVES,
-            'stats': {
-            },
-            'level': 100,
-            'set': None,
-            'value': 20000,
-            'max_stars': 32
-        },
-        {
-            'id': 6500,
-            'name': 'Damian Gloves',
-            'type': EquipmentType.GLOVES,
-            'stats': {
-                'power|+': 15,
-                'speed|+': 5,
-            },
-            'level': 30,
-            'set': 'Damian',
-            'value': 2000,
-            'max_stars': 24
-        },
-        {
-            'id': 6600,
-            'name': 'Ancient Gloves',
-            'type': EquipmentType.GLOVES,
-            'stats': {
-                'power|+': 50,
-                'exp|+': 50,
-            },
-            'level': 30,
-            'set': 'Ancient',
-            'value': 25000,
-            'max_stars': 18
-        },
-    ]
-
-    sets = {
-        'Origin': [
-            {
-                'exp|%': 5
-            },
-            {
-                'exp|%': 10
-            },
-            {
-                'exp|%': 15
-            },
-            {
-                'exp|+': 200
-            }
-        ],
-        'Ancient': [
-            {
-            },
-            {
-                'power|+': 20,
-            },
-            {
-                'power|+': 20,
-            },
-            {
-                'power|%': 5,
-            },
-            {
-                'luck|+': 5,
-            },
-            {
-                'power|%': 10,
-                'luck|+': 50,
-            }
-        ],
-        'Damian': [
-            {
-            },
-            {
-                'power|%': 5,
-            },
-            {
-                'power|%': 5,
-            },
-            {
-                'power|%': 5,
-            },
-            {
-                'exp|+': 10,
-                'power|%': 5,
-            },
-            {
-                'power|%': 10,
-                'exp|%': 10,
-            }
-        ],
-        'Dark': [
-            {
-            },
-            {
-                'exp|+': 5,
-            },
-            {
-                'exp|+': 5,
-            },
-            {
-                'exp|+': 10,
-            },
-            {
-                'exp|+': 10,
-            },
-            {
-                'exp|%': 10,
-                'crit|+': 10,
-            }
-        ],
-        'Royal': [
-            {
-            },
-            {
-                'power|+': 250,
-            },
-            {
-                'power|%': 50,
-            },
-        ],
+        0: 0x979c9f,
+        1: 0x2ecc71,
+        2: 0x3498db,
+        3: 0x9b59b6,
+        4: 0xe67e22,
+        5: 0xe74c3c,
     }
 
     # Rollable stat types from bonuses. Does not represent all available stats in game.
     stat_types = ['power', 'speed', 'luck', 'exp', 'crit']
 
+    # Policies for which bonus to keep when rolling several times. Any stat type is also a policy.
+    keep_policies = ['latest', 'lines']
+
     def __init__(self):
         pass
 
     @staticmethod
     def get_set_bonus_str(set_name: str, set_count: int):
-        if set_name not in Equipment.sets:
+        sets = get_catalog().sets
+        if set_name not in sets:
             return ''
-        set = Equipment.sets[set_name]
+        set = sets[set_name]
         set_str = f'-----{set_name} Set Bonuses-----\n'
         for i in range(len(set)):
             if set[i].items():
@@ -651,17 +64,18 @@ class Equipment:
 
     @staticmethod
     def get_equipment_from_id(id: int):
-        for e in Equipment._equipment:
-            if e['id'] == id:
-                return e
-        return None
+        return get_catalog().equipment_by_id.get(id)
 
     @staticmethod
     def get_equipment_from_name(name: str):
-        for e in Equipment._equipment:
-            if e['name'] == name:
-                return e
-        return None
+        return get_catalog().equipment_by_name.get(name)
+
+    @staticmethod
+    def match_name(name: str):
+        '''
+            Returns the NameMatch of a name typed by a player.
+        '''
+        return get_catalog().equipment_names.match(name)
 
     @staticmethod
     def get_star_bonus(stars: int):
@@ -704,3 +118,48 @@ class Equipment:
                 value = random.randint(int(base_equipment['level'] / 4), int(base_equipment['level'] / 2))
             bonus += f'{stat}|{modifier}|{value},'
         return bonus
+
+    @staticmethod
+    def parse_bonus(bonus: str):
+        '''
+            Returns a list of (stat, modifier, value) tuples for a bonus string.
+        '''
+        lines = []
+        for line in bonus.split(','):
+            if line != '':
+                stat, modifier, value = line.split('|')
+                lines.append((stat, modifier, int(value)))
+        return lines
+
+    @staticmethod
+    def score_bonus(bonus: str, keep: str):
+        '''
+            Returns a comparable score of a bonus for the keep policy. Higher is better.
+            'latest' scores every bonus the same, 'lines' prefers more lines and then higher values,
+            and a stat type prefers the highest total of that stat.
+        '''
+        lines = Equipment.parse_bonus(bonus)
+        if keep == 'lines':
+            return (len(lines), sum(value for stat, modifier, value in lines))
+        if keep in Equipment.stat_types:
+            return (sum(value for stat, modifier, value in lines if stat == keep), len(lines))
+        return (0, 0)
+
+    @staticmethod
+    def roll_bonus_for_weapon(name: str, current_lines: int, rolls: int, keep: str = 'latest'):
+        '''
+            Rolls a bonus rolls times and keeps the best by the keep policy. Ties keep the later roll.
+            Each roll starts from the lines of the bonus kept so far, like rolling one at a time would.
+
+            Returns a two tuple of (kept bonus string, roll number of the kept bonus starting at 1).
+        '''
+        kept = None
+        kept_roll = 0
+        kept_score = None
+        for roll in range(1, rolls + 1):
+            bonus = Equipment.get_bonus_for_weapon(name, current_lines)
+            score = Equipment.score_bonus(bonus, keep)
+            if kept is None or score >= kept_score:
+                kept, kept_roll, kept_score = bonus, roll, score
+                current_lines = bonus.count(',')
+        return (kept, kept_roll)
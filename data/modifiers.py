@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+
+class Modifiers:
+    '''
+        Game wide modifiers. Kept up to date by scheduled jobs so the mine path only reads flags.
+    '''
+    # UTC hours of happy hour. 23 UTC is 7 pm EST.
+    happy_hour_hours = {23}
+    happy_hour = False
+
+    @staticmethod
+    def update_happy_hour(now: datetime):
+        Modifiers.happy_hour = now.hour in Modifiers.happy_hour_hours
+
+    @staticmethod
+    def next_happy_hour(now: datetime):
+        start = now.replace(minute=0, second=0, microsecond=0)
+        for i in range(1, 25):
+            if (start + timedelta(hours=i)).hour in Modifiers.happy_hour_hours:
+                return start + timedelta(hours=i)
+        return None
+
+    @staticmethod
+    def active():
+        '''
+            Returns a list of descriptions of the active modifiers.
+        '''
+        active = []
+        if Modifiers.happy_hour:
+            active.append('Happy Hour: 2x exp')
+        return active
@@ -0,0 +1,204 @@
+'''
+    Forgiving lookup of catalog names typed by players.
+
+    Names are normalized to lowercase letters and digits, so case, apostrophes, accents and spacing
+    do not matter. A query is then matched in order of these tiers, and the first tier with any
+    candidates decides:
+
+    1. The same normalized name.
+    2. The start of a name ("mastercrafted pu").
+    3. The start of a word of a name ("pure glov").
+    4. An abbreviation, whose letters appear in order from the first letter of the name ("ancpick").
+    5. A name at most MAX_DISTANCE edits away ("ancient helemt").
+
+    A tier with exactly one candidate is a match, and so is a single closest name in tier 5.
+    Tier 4 also needs the candidate to be confident: the query covers at least MIN_ABBREVIATION_COVERAGE
+    of the name's letters, or starts its word initials ("vwb"). Otherwise "deep" would be Developer Cave.
+    Other candidates of the tier are returned as suggestions.
+    Tiers 2 and 3 walk prefix tries. Tiers 4 and 5 scan the names with early exits, and their
+    results are cached per query, since the same typos come up again and again.
+'''
+import unicodedata
+
+MIN_FUZZY_LENGTH = 3
+MAX_DISTANCE = 3
+MAX_SUGGESTIONS = 5
+# Share of the letters of a name an abbreviation must have to match it without word initials.
+MIN_ABBREVIATION_COVERAGE = 0.5
+# Results of the slower abbreviation and edit distance tiers that are kept, by normalized query.
+FUZZY_CACHE_SIZE = 1024
+
+
+def normalize_words(name: str):
+    decomposed = unicodedata.normalize('NFKD', name.replace("'", '').replace('’', ''))
+    cleaned = ''.join(c.lower() if c.isalnum() else ' ' for c in decomposed if not unicodedata.combining(c))
+    return cleaned.split()
+
+
+def normalize(name: str):
+    return ''.join(normalize_words(name))
+
+
+class NameMatch:
+    __slots__ = ('name', 'suggestions')
+
+    def __init__(self, name=None, suggestions=()):
+        self.name = name
+        self.suggestions = list(suggestions)
+
+    def did_you_mean(self):
+        if not self.suggestions:
+            return ''
+        return 'Did you mean ' + ', '.join(f'`{name}`' for name in self.suggestions) + '?'
+
+
+class _Trie:
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, key: str, value: int):
+        node = self.root
+        for c in key:
+            node = node.setdefault(c, {})
+            node.setdefault(None, set()).add(value)
+
+    def find(self, prefix: str):
+        node = self.root
+        for c in prefix:
+            node = node.get(c)
+            if node is None:
+                return set()
+        return node.get(None, set())
+
+
+def _is_abbreviation(query: str, key: str):
+    if not key or query[0] != key[0]:
+        return False
+    i = 1
+    for c in key[1:]:
+        if i == len(query):
+            break
+        if c == query[i]:
+            i += 1
+    return i == len(query)
+
+
+def _bounded_distance(a: str, b: str, bound: int):
+    '''
+        Levenshtein distance of a and b, or bound + 1 if it is larger than bound.
+        Only cells within bound of the diagonal can stay within bound, so only those are computed.
+    '''
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    over = bound + 1
+    previous = [j if j <= bound else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        low = max(1, i - bound)
+        high = min(len(b), i + bound)
+        current = [over] * (len(b) + 1)
+        if i <= bound:
+            current[0] = i
+        row_min = current[0]
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > bound:
+            return over
+        previous = current
+    return min(previous[-1], over)
+
+
+def _letter_mask(key: str):
+    mask = 0
+    for c in key:
+        mask |= 1 << (ord(c) & 63)
+    return mask
+
+
+def _missing_letters(a: int, b: int):
+    '''
+        A lower bound of the edit distance of two strings with these letter masks. Every letter one
+        string has and the other lacks takes an edit, and one edit can fix at most one on each side.
+    '''
+    return max(bin(a & ~b).count('1'), bin(b & ~a).count('1'))
+
+
+class NameIndex:
+    def __init__(self, names):
+        self.names = list(names)
+        self.keys = [normalize(name) for name in self.names]
+        self.letters = [_letter_mask(key) for key in self.keys]
+        self.initials = [''.join(word[0] for word in normalize_words(name)) for name in self.names]
+        self.by_key = {}
+        for i, key in enumerate(self.keys):
+            self.by_key.setdefault(key, i)
+        self.full = _Trie()
+        self.words = _Trie()
+        for i, name in enumerate(self.names):
+            self.full.insert(self.keys[i], i)
+            words = normalize_words(name)
+            for start in range(1, len(words)):
+                self.words.insert(''.join(words[start:]), i)
+        self.fuzzy_cache = {}
+
+    def _result(self, candidates, order=None):
+        if len(candidates) == 1:
+            return NameMatch(self.names[next(iter(candidates))])
+        ranked = sorted(candidates, key=order or (lambda i: (len(self.keys[i]), self.names[i])))
+        return NameMatch(None, [self.names[i] for i in ranked[:MAX_SUGGESTIONS]])
+
+    def match(self, query: str):
+        '''
+            Returns a NameMatch with the matched name, or with no name and up to MAX_SUGGESTIONS suggestions.
+        '''
+        key = normalize(query)
+        if not key:
+            return NameMatch()
+        if key in self.by_key:
+            return NameMatch(self.names[self.by_key[key]])
+        for trie in (self.full, self.words):
+            candidates = trie.find(key)
+            if candidates:
+                return self._result(candidates)
+        if len(key) < MIN_FUZZY_LENGTH:
+            return NameMatch()
+        result = self.fuzzy_cache.get(key)
+        if result is None:
+            if len(self.fuzzy_cache) >= FUZZY_CACHE_SIZE:
+                self.fuzzy_cache.clear()
+            result = self.fuzzy_cache[key] = self._match_fuzzy(key)
+        return NameMatch(result.name, result.suggestions)
+
+    def _confident_abbreviation(self, key: str, i: int):
+        return len(key) >= MIN_ABBREVIATION_COVERAGE * len(self.keys[i]) or self.initials[i].startswith(key)
+
+    def _match_fuzzy(self, key: str):
+        candidates = {i for i, name_key in enumerate(self.keys) if _is_abbreviation(key, name_key)}
+        if candidates:
+            if len(candidates) == 1 and self._confident_abbreviation(key, next(iter(candidates))):
+                return self._result(candidates)
+            ranked = sorted(candidates, key=lambda i: (len(self.keys[i]), self.names[i]))
+            return NameMatch(None, [self.names[i] for i in ranked[:MAX_SUGGESTIONS]])
+        bound = min(MAX_DISTANCE, max(1, len(key) // 4))
+        letters = _letter_mask(key)
+        distances = {}
+        for i, name_key in enumerate(self.keys):
+            if abs(len(key) - len(name_key)) > bound or _missing_letters(letters, self.letters[i]) > bound:
+                continue
+            distance = _bounded_distance(key, name_key, bound)
+            if distance <= bound:
+                distances[i] = distance
+        if not distances:
+            return NameMatch()
+        best = min(distances.values())
+        closest = {i for i, distance in distances.items() if distance == best}
+        if len(closest) == 1:
+            return NameMatch(self.names[closest.pop()])
+        return self._result(distances, order=lambda i: (distances[i], self.names[i]))
@@ -0,0 +1,44 @@
+'''
+    Typed rows of the users and equipment tables, as returned by util.dbutil.
+
+    Rows are named tuples: they take less memory than dictionaries, their fields are read as
+    attributes, and a misspelled field is an AttributeError instead of a silent KeyError at the
+    first command that reaches it.
+'''
+from datetime import datetime
+from typing import NamedTuple
+
+
+class UserRow(NamedTuple):
+    user_id: int
+    exp: int
+    cave: str
+    gold: int
+    blessings: int
+    level: int
+    updated_at: datetime
+
+    @classmethod
+    def from_record(cls, record):
+        return cls._make(map(record.__getitem__, cls._fields))
+
+
+class EquipmentRow(NamedTuple):
+    equipment_instance_id: int
+    equipment_id: int
+    user_id: int
+    location: str
+    bonus: str
+    stars: int
+    updated_at: datetime
+
+    @classmethod
+    def from_record(cls, record):
+        return cls._make(map(record.__getitem__, cls._fields))
+
+    @property
+    def bonus_lines(self):
+        '''
+            The bonus as a list of "stat|modifier|value" lines.
+        '''
+        return [line for line in self.bonus.split(',') if line != '']
@@ -1,46 +1,14 @@
-from data.caves import Drop
+from data.enums import Drop
 from data.equipment import Equipment
+from data.catalog import get_catalog
 
 
 class Shop:
 
-    _shop = [
-        {
-            'type': Drop.EQUIPMENT,
-            'id': 2150,
-            'cost': (Drop.GOLD, Equipment.get_equipment_from_id(2150)['value'])
-        },
-        {
-            'type': Drop.EQUIPMENT,
-            'id': 1700,
-            'cost': (Drop.GOLD, Equipment.get_equipment_from_id(2150)['value'])
-        },
-        {
-            'type': Drop.EQUIPMENT,
-            'id': 3400,
-            'cost': (Drop.GOLD, Equipment.get_equipment_from_id(2150)['value'])
-        },
-        {
-            'type': Drop.EQUIPMENT,
-            'id': 4300,
-            'cost': (Drop.GOLD, Equipment.get_equipment_from_id(2150)['value'])
-        },
-        {
-            'type': Drop.EQUIPMENT,
-            'id': 5300,
-            'cost': (Drop.GOLD, Equipment.get_equipment_from_id(2150)['value'])
-        },
-        {
-            'type': Drop.EQUIPMENT,
-            'id': 6600,
-            'cost': (Drop.GOLD, Equipment.get_equipment_from_id(2150)['value'])
-        },
-    ]
-
     @staticmethod
     def get_shop_str_list():
         shop_list = []
-        for i in Shop._shop:
+        for i in get_catalog().shop:
             if i['type'] == Drop.EQUIPMENT:
                 base_equipment = Equipment.get_equipment_from_id(i["id"])
                 item_str = f'`{base_equipment["type"].value.title()}: '
@@ -48,9 +16,16 @@ class Shop:
                 shop_list.append(item_str)
         return shop_list
 
+    @staticmethod
+    def match_name(item_name: str):
+        '''
+            Returns the NameMatch of the name of a shop item typed by a player.
+        '''
+        return get_catalog().shop_names.match(item_name)
+
     @staticmethod
     def get_shop_item_from_name(item_name: str):
-        for i in Shop._shop:
+        for i in get_catalog().shop:
             if i['type'] == Drop.EQUIPMENT:
                 base_equipment = Equipment.get_equipment_from_id(i["id"])
                 if base_equipment['name'] == item_name:
@@ -0,0 +1,212 @@
+'''
+    Total stats for many users at once, for stat based leaderboards and balance analytics.
+
+    The catalog is turned into arrays once per catalog version. These are the flat and percentage
+    stats of every equipment, which of those stats get the star bonus, and cumulative set bonus
+    tables. The stats of a batch of users are then sums over the rows of those arrays.
+    The results match User.get_total_stats for every user.
+'''
+from collections import Counter
+import numpy as np
+from data.catalog import get_catalog
+from data.equipment import Equipment
+
+
+def _split_stats(stats: dict):
+    for key, value in stats.items():
+        stat, modifier = key.split('|')
+        yield stat, modifier, value
+
+
+class StatMatrices:
+    '''
+        The stats of a catalog version as arrays, with one column per stat.
+    '''
+
+    def __init__(self, catalog):
+        self.digest = catalog.digest
+        names = set(Equipment.stat_types)
+        for e in catalog.equipment:
+            names.update(stat for stat, _, _ in _split_stats(e['stats']))
+        for bonuses in catalog.sets.values():
+            for bonus in bonuses:
+                names.update(stat for stat, _, _ in _split_stats(bonus))
+        self.stat_names = sorted(names)
+        self.stat_index = {stat: i for i, stat in enumerate(self.stat_names)}
+        n_stats = len(self.stat_names)
+
+        self.set_names = list(catalog.sets)
+        set_index = {name: i for i, name in enumerate(self.set_names)}
+        self.equipment_index = {e['id']: i for i, e in enumerate(catalog.equipment)}
+        self.flat = np.zeros((len(catalog.equipment), n_stats), dtype=np.int64)
+        self.percent = np.zeros((len(catalog.equipment), n_stats), dtype=np.int64)
+        # 1 for every flat stat of an equipment. Each of them gets the star bonus.
+        self.star_mask = np.zeros((len(catalog.equipment), n_stats), dtype=np.int64)
+        # Index of the set of each equipment, or -1 when it has no set with bonuses.
+        self.equipment_set = np.full(len(catalog.equipment), -1, dtype=np.int64)
+        for i, e in enumerate(catalog.equipment):
+            for stat, modifier, value in _split_stats(e['stats']):
+                if modifier == '+':
+                    self.flat[i, self.stat_index[stat]] += value
+                    self.star_mask[i, self.stat_index[stat]] += 1
+                elif modifier == '%':
+                    self.percent[i, self.stat_index[stat]] += value
+            self.equipment_set[i] = set_index.get(e['set'], -1)
+
+        # set_flat[s, n] is the sum of the first n bonuses of set s, so a count of equipped pieces
+        # indexes its total set bonus directly.
+        max_tiers = max((len(bonuses) for bonuses in catalog.sets.values()), default=0)
+        self.set_flat = np.zeros((len(self.set_names), max_tiers + 1, n_stats), dtype=np.int64)
+        self.set_percent = np.zeros((len(self.set_names), max_tiers + 1, n_stats), dtype=np.int64)
+        for s, bonuses in enumerate(catalog.sets.values()):
+            for tier, bonus in enumerate(bonuses):
+                for stat, modifier, value in _split_stats(bonus):
+                    if modifier == '+':
+                        self.set_flat[s, tier + 1:, self.stat_index[stat]] += value
+                    elif modifier == '%':
+                        self.set_percent[s, tier + 1:, self.stat_index[stat]] += value
+            # Counts past the last bonus keep the full set bonus.
+            self.set_flat[s, len(bonuses) + 1:] = self.set_flat[s, len(bonuses)]
+            self.set_percent[s, len(bonuses) + 1:] = self.set_percent[s, len(bonuses)]
+
+        self.star_bonus = np.array([], dtype=np.int64)
+        self._extend_star_bonus(max((e['max_stars'] for e in catalog.equipment), default=0))
+        self._bonus_cache = {}
+
+    def _extend_star_bonus(self, max_stars: int):
+        if max_stars >= len(self.star_bonus):
+            self.star_bonus = np.array([Equipment.get_star_bonus(s) for s in range(max_stars + 1)], dtype=np.int64)
+
+    def _parse_bonus(self, bonus: str):
+        '''
+            Returns (stat columns, values, is percentage) arrays for a bonus string. Cached per string.
+        '''
+        parsed = self._bonus_cache.get(bonus)
+        if parsed is None:
+            columns, values, percent = [], [], []
+            for line in bonus.split(','):
+                if line != '':
+                    stat, modifier, value = line.split('|')
+                    if modifier not in ('+', '%'):
+                        continue
+                    if stat not in self.stat_index:
+                        # A stat no catalog entry has. Give it a column so it is still counted.
+                        self.stat_index[stat] = len(self.stat_names)
+                        self.stat_names.append(stat)
+                    columns.append(self.stat_index[stat])
+                    values.append(int(value))
+                    percent.append(modifier == '%')
+            parsed = (columns, values, percent)
+            self._bonus_cache[bonus] = parsed
+        return parsed
+
+
+_matrices = None
+
+
+def get_stat_matrices():
+    '''
+        Returns the StatMatrices of the current catalog, building them when the catalog version changes.
+    '''
+    global _matrices
+    catalog = get_catalog()
+    if _matrices is None or _matrices.digest != catalog.digest:
+        _matrices = StatMatrices(catalog)
+    return _matrices
+
+
+class BatchStats:
+    '''
+        Total stats of a batch of users. values[i, j] is stat stat_names[j] of user user_ids[i].
+    '''
+
+    def __init__(self, user_ids, stat_names, values):
+        self.user_ids = user_ids
+        self.stat_names = stat_names
+        self.values = values
+        self.row = {user_id: i for i, user_id in enumerate(user_ids)}
+
+    def column(self, stat: str):
+        if stat not in self.stat_names:
+            return np.zeros(len(self.user_ids), dtype=np.int64)
+        return self.values[:, self.stat_names.index(stat)]
+
+    def get(self, user_id: int):
+        '''
+            Returns the stats of one user as a Counter, like User.get_total_stats.
+        '''
+        row = self.values[self.row[user_id]]
+        return Counter({stat: int(value) for stat, value in zip(self.stat_names, row) if value != 0})
+
+    def top(self, stat: str, amount: int):
+        '''
+            Returns up to amount (user id, value) pairs with the highest value of stat.
+        '''
+        column = self.column(stat)
+        order = np.argsort(-column, kind='stable')[:amount]
+        return [(self.user_ids[i], int(column[i])) for i in order]
+
+
+def get_total_stats_batch(user_ids, equipment_list, blessings=None):
+    '''
+        Returns the BatchStats of user_ids from the equipment rows of all of them, such as the result
+        of one WHERE user_id = ANY($1) query. blessings maps user id to blessings and defaults to 0.
+        Rows of users not in user_ids and rows in the inventory are ignored.
+    '''
+    matrices = get_stat_matrices()
+    user_row = {user_id: i for i, user_id in enumerate(user_ids)}
+    users, equipment, stars = [], [], []
+    bonus_users, bonus_columns, bonus_values, bonus_percent = [], [], [], []
+    for e in equipment_list:
+        if e.location == 'inventory' or e.user_id not in user_row:
+            continue
+        i = user_row[e.user_id]
+        users.append(i)
+        equipment.append(matrices.equipment_index[e.equipment_id])
+        stars.append(e.stars)
+        if e.bonus:
+            columns, values, percent = matrices._parse_bonus(e.bonus)
+            bonus_users.extend([i] * len(columns))
+            bonus_columns.extend(columns)
+            bonus_values.extend(values)
+            bonus_percent.extend(percent)
+
+    n_users, n_stats = len(user_ids), len(matrices.stat_names)
+    flat = np.zeros((n_users, n_stats), dtype=np.int64)
+    percent = np.zeros((n_users, n_stats), dtype=np.int64)
+    if users:
+        users = np.array(users, dtype=np.int64)
+        equipment = np.array(equipment, dtype=np.int64)
+        stars = np.array(stars, dtype=np.int64)
+        matrices._extend_star_bonus(int(stars.max()))
+        catalog_stats = slice(0, matrices.flat.shape[1])
+        np.add.at(
+            flat[:, catalog_stats], users,
+            matrices.flat[equipment] + matrices.star_mask[equipment] * matrices.star_bonus[stars][:, None])
+        np.add.at(percent[:, catalog_stats], users, matrices.percent[equipment])
+        if bonus_users:
+            bonus_users = np.array(bonus_users, dtype=np.int64)
+            bonus_columns = np.array(bonus_columns, dtype=np.int64)
+            bonus_values = np.array(bonus_values, dtype=np.int64)
+            is_percent = np.array(bonus_percent, dtype=bool)
+            np.add.at(flat, (bonus_users[~is_percent], bonus_columns[~is_percent]), bonus_values[~is_percent])
+            np.add.at(percent, (bonus_users[is_percent], bonus_columns[is_percent]), bonus_values[is_percent])
+        equipment_set = matrices.equipment_set[equipment]
+        has_set = equipment_set >= 0
+        if has_set.any():
+            counts = np.zeros((n_users, len(matrices.set_names)), dtype=np.int64)
+            np.add.at(counts, (users[has_set], equipment_set[has_set]), 1)
+            counts = np.minimum(counts, matrices.set_flat.shape[1] - 1)
+            for s in np.flatnonzero(counts.any(axis=0)):
+                flat[:, catalog_stats] += matrices.set_flat[s][counts[:, s]]
+                percent[:, catalog_stats] += matrices.set_percent[s][counts[:, s]]
+
+    # The same float operations as User.get_total_stats. Adding 0% leaves a stat unchanged, so every
+    # stat can go through it, and np.trunc matches int() for the rounding toward zero.
+    totals = np.trunc(flat + flat * (percent / 100)).astype(np.int64)
+    if 'exp' in matrices.stat_index:
+        exp = matrices.stat_index['exp']
+        blessings = blessings or {}
+        user_blessings = np.array([blessings.get(user_id, 0) for user_id in user_ids], dtype=np.int64)
+        totals[:, exp] = np.trunc(totals[:, exp] + totals[:, exp] * (user_blessings / 100))
+    return BatchStats(list(user_ids), list(matrices.stat_names), totals)
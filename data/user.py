@@ -1,24 +1,57 @@
 import math
+from bisect import bisect_right
 from data.equipment import Equipment
+from data.catalog import get_catalog
 from collections import Counter
 
+# Highest level whose exp still fits in a signed 64 bit integer, the type of users.exp.
+MAX_STORED_LEVEL = 275
+
+
+def _level_exp(level: int):
+    # return 10 * level + 10 * level ** 2
+    return math.ceil(165 * 1.15 ** level - 164)
+
 
 class User:
+    # Exp needed for each level starting at level 1. Index i holds the exp for level i + 1.
+    # Extended on demand for exp above the last entry.
+    level_thresholds = [_level_exp(level) for level in range(1, MAX_STORED_LEVEL + 1)]
+
     def __init__(self, user, equipment, items):
         pass
 
+    @staticmethod
+    def _extend_thresholds(exp: int):
+        thresholds = User.level_thresholds
+        while thresholds[-1] <= exp:
+            thresholds.append(_level_exp(len(thresholds) + 1))
+
     @staticmethod
     def exp_to_level(exp: int):
-        # a = 10
-        # b = 10
-        # c = -exp
-        # level = (-b + math.sqrt(b ** 2 - 4 * a * c)) / (2 * a)
-        return int(math.log((exp + 164) / 165, 1.15))
+        '''
+            Returns the level for exp. A level is reached at exactly level_to_exp(level) exp.
+        '''
+        if exp >= User.level_thresholds[-1]:
+            User._extend_thresholds(exp)
+        return bisect_right(User.level_thresholds, exp)
+
+    @staticmethod
+    def exp_to_levels(exp_list):
+        '''
+            Returns the level for every exp in exp_list, in the same order.
+        '''
+        if not exp_list:
+            return []
+        User._extend_thresholds(max(exp_list))
+        thresholds = User.level_thresholds
+        return [bisect_right(thresholds, exp) for exp in exp_list]
 
     @staticmethod
     def level_to_exp(level: int):
-        # return 10 * level + 10 * level ** 2
-        return math.ceil(165 * 1.15 ** level - 164)
+        if 0 < level <= len(User.level_thresholds):
+            return User.level_thresholds[level - 1]
+        return _level_exp(level)
 
     @staticmethod
     def get_exp_bar(exp: int):
@@ -27,14 +60,8 @@ class User:
         current_level_exp = User.level_to_exp(current_level)
         next_level_exp = User.level_to_exp(next_level)
         percentage = int((exp - current_level_exp) / (next_level_exp - current_level_exp) * 100)
-        percentage_ticks = int(percentage / 5)
-        exp_bar = '|'
-        for i in range(percentage_ticks):
-            exp_bar += '■'
-        for i in range(20 - percentage_ticks):
-            exp_bar += '-'
-        exp_bar += '|'
-        return exp_bar
+        percentage_ticks = min(max(int(percentage / 5), 0), 20)
+        return '|' + '■' * percentage_ticks + '-' * (20 - percentage_ticks) + '|'
 
     @staticmethod
     def get_total_stats(user, equipment_list, blessings=0):
@@ -44,27 +71,27 @@ class User:
         stats = Counter()
         bonus_percentages = Counter()
         sets = Counter()
-        equipped_gear = [e for e in equipment_list if e['location'] != 'inventory']
+        equipped_gear = [e for e in equipment_list if e.location != 'inventory']
         for e in equipped_gear:
-            base_equipment = Equipment.get_equipment_from_id(e['equipment_id'])
+            base_equipment = Equipment.get_equipment_from_id(e.equipment_id)
             for key, value in base_equipment['stats'].items():
                 stat, modifier = key.split('|')
                 if modifier == '+':
-                    stats[stat] += value + Equipment.get_star_bonus(e['stars'])
+                    stats[stat] += value + Equipment.get_star_bonus(e.stars)
                 elif modifier == '%':
                     bonus_percentages[stat] += value
-            for bonus in e['bonus'].split(','):
-                if bonus != '':
-                    stat, modifier, value = bonus.split('|')
-                    if modifier == '+':
-                        stats[stat] += int(value)
-                    elif modifier == '%':
-                        bonus_percentages[stat] += int(value)
+            for bonus in e.bonus_lines:
+                stat, modifier, value = bonus.split('|')
+                if modifier == '+':
+                    stats[stat] += int(value)
+                elif modifier == '%':
+                    bonus_percentages[stat] += int(value)
             sets[base_equipment['set']] += 1
+        set_bonuses = get_catalog().sets
         for set, count in sets.items():
-            if set in Equipment.sets:
+            if set in set_bonuses:
                 for i in range(count):
-                    for key, value in Equipment.sets[set][i].items():
+                    for key, value in set_bonuses[set][i].items():
                         stat, modifier = key.split('|')
                         if modifier == '+':
                             stats[stat] += value
@@ -78,16 +105,16 @@ class User:
     @staticmethod
     def get_equipment_in_location(equipment_list, location):
         for e in equipment_list:
-            if e['location'] == location:
+            if e.location == location:
                 return e
         return None
 
     @staticmethod
     def get_equipped_gear_str(equipment_list):
         equipped_gear = [
-            Equipment.get_equipment_from_id(gear['equipment_id']) for gear
+            Equipment.get_equipment_from_id(gear.equipment_id) for gear
             in equipment_list
-            if not gear['location'] == 'inventory'
+            if not gear.location == 'inventory'
         ]
         gear_str = '\n'.join([
             f'`{gear["type"].value.title()}:` `Lv: {gear["level"]}` `{gear["name"]}`'
@@ -97,9 +124,9 @@ class User:
     @staticmethod
     def get_inventory_list(equipment_list):
         equipped_gear = [
-            Equipment.get_equipment_from_id(gear['equipment_id']) for gear
+            Equipment.get_equipment_from_id(gear.equipment_id) for gear
             in equipment_list
-            if gear['location'] == 'inventory'
+            if gear.location == 'inventory'
         ]
         inventory_list = [
             f'`{gear["type"].value.title()}:` `Lv: {gear["level"]}` `{gear["name"]}`'
@@ -114,30 +141,29 @@ class User:
         if equipment:
             stats_str += f'**__{base_equipment["name"]}__**\n'
             stats_str += f'`Lv: {base_equipment["level"]}`\n'
-            for i in range(equipment['stars']):
+            for i in range(equipment.stars):
                 stats_str += '★'
-            for i in range(max(base_equipment['max_stars'] - equipment['stars'], 0)):
+            for i in range(max(base_equipment['max_stars'] - equipment.stars, 0)):
                 stats_str += '☆'
             stats_str += '\n'
             for key, value in base_equipment['stats'].items():
                 stat, modifier = key.split('|')
                 if modifier == '+':
-                    stats_str += f'`{stat}: {modifier}{value + Equipment.get_star_bonus(equipment["stars"])}'
-                    stats_str += f' ({value} + {Equipment.get_star_bonus(equipment["stars"])})`\n'
+                    stats_str += f'`{stat}: {modifier}{value + Equipment.get_star_bonus(equipment.stars)}'
+                    stats_str += f' ({value} + {Equipment.get_star_bonus(equipment.stars)})`\n'
                 elif modifier == '%':
                     stats_str += f'`{stat}: {value}{modifier}`\n'
             stats_str += '----------Bonuses----------\n'
-            for bonus in equipment['bonus'].split(','):
-                if bonus != '':
-                    stat, modifier, value = bonus.split('|')
-                    if modifier == '+':
-                        stats_str += f'`{modifier}{value} {stat}`\n'
-                    elif modifier == '%':
-                        stats_str += f'`{value}{modifier} {stat}`\n'
+            for bonus in equipment.bonus_lines:
+                stat, modifier, value = bonus.split('|')
+                if modifier == '+':
+                    stats_str += f'`{modifier}{value} {stat}`\n'
+                elif modifier == '%':
+                    stats_str += f'`{value}{modifier} {stat}`\n'
             set_count = [
                 e for e in equipment_list
-                if Equipment.get_equipment_from_id(e['equipment_id'])['set'] == base_equipment['set'] and not
-                e['location'] == 'inventory']
+                if Equipment.get_equipment_from_id(e.equipment_id)['set'] == base_equipment['set'] and not
+                e.location == 'inventory']
             stats_str += Equipment.get_set_bonus_str(base_equipment['set'], len(set_count))
             return stats_str
         else:
@@ -148,18 +174,18 @@ class User:
         equipment = Equipment.get_equipment_from_name(equipment_name)
         if equipment is not None:
             for e in equipment_list:
-                if e['equipment_id'] == equipment['id']:
+                if e.equipment_id == equipment['id']:
                     return e
         return None
 
     @staticmethod
     def get_equipment_from_id(equipment_list, equipment_id):
         for e in equipment_list:
-            if e['equipment_id'] == equipment_id:
+            if e.equipment_id == equipment_id:
                 return e
         return None
 
     @staticmethod
     def get_lines_for_equipment(equipment_list, equipment_name):
         equipment = User.get_equipment_from_name(equipment_list, equipment_name)
-        return len([bonus for bonus in equipment['bonus'].split(',') if not bonus == ''])
+        return len(equipment.bonus_lines)
@@ -3,6 +3,16 @@ from discord.ext import commands
 import os
 from dotenv import load_dotenv
 import logging
+import asyncio
+import time
+from data.catalog import get_catalog, pin_catalog, reload_catalog
+from util.migrate import migrate
+from util.scheduler import Scheduler
+from util.member_cache import ActiveMemberCache
+from util.prefixes import PrefixMap
+from util.recorder import TrafficRecorder, FLUSH_SECONDS
+from util.watchdog import LoopWatchdog, STALL_THRESHOLD
+import util.metrics as metrics
 
 load_dotenv()
 logger = logging.getLogger('discord')
@@ -10,17 +20,44 @@ logger.setLevel(logging.DEBUG)
 handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
 handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
 logger.addHandler(handler)
+logging.getLogger('watchdog').addHandler(handler)
 intents = discord.Intents.default()  # All but the two privileged ones
 intents.members = True  # Subscribe to the Members intent
+# Lean mode skips chunking guilds at startup and only caches recently active members.
+LEAN_MEMBER_CACHE = os.getenv('LEAN_MEMBER_CACHE') == 'True'
+MEMBER_CACHE_SIZE = int(os.getenv('MEMBER_CACHE_SIZE', '10000'))
+member_cache_options = {}
+if LEAN_MEMBER_CACHE:
+    member_cache_options = {
+        'chunk_guilds_at_startup': False,
+        'member_cache_flags': discord.MemberCacheFlags.none(),
+    }
 PRODUCTION = os.getenv('PRODUCTION')
 if PRODUCTION == 'False':
     TOKEN = os.getenv('TOKEN_DEVELOPMENT')
-    client = commands.Bot(command_prefix='-', intents=intents)
+    prefixes = PrefixMap('-')
 else:
     TOKEN = os.getenv('TOKEN')
-    client = commands.Bot(command_prefix=';', intents=intents)
+    prefixes = PrefixMap(';')
+client = commands.Bot(command_prefix=prefixes, intents=intents, **member_cache_options)
+client.prefixes = prefixes
 
 client.remove_command('help')
+client.scheduler = Scheduler()
+client.member_cache = ActiveMemberCache(MEMBER_CACHE_SIZE) if LEAN_MEMBER_CACHE else None
+if client.member_cache is not None:
+    metrics.register_gauge('member_cache.size', lambda: len(client.member_cache))
+# Directory for the command traffic log read by util.replay. Recording is off when unset.
+RECORD_TRAFFIC = os.getenv('RECORD_TRAFFIC')
+client.recorder = None
+if RECORD_TRAFFIC:
+    client.recorder = TrafficRecorder(RECORD_TRAFFIC, os.getenv('RECORD_SALT', '').encode() or None)
+
+    async def flush_recorder():
+        client.recorder.flush()
+    client.scheduler.every('flush-recorder', FLUSH_SECONDS, flush_recorder)
+# Seconds the event loop may be blocked before the watchdog reports what blocks it.
+client.watchdog = LoopWatchdog(float(os.getenv('LOOP_STALL_THRESHOLD', STALL_THRESHOLD)))
 
 extensions = [
     'cogs.mining',
@@ -70,14 +107,77 @@ async def reload(ctx, extension):
         print(f'{extension} cannot be reloaded. [{exception}]')
 
 
+@client.command(name='reload-catalog')
+@commands.check(check_if_me)
+async def reload_catalog_command(ctx):
+    try:
+        old, new = reload_catalog()
+    except Exception as exception:
+        await ctx.send(f'Catalog cannot be reloaded. [{exception}]'[:2000])
+        print(f'Catalog cannot be reloaded. [{exception}]')
+        return
+    client.dispatch('catalog_reload', old, new)
+    await ctx.send(f'Catalog reloaded. {old.version} -> {new.version}')
+    print(f'Catalog reloaded. {old.version} -> {new.version}')
+
+
+@client.check
+async def pin_catalog_check(ctx):
+    # Commands keep the catalog version they started with, even if it is reloaded while they run.
+    # Global checks run before the command's own checks, such as the mining cooldown, so those see it too.
+    pin_catalog()
+    return True
+
+
+@client.before_invoke
+async def before_invoke(ctx):
+    if client.member_cache is not None and isinstance(ctx.author, discord.Member):
+        client.member_cache.touch(ctx.author)
+    client.watchdog.command_started(ctx)
+    if client.recorder is not None:
+        ctx.recorded_at = (time.time(), time.perf_counter())
+
+
+@client.after_invoke
+async def after_invoke(ctx):
+    client.watchdog.command_finished(ctx)
+
+
+@client.event
+async def on_message(message):
+    # Runs for every message the bot sees. Most are dropped here, before any parsing.
+    if message.author.bot or not client.prefixes.could_match(message.content):
+        return
+    await client.process_commands(message)
+
+
+@client.listen('on_command_completion')
+async def record_command_completion(ctx):
+    if client.recorder is not None:
+        client.recorder.record_context(ctx)
+
+
+@client.event
+async def on_command_error(ctx, error):
+    if client.recorder is not None:
+        client.recorder.record_context(ctx, error)
+    # A listener for this event would silence the default handler, which prints unhandled errors.
+    await commands.Bot.on_command_error(client, ctx, error)
+
+
 @client.event
 async def on_ready():
     print("Bot is ready")
+    client.scheduler.start()
+    client.watchdog.start()
 
     game = discord.Game('<3!')
     await client.change_presence(activity=game)
 
 if __name__ == '__main__':
+    print(f'Catalog {get_catalog().version} loaded')
+    asyncio.get_event_loop().run_until_complete(migrate())
+    asyncio.get_event_loop().run_until_complete(client.prefixes.load())
     for extension in extensions:
         try:
             client.load_extension(extension)
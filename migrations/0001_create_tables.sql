@@ -0,0 +1,17 @@
+-- Base tables of the game.
+CREATE TABLE IF NOT EXISTS users (
+    user_id bigint PRIMARY KEY,
+    exp bigint NOT NULL DEFAULT 0,
+    cave text NOT NULL DEFAULT 'Beginner Cave',
+    gold bigint NOT NULL DEFAULT 0,
+    blessings integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS equipment (
+    equipment_instance_id serial PRIMARY KEY,
+    equipment_id integer NOT NULL,
+    user_id bigint NOT NULL REFERENCES users (user_id),
+    location text NOT NULL DEFAULT 'inventory',
+    bonus text NOT NULL DEFAULT '',
+    stars integer NOT NULL DEFAULT 0
+);
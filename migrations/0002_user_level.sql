@@ -0,0 +1,48 @@
+-- exp_to_level(exp) in SQL, with the integer thresholds of data.user.User.level_thresholds up to
+-- MAX_STORED_LEVEL. Changing the level formula needs a new migration that replaces this function.
+-- Immutable so it can compute the stored users.level column.
+CREATE OR REPLACE FUNCTION exp_to_level(exp bigint) RETURNS integer
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT count(*)::integer FROM unnest('{
+        26, 55, 87, 125, 168, 218, 275, 341,
+        417, 504, 604, 719, 852, 1004, 1179, 1381,
+        1612, 1878, 2185, 2537, 2942, 3408, 3944, 4560,
+        5268, 6083, 7020, 8097, 9336, 10761, 12400, 14285,
+        16452, 18944, 21810, 25107, 28897, 33256, 38269, 44034,
+        50664, 58288, 67055, 77138, 88733, 102068, 117403, 135038,
+        155318, 178640, 205460, 236304, 271774, 312565, 359474, 413420,
+        475457, 546800, 628845, 723196, 831700, 956480, 1099976, 1264997,
+        1454771, 1673012, 1923988, 2212611, 2544527, 2926230, 3365189, 3869992,
+        4450516, 5118118, 5885860, 6768763, 7784102, 8951742, 10294528, 11838732,
+        13614566, 15656775, 18005316, 20706138, 23812083, 27383920, 31491533, 36215287,
+        41647605, 47894770, 55079010, 63340886, 72842044, 83768375, 96333656, 110783728,
+        127401312, 146511534, 168488288, 193761556, 222825814, 256249710, 294687191, 338890295,
+        389723863, 448182467, 515409862, 592721366, 681629595, 783874059, 901455193, 1036673496,
+        1192174545, 1371000751, 1576650888, 1813148546, 2085120853, 2397889005, 2757572380, 3171208262,
+        3646889526, 4193922979, 4823011450, 5546463192, 6378432696, 7335197625, 8435477293, 9700798911,
+        11155918773, 12829306613, 14753702630, 16966758049, 19511771780, 22438537572, 25804318232, 29674965992,
+        34126210915, 39245142577, 45131913988, 51901701110, 59686956301, 68639999771, 78935999761, 90776399750,
+        104392859737, 120051788722, 138059557055, 158768490638, 182583764258, 209971328921, 241467028284, 277687082551,
+        319340144958, 367241166726, 422327341760, 485676443048, 558527909530, 642307095984, 738653160406, 849451134491,
+        976868804690, 1123399125418, 1291908994255, 1485695343418, 1708549644955, 1964832091723, 2259556905505, 2598490441356,
+        2988264007584, 3436503608746, 3951979150082, 4544776022619, 5226492426036, 6010466289966, 6912036233486, 7948841668533,
+        9141167918838, 10512343106688, 12089194572716, 13902573758648, 15987959822469, 18386153795864, 21144076865268, 24315688395083,
+        27963041654370, 32157497902550, 36981122587957, 42528290976175, 48907534622626, 56243664816045, 64680214538476, 74382246719272,
+        85539583727187, 98370521286290, 113126099479258, 130095014401171, 149609266561371, 172050656545601, 197858255027466, 227536993281610,
+        261667542273876, 300917673614982, 346055324657254, 397963623355866, 457658166859271, 526306891888186, 605252925671438, 696040864522179,
+        800446994200530, 920514043330634, 1058591149830253, 1217379822304816, 1399986795650562, 1609984814998171, 1851482537247921, 2129204917835134,
+        2448585655510428, 2815873503837016, 3238254529412593, 3723992708824507, 4282591615148206, 4924980357420462, 5663727411033555, 6513286522688613,
+        7490279501091928, 8613821426255742, 9905894640194126, 11391778836223268, 13100545661656784, 15065627510905324, 17325471637541144, 19924292383172340,
+        22912936240648216, 26349876676745472, 30302358178257312, 34847711904995932, 40074868690745344, 46086098994357168, 52999013843510768, 60948865920037392,
+        70091195808043024, 80604875179249504, 92695606456136928, 106599947424557488, 122589939538241136, 140978430468977312, 162125195039323904, 186443974295222528,
+        214410570439505920, 246572156005431808, 283557979406246592, 326091676317183552, 375005427764761088, 431256241929475200, 495944678218896448, 570336379951730944,
+        655886836944490624, 754269862486164096, 867410341859088768, 997521893137952000, 1147150177108644736, 1319222703674941184, 1517106109226182400, 1744672025610109696,
+        2006372829451625984, 2307328753869369856, 2653428066949775360, 3051442276992241664, 3509158618541077504, 4035532411322238464, 4640862273020573696, 5336991613973659648,
+        6137540356069707776, 7058171409480164352, 8116897120902187008
+    }'::bigint[]) AS threshold WHERE threshold <= exp
+$$;
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS level integer GENERATED ALWAYS AS (exp_to_level(exp)) STORED;
+
+CREATE INDEX IF NOT EXISTS users_level_idx ON users (level);
@@ -0,0 +1,17 @@
+-- Only one item can be equipped per (user, slot). Items that broke this before are sent back to the inventory.
+-- An exclusion constraint instead of a partial unique index so it can be deferred to the end of the
+-- statement, which lets equip_equipment swap two items in one UPDATE. Its index also serves lookups of
+-- a user's equipped items.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'equipment_one_per_slot') THEN
+        UPDATE equipment e SET location = 'inventory'
+        WHERE e.location <> 'inventory' AND EXISTS (
+            SELECT 1 FROM equipment o
+            WHERE o.user_id = e.user_id AND o.location = e.location
+            AND o.equipment_instance_id < e.equipment_instance_id);
+        ALTER TABLE equipment ADD CONSTRAINT equipment_one_per_slot
+        EXCLUDE (user_id WITH =, location WITH =) WHERE (location <> 'inventory')
+        DEFERRABLE INITIALLY IMMEDIATE;
+    END IF;
+END $$;
@@ -0,0 +1,16 @@
+-- Duplicates are stars, not extra rows. Older duplicate rows are merged away, keeping the equipped
+-- or highest star copy, before the unique index grant_equipment relies on is created.
+-- The index also serves every WHERE user_id = $1 lookup of equipment.
+DO $$
+BEGIN
+    IF to_regclass('equipment_user_equipment_idx') IS NULL THEN
+        DELETE FROM equipment WHERE equipment_instance_id IN (
+            SELECT equipment_instance_id FROM (
+                SELECT equipment_instance_id, row_number() OVER (
+                    PARTITION BY user_id, equipment_id
+                    ORDER BY location <> 'inventory' DESC, stars DESC, equipment_instance_id) AS n
+                FROM equipment) ranked
+            WHERE n > 1);
+        CREATE UNIQUE INDEX equipment_user_equipment_idx ON equipment (user_id, equipment_id);
+    END IF;
+END $$;
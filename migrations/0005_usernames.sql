@@ -0,0 +1,6 @@
+-- Names of users for rendering lists of users that are not in the client's cache. See util.names.
+CREATE TABLE IF NOT EXISTS usernames (
+    user_id bigint PRIMARY KEY,
+    name text NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
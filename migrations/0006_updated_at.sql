@@ -0,0 +1,25 @@
+-- Watermark for util.export. Rows are never deleted by the game, so inserts and updates are every change.
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END $$;
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS users_updated_at_idx ON users (updated_at);
+ALTER TABLE equipment ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS equipment_updated_at_idx ON equipment (updated_at);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'users_touch_updated_at') THEN
+        CREATE TRIGGER users_touch_updated_at BEFORE UPDATE ON users
+        FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'equipment_touch_updated_at') THEN
+        CREATE TRIGGER equipment_touch_updated_at BEFORE UPDATE ON equipment
+        FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+    END IF;
+END $$;
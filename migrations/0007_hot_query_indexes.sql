@@ -0,0 +1,6 @@
+-- Indexes for the hot queries of util/dbutil.py that nothing else covers.
+-- The global leaderboard: ORDER BY exp DESC LIMIT n.
+CREATE INDEX IF NOT EXISTS users_exp_idx ON users (exp DESC);
+-- Loadouts and inventories: WHERE user_id = $1 AND location = $2, including the inventory that
+-- equipment_one_per_slot leaves out.
+CREATE INDEX IF NOT EXISTS equipment_user_location_idx ON equipment (user_id, location);
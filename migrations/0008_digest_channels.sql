@@ -0,0 +1,7 @@
+-- Channels where mine results and cooldown notices are buffered into one summary message. See util.digest.
+CREATE TABLE IF NOT EXISTS digest_channels (
+    channel_id bigint PRIMARY KEY,
+    guild_id bigint NOT NULL,
+    window_seconds integer NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
@@ -0,0 +1,6 @@
+-- Command prefixes of guilds that do not use the default one. See util.prefixes.
+CREATE TABLE IF NOT EXISTS guild_prefixes (
+    guild_id bigint PRIMARY KEY,
+    prefix text NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
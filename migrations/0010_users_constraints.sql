@@ -0,0 +1,57 @@
+-- The constraints of 0001 for databases whose tables existed before it, where its CREATE TABLE IF NOT
+-- EXISTS did nothing. grant_equipment and bulk_update_users rely on ON CONFLICT (user_id).
+-- Missing values get the column defaults first. Duplicate users keep the row with the most exp,
+-- equipment without an owner is removed, and owners missing from users get a default row.
+UPDATE users SET exp = 0 WHERE exp IS NULL;
+UPDATE users SET cave = 'Beginner Cave' WHERE cave IS NULL;
+UPDATE users SET gold = 0 WHERE gold IS NULL;
+UPDATE users SET blessings = 0 WHERE blessings IS NULL;
+ALTER TABLE users
+    ALTER COLUMN exp SET DEFAULT 0,
+    ALTER COLUMN exp SET NOT NULL,
+    ALTER COLUMN cave SET DEFAULT 'Beginner Cave',
+    ALTER COLUMN cave SET NOT NULL,
+    ALTER COLUMN gold SET DEFAULT 0,
+    ALTER COLUMN gold SET NOT NULL,
+    ALTER COLUMN blessings SET DEFAULT 0,
+    ALTER COLUMN blessings SET NOT NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'users'::regclass AND contype = 'p') THEN
+        DELETE FROM users WHERE user_id IS NULL;
+        DELETE FROM users WHERE ctid IN (
+            SELECT ctid FROM (
+                SELECT ctid, row_number() OVER (PARTITION BY user_id ORDER BY exp DESC, gold DESC) AS n
+                FROM users) ranked
+            WHERE n > 1);
+        ALTER TABLE users ADD CONSTRAINT users_pkey PRIMARY KEY (user_id);
+    END IF;
+END $$;
+
+UPDATE equipment SET location = 'inventory' WHERE location IS NULL;
+UPDATE equipment SET bonus = '' WHERE bonus IS NULL;
+UPDATE equipment SET stars = 0 WHERE stars IS NULL;
+DELETE FROM equipment WHERE user_id IS NULL;
+ALTER TABLE equipment
+    ALTER COLUMN user_id SET NOT NULL,
+    ALTER COLUMN location SET DEFAULT 'inventory',
+    ALTER COLUMN location SET NOT NULL,
+    ALTER COLUMN bonus SET DEFAULT '',
+    ALTER COLUMN bonus SET NOT NULL,
+    ALTER COLUMN stars SET DEFAULT 0,
+    ALTER COLUMN stars SET NOT NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'equipment'::regclass AND contype = 'f' AND confrelid = 'users'::regclass
+    ) THEN
+        INSERT INTO users (user_id)
+        SELECT DISTINCT user_id FROM equipment
+        ON CONFLICT (user_id) DO NOTHING;
+        ALTER TABLE equipment ADD CONSTRAINT equipment_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES users (user_id);
+    END IF;
+END $$;
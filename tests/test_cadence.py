@@ -0,0 +1,44 @@
+import random
+import unittest
+from util.cadence import CadenceDetector
+
+START = 1_600_000_000.0
+
+
+def simulate(delays, cooldown=10.0, hours=1, mines=40):
+    '''
+        Records mines that each follow the end of the previous cooldown by a delay from delays, spread over
+        hours sessions one hour apart. Returns the score after the last mine.
+    '''
+    detector = CadenceDetector()
+    now = START
+    score = None
+    for hour in range(hours):
+        now = START + hour * 3600
+        for _ in range(mines):
+            score = detector.record(1, now, cooldown)
+            now += cooldown + next(delays)
+    return score
+
+
+class CadenceTest(unittest.TestCase):
+    def test_human_at_cooldown_is_not_suspicious(self):
+        rng = random.Random(44)
+        for spread in (2.0, 3.0):
+            for _ in range(50):
+                delays = iter(lambda: rng.uniform(0, spread), None)
+                score = simulate(delays)
+                self.assertFalse(score.suspicious, f'0-{spread}s delays: {score}')
+
+    def test_regularity_alone_is_not_suspicious(self):
+        score = simulate(iter(lambda: 0.05, None))
+        self.assertFalse(score.suspicious, str(score))
+
+    def test_script_mining_all_day_is_suspicious(self):
+        rng = random.Random(44)
+        score = simulate(iter(lambda: rng.uniform(0.0, 0.1), None), hours=24, mines=20)
+        self.assertTrue(score.suspicious, str(score))
+
+
+if __name__ == '__main__':
+    unittest.main()
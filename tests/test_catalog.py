@@ -0,0 +1,105 @@
+import contextvars
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import data.catalog as catalog
+from data.catalog import (
+    CACHE_DIR_NAME, CATALOG_FILES, CATALOG_DIR, CatalogError, load_catalog, parse_catalog, pin_catalog, reload_catalog)
+from data.caves import Cave
+
+
+class ReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for file_name in CATALOG_FILES:
+            shutil.copy(os.path.join(CATALOG_DIR, file_name), self.directory)
+        self.active = catalog._catalog
+        catalog._catalog = load_catalog(self.directory)
+
+    def tearDown(self):
+        catalog._catalog = self.active
+        shutil.rmtree(self.directory)
+
+    def edit_caves(self, edit):
+        path = os.path.join(self.directory, 'caves.json')
+        with open(path, encoding='utf-8') as f:
+            content = json.load(f)
+        edit(content['caves'])
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(content, f)
+
+    def test_reload_carries_quantities(self):
+        catalog._catalog.cave_by_name['Dark Cave']['current_quantity'] = 42
+        self.edit_caves(lambda caves: caves[0].update(exp=caves[0]['exp'] + 1))
+        old, new = reload_catalog(self.directory)
+        self.assertIsNot(old, new)
+        self.assertIs(catalog._catalog, new)
+        self.assertEqual(new.cave_by_name['Dark Cave']['current_quantity'], 42)
+
+    def test_mine_pinned_before_reload_counts_in_new_catalog(self):
+        catalog._catalog.cave_by_name['Dark Cave']['current_quantity'] = 42
+
+        def mine_across_reload():
+            pin_catalog()
+            cave = Cave.from_cave_name('Dark Cave')
+            reload_catalog(self.directory)
+            cave.mine_cave()
+            return cave
+
+        cave = contextvars.copy_context().run(mine_across_reload)
+        self.assertEqual(catalog._catalog.cave_by_name['Dark Cave']['current_quantity'], 41)
+        self.assertEqual(cave.current_quantity, 41)
+
+    def test_reload_rejects_removed_cave(self):
+        active = catalog._catalog
+        self.edit_caves(lambda caves: caves.remove(next(c for c in caves if c['name'] == 'Dark Cave')))
+        with self.assertRaises(CatalogError) as raised:
+            reload_catalog(self.directory)
+        self.assertTrue(any('Dark Cave' in problem for problem in raised.exception.problems))
+        self.assertIs(catalog._catalog, active)
+
+    def test_reload_rejects_renamed_cave(self):
+        active = catalog._catalog
+        self.edit_caves(lambda caves: next(c for c in caves if c['name'] == 'Ice Cave').update(name='Frost Cave'))
+        with self.assertRaises(CatalogError):
+            reload_catalog(self.directory)
+        self.assertIs(catalog._catalog, active)
+
+
+class ReadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for file_name in CATALOG_FILES:
+            shutil.copy(os.path.join(CATALOG_DIR, file_name), self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_file(self):
+        os.remove(os.path.join(self.directory, 'shop.json'))
+        with self.assertRaises(CatalogError) as raised:
+            load_catalog(self.directory)
+        self.assertTrue(any(problem.startswith('shop.json') for problem in raised.exception.problems))
+        with self.assertRaises(CatalogError):
+            parse_catalog(self.directory)
+
+    def test_top_level_not_an_object(self):
+        with open(os.path.join(self.directory, 'sets.json'), 'w', encoding='utf-8') as f:
+            json.dump([], f)
+        with self.assertRaises(CatalogError) as raised:
+            load_catalog(self.directory, use_cache=False)
+        self.assertTrue(any(problem.startswith('sets.json') for problem in raised.exception.problems))
+
+    def test_cache_stays_in_directory(self):
+        production_cache = os.path.join(CATALOG_DIR, CACHE_DIR_NAME)
+        before = set(os.listdir(production_cache)) if os.path.isdir(production_cache) else set()
+        load_catalog(self.directory)
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, CACHE_DIR_NAME))), 1)
+        after = set(os.listdir(production_cache)) if os.path.isdir(production_cache) else set()
+        self.assertEqual(before, after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from data.name_index import NameIndex
+
+NAMES = [
+    'Developer Cave', 'Dark Cave', 'Ancient Pickaxe', 'Ancient Helmet', 'Pure Gloves',
+    'Superior Pure Gloves', 'Mastercrafted Pure Gloves', 'Void Walker Boots',
+]
+
+
+class NameIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = NameIndex(NAMES)
+
+    def assertMatch(self, query, name):
+        match = self.index.match(query)
+        self.assertEqual(match.name, name, f'{query!r} gave {match.name!r} {match.suggestions}')
+
+    def assertSuggests(self, query, names):
+        match = self.index.match(query)
+        self.assertIsNone(match.name, f'{query!r} matched {match.name!r}')
+        self.assertEqual(sorted(match.suggestions), sorted(names))
+
+    def test_same_name(self):
+        self.assertMatch("  dark  CAVE ", 'Dark Cave')
+        self.assertMatch('Pure Gloves', 'Pure Gloves')
+
+    def test_name_prefix(self):
+        self.assertMatch('mastercrafted pu', 'Mastercrafted Pure Gloves')
+        self.assertSuggests('ancient', ['Ancient Pickaxe', 'Ancient Helmet'])
+
+    def test_word_prefix(self):
+        self.assertMatch('walker', 'Void Walker Boots')
+        self.assertSuggests('glov', ['Pure Gloves', 'Superior Pure Gloves', 'Mastercrafted Pure Gloves'])
+
+    def test_abbreviation_covering_the_name(self):
+        self.assertMatch('ancpick', 'Ancient Pickaxe')
+
+    def test_abbreviation_of_word_initials(self):
+        self.assertMatch('vwb', 'Void Walker Boots')
+
+    def test_short_abbreviation_is_only_a_suggestion(self):
+        self.assertSuggests('deep', ['Developer Cave'])
+        self.assertSuggests('mcpure', ['Mastercrafted Pure Gloves'])
+
+    def test_edit_distance(self):
+        self.assertMatch('ancient helemt', 'Ancient Helmet')
+        self.assertSuggests('xyzzy', [])
+
+    def test_too_short_for_fuzzy(self):
+        self.assertSuggests('zz', [])
+
+
+if __name__ == '__main__':
+    unittest.main()
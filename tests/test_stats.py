@@ -0,0 +1,53 @@
+import random
+import unittest
+from data.catalog import get_catalog
+from data.equipment import Equipment
+from data.rows import EquipmentRow
+from data.stats import get_total_stats_batch
+from data.user import User
+
+
+def random_bonus(rng):
+    lines = rng.randint(0, 4)
+    return ''.join(
+        f'{rng.choice(Equipment.stat_types)}|{rng.choice("+%")}|{rng.randint(1, 60)},' for _ in range(lines))
+
+
+def random_equipment(rng, user_id, instance_ids):
+    '''
+        Returns equipment rows of user_id: at most one equipped piece per slot, and a few in the inventory.
+    '''
+    rows = []
+    for e in rng.sample(get_catalog().equipment, rng.randint(0, 10)):
+        slot = e['type'].value
+        equipped = rng.random() < 0.7 and all(row.location != slot for row in rows)
+        rows.append(EquipmentRow(
+            next(instance_ids), e['id'], user_id, slot if equipped else 'inventory',
+            random_bonus(rng), rng.randint(0, e['max_stars']), None))
+    return rows
+
+
+class BatchStatsTest(unittest.TestCase):
+    def test_batch_matches_scalar(self):
+        rng = random.Random(38)
+        instance_ids = iter(range(1, 1_000_000))
+        user_ids = list(range(1, 301))
+        equipment = {user_id: random_equipment(rng, user_id, instance_ids) for user_id in user_ids}
+        blessings = {user_id: rng.choice([0, 0, rng.randint(1, 200)]) for user_id in user_ids}
+        rows = [row for user_id in user_ids for row in equipment[user_id]]
+        rng.shuffle(rows)
+
+        batch = get_total_stats_batch(user_ids, rows, blessings)
+        for user_id in user_ids:
+            expected = User.get_total_stats(user_id, equipment[user_id], blessings[user_id])
+            expected = {stat: value for stat, value in expected.items() if value != 0}
+            self.assertEqual(dict(batch.get(user_id)), expected, f'user {user_id}')
+
+    def test_users_without_rows(self):
+        batch = get_total_stats_batch([1, 2], [])
+        self.assertEqual(dict(batch.get(1)), {})
+        self.assertEqual(batch.top('speed', 5), [(1, 0), (2, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+'''
+    Scores how machine-like the ;mine timing of each user is, so monster challenges can go to the
+    accounts that look automated instead of to everyone.
+
+    Every user has a ring buffer of their last HISTORY_SIZE mine times with the cooldown each mine
+    started, and the last epoch hour they mined in, for each hour of the day. All live in fixed size
+    arrays. Two signals make the score:
+
+    - Regularity. Scripts mine at near constant intervals, people do not. The coefficient of
+      variation (standard deviation / mean) of the intervals is compared with HUMAN_VARIATION. The
+      cooldown keeps intervals of eager players close together too, so the jitter (standard deviation)
+      of the delay after each cooldown ended must also stay under HUMAN_JITTER seconds. Intervals
+      longer than SESSION_GAP are breaks between sessions and are left out.
+    - Activity. People sleep. Mining in most of the last 24 hours raises the score.
+
+    Neither weight reaches SUSPICIOUS_SCORE alone, so only accounts that mine like a clock for most of
+    the day are suspicious. A score is 0 until a user has MIN_INTERVALS intervals in their history.
+'''
+import math
+import time
+from array import array
+import util.metrics as metrics
+
+HISTORY_SIZE = 32
+MIN_INTERVALS = 12
+SESSION_GAP = 600
+# Coefficient of variation at and above which intervals count as fully irregular.
+HUMAN_VARIATION = 0.5
+# Standard deviation in seconds of the delay after a cooldown ends, at and above which mines count as
+# fully human. Reacting within 0-2 seconds of every cooldown already has a jitter of about 0.6 seconds.
+HUMAN_JITTER = 1.0
+REGULARITY_WEIGHT = 0.5
+ACTIVITY_WEIGHT = 0.5
+# Active hours out of the last 24 at which the activity signal starts to count.
+ACTIVE_HOURS_FLOOR = 12
+SUSPICIOUS_SCORE = 0.6
+# Users that have not mined for this long are forgotten.
+FORGET_AFTER = 24 * 3600
+
+
+class History:
+    __slots__ = ('times', 'cooldowns', 'next', 'count', 'hours')
+
+    def __init__(self):
+        self.times = array('d', bytes(8 * HISTORY_SIZE))
+        # cooldowns[i] is the cooldown that started with the mine at times[i], 0 when unknown.
+        self.cooldowns = array('d', bytes(8 * HISTORY_SIZE))
+        self.next = 0
+        self.count = 0
+        # hours[h] is the last epoch hour with a mine at hour h of the day, -1 for never.
+        self.hours = array('q', [-1] * 24)
+
+    def add(self, now: float, cooldown: float = 0.0):
+        self.times[self.next] = now
+        self.cooldowns[self.next] = cooldown
+        self.next = (self.next + 1) % HISTORY_SIZE
+        self.count = min(self.count + 1, HISTORY_SIZE)
+        epoch_hour = int(now // 3600)
+        self.hours[epoch_hour % 24] = epoch_hour
+
+    def last(self):
+        return self.times[self.next - 1] if self.count else 0.0
+
+    def intervals(self):
+        '''
+            Returns (interval, delay after the cooldown ended) pairs of consecutive mines, oldest first.
+        '''
+        start = (self.next - self.count) % HISTORY_SIZE
+        slots = [(start + i) % HISTORY_SIZE for i in range(self.count)]
+        pairs = []
+        for a, b in zip(slots, slots[1:]):
+            interval = self.times[b] - self.times[a]
+            if interval <= SESSION_GAP:
+                pairs.append((interval, max(interval - self.cooldowns[a], 0.0)))
+        return pairs
+
+    def active_hours(self, now: float):
+        epoch_hour = int(now // 3600)
+        return sum(1 for hour in self.hours if hour > epoch_hour - 24)
+
+
+class Score:
+    __slots__ = ('score', 'variation', 'jitter', 'intervals', 'active_hours')
+
+    def __init__(self, score: float, variation: float, jitter: float, intervals: int, active_hours: int):
+        self.score = score
+        self.variation = variation
+        self.jitter = jitter
+        self.intervals = intervals
+        self.active_hours = active_hours
+
+    @property
+    def suspicious(self):
+        return self.score >= SUSPICIOUS_SCORE
+
+    def __str__(self):
+        variation = 'n/a' if self.variation is None else f'{self.variation:.3f}'
+        jitter = 'n/a' if self.jitter is None else f'{self.jitter:.2f}s'
+        return (f'score {self.score:.2f}, variation {variation}, jitter {jitter} over {self.intervals} intervals, '
+                f'active {self.active_hours}/24 hours')
+
+
+def _deviation(values):
+    mean = sum(values) / len(values)
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+
+
+class CadenceDetector:
+    def __init__(self):
+        self.histories = {}
+
+    def record(self, user_id: int, now: float = None, cooldown: float = 0.0):
+        '''
+            Records a mine of user_id that started a cooldown of cooldown seconds and returns their Score.
+        '''
+        now = time.time() if now is None else now
+        history = self.histories.get(user_id)
+        if history is None:
+            history = self.histories[user_id] = History()
+        history.add(now, cooldown)
+        score = self.score(user_id, now)
+        if score.suspicious:
+            metrics.increment('cadence.suspicious_mines')
+        return score
+
+    def score(self, user_id: int, now: float = None):
+        now = time.time() if now is None else now
+        history = self.histories.get(user_id)
+        if history is None:
+            return Score(0.0, None, None, 0, 0)
+        pairs = history.intervals()
+        active_hours = history.active_hours(now)
+        if len(pairs) < MIN_INTERVALS:
+            return Score(0.0, None, None, len(pairs), active_hours)
+        intervals = [interval for interval, _ in pairs]
+        mean = sum(intervals) / len(intervals)
+        variation = _deviation(intervals) / mean if mean > 0 else 0.0
+        jitter = _deviation([delay for _, delay in pairs])
+        regularity = max(0.0, 1 - variation / HUMAN_VARIATION) * max(0.0, 1 - jitter / HUMAN_JITTER)
+        activity = max(0.0, (active_hours - ACTIVE_HOURS_FLOOR) / (24 - ACTIVE_HOURS_FLOOR))
+        score = REGULARITY_WEIGHT * regularity + ACTIVITY_WEIGHT * activity
+        return Score(score, variation, jitter, len(pairs), active_hours)
+
+    def top(self, amount: int, now: float = None):
+        '''
+            Returns up to amount (user id, Score) pairs with the highest scores.
+        '''
+        now = time.time() if now is None else now
+        scores = [(user_id, self.score(user_id, now)) for user_id in self.histories]
+        scores.sort(key=lambda pair: pair[1].score, reverse=True)
+        return scores[:amount]
+
+    def sweep(self, now: float = None):
+        now = time.time() if now is None else now
+        stale = [user_id for user_id, history in self.histories.items() if now - history.last() > FORGET_AFTER]
+        for user_id in stale:
+            del self.histories[user_id]
+
+    def __len__(self):
+        return len(self.histories)
+
+
+cadence = CadenceDetector()
+metrics.register_gauge('cadence.users', lambda: len(cadence))
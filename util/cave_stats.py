@@ -0,0 +1,221 @@
+'''
+    Live counters of what every cave is mined for: how often, which rarities it rolls and what it pays out.
+
+    ;mine feeds every cave's fixed size rings of WINDOW_MINUTES one minute buckets for mines, gold, exp
+    and equipment, so memory does not grow with traffic. A bucket is cleared when its slot is reused for
+    a newer minute. Rates over the last RATE_WINDOWS minutes are sums over those buckets. Limited caves
+    get an ETA to depletion from their mine rate over ETA_WINDOW minutes.
+
+    Cave.mine_cave counts the rarity rolls for the whole run, per luck value of the player. The expected
+    count of each rarity, the sum of its chance after luck at every roll, is only worked out when the
+    stats are shown. Comparing the two shows whether a cave drops what its drop_odds promise.
+
+    Everything is updated from the event loop, so the counters need no locks.
+'''
+import time
+from array import array
+from data.catalog import get_catalog
+from data.enums import Rarity
+import util.metrics as metrics
+
+WINDOW_MINUTES = 60
+RATE_WINDOWS = (1, 5, 15, 60)
+ETA_WINDOW = 15
+# Distinct luck values counted per cave. Rolls at other luck values are still counted, without an expectation.
+MAX_LUCKS = 1024
+# Names of the rarity rolls, in the order of drop_odds.
+ROLLS = ['nothing'] + [rarity.value for rarity in Rarity]
+
+
+class CaveCounters:
+    __slots__ = ('started', 'stamps', 'mines', 'gold', 'exp', 'equipment', 'rolls', 'totals')
+
+    def __init__(self, now: float):
+        self.started = now
+        # stamps[i] is the epoch minute counted in slot i of the rings, -1 for none yet.
+        self.stamps = array('q', [-1] * WINDOW_MINUTES)
+        self.mines = array('q', bytes(8 * WINDOW_MINUTES))
+        self.gold = array('q', bytes(8 * WINDOW_MINUTES))
+        self.exp = array('q', bytes(8 * WINDOW_MINUTES))
+        self.equipment = array('q', bytes(8 * WINDOW_MINUTES))
+        # luck -> number of rolls of each of ROLLS. None holds the rolls past MAX_LUCKS luck values.
+        self.rolls = {}
+        # Mines, gold, exp and equipment since the start.
+        self.totals = array('q', bytes(8 * 4))
+
+    def _slot(self, now: float):
+        minute = int(now // 60)
+        i = minute % WINDOW_MINUTES
+        if self.stamps[i] != minute:
+            self.stamps[i] = minute
+            self.mines[i] = self.gold[i] = self.exp[i] = self.equipment[i] = 0
+        return i
+
+    def add_luck(self, luck):
+        if len(self.rolls) >= MAX_LUCKS:
+            luck = None
+        rolls = self.rolls.get(luck)
+        if rolls is None:
+            rolls = self.rolls[luck] = [0] * len(ROLLS)
+        return rolls
+
+    def seen(self):
+        '''
+            Returns the number of rolls of each of ROLLS.
+        '''
+        return [sum(counts) for counts in zip(*self.rolls.values())] if self.rolls else [0] * len(ROLLS)
+
+    def expected(self, drop_weights, drop_odds):
+        '''
+            Returns the expected number of rolls of each of ROLLS. drop_weights(drop_odds, luck) returns the
+            weights a roll at luck uses, like Cave.drop_weights.
+        '''
+        expected = [0.0] * len(ROLLS)
+        for luck, counts in self.rolls.items():
+            if luck is None:
+                continue
+            weights = drop_weights(drop_odds, luck)
+            scale = sum(counts) / sum(weights)
+            for i, weight in enumerate(weights):
+                expected[i] += weight * scale
+        return expected
+
+    def add_mine(self, gold: int, exp: int, equipment: int, now: float):
+        i = self._slot(now)
+        self.mines[i] += 1
+        self.totals[0] += 1
+        self.gold[i] += gold
+        self.exp[i] += exp
+        self.equipment[i] += equipment
+        self.totals[1] += gold
+        self.totals[2] += exp
+        self.totals[3] += equipment
+
+    def window_sum(self, ring, minutes: int, now: float):
+        '''
+            Returns the sum of ring over the last minutes minutes, the current one included.
+        '''
+        current = int(now // 60)
+        return sum(value for stamp, value in zip(self.stamps, ring) if current - minutes < stamp <= current)
+
+    def rate(self, minutes: int, now: float):
+        '''
+            Returns the mines per minute over the last minutes minutes, or since the start if that is shorter.
+        '''
+        elapsed = min((minutes - 1) * 60 + now % 60, now - self.started)
+        return self.window_sum(self.mines, minutes, now) * 60 / max(elapsed, 60.0)
+
+
+class CaveStats:
+    def __init__(self):
+        self.caves = {}
+
+    def _counters(self, cave_name: str, now: float):
+        counters = self.caves.get(cave_name)
+        if counters is None:
+            counters = self.caves[cave_name] = CaveCounters(now)
+            slug = cave_name.lower().replace(' ', '_')
+            metrics.register_gauge(f'caves.{slug}.mines_per_minute', lambda: round(self.rate(cave_name, ETA_WINDOW), 2))
+            metrics.register_gauge(f'caves.{slug}.depletion_eta', lambda: self.format_eta(cave_name))
+        return counters
+
+    def record_roll(self, cave_name: str, luck: int, roll: int):
+        '''
+            Counts a drop roll of cave_name at luck that came out ROLLS[roll].
+            Called from Cave.mine_cave, so it is kept to a few operations.
+        '''
+        counters = self.caves.get(cave_name) or self._counters(cave_name, time.time())
+        rolls = counters.rolls.get(luck) or counters.add_luck(luck)
+        rolls[roll] += 1
+
+    def record_mine(self, cave_name: str, gold: int = 0, exp: int = 0, equipment: int = 0, now: float = None):
+        '''
+            Counts a ;mine at cave_name and what it paid out.
+        '''
+        now = time.time() if now is None else now
+        self._counters(cave_name, now).add_mine(gold, exp, equipment, now)
+
+    def rate(self, cave_name: str, minutes: int, now: float = None):
+        counters = self.caves.get(cave_name)
+        if counters is None:
+            return 0.0
+        return counters.rate(minutes, time.time() if now is None else now)
+
+    def depletion_eta(self, cave_name: str, now: float = None):
+        '''
+            Returns the seconds until cave_name runs out at its current mine rate. None for unlimited caves,
+            unknown caves and limited caves nobody mined in the last ETA_WINDOW minutes.
+        '''
+        cave = get_catalog().cave_by_name.get(cave_name)
+        if cave is None or cave['max_quantity'] == -1 or cave['current_quantity'] < 0:
+            return None
+        if cave['current_quantity'] == 0:
+            return 0.0
+        rate = self.rate(cave_name, ETA_WINDOW, now)
+        if rate == 0:
+            return None
+        return cave['current_quantity'] / rate * 60
+
+    def format_eta(self, cave_name: str, now: float = None):
+        cave = get_catalog().cave_by_name.get(cave_name)
+        if cave is None or cave['max_quantity'] == -1:
+            return 'unlimited'
+        eta = self.depletion_eta(cave_name, now)
+        if eta is None:
+            return 'not depleting'
+        if eta == 0:
+            return 'depleted'
+        hours, minutes = divmod(int(eta // 60), 60)
+        return f'{hours}h {minutes}m' if hours else f'{minutes}m {int(eta % 60)}s'
+
+    def summary(self, now: float = None):
+        '''
+            Returns one line per cave of the catalog, the most mined in the last hour first.
+        '''
+        now = time.time() if now is None else now
+        caves = sorted(
+            get_catalog().caves, key=lambda cave: -self.rate(cave['name'], WINDOW_MINUTES, now))
+        lines = []
+        for cave in caves:
+            rates = ' | '.join(f'{m}m {self.rate(cave["name"], m, now):.1f}' for m in RATE_WINDOWS)
+            quantity = 'unlimited' if cave['max_quantity'] == -1 else \
+                f'{cave["current_quantity"]}/{cave["max_quantity"]} left, {self.format_eta(cave["name"], now)}'
+            lines.append(f'{cave["name"]}: {rates} mines/min, {quantity}')
+        return lines
+
+    def details(self, cave_name: str, drop_weights, now: float = None):
+        '''
+            Returns the lines of the rates, rewards and rarity rolls of one cave against its drop_odds.
+            drop_weights is Cave.drop_weights, passed in since data.caves imports this module.
+        '''
+        now = time.time() if now is None else now
+        cave = get_catalog().cave_by_name[cave_name]
+        counters = self.caves.get(cave_name)
+        lines = [f'{cave_name}']
+        if counters is None:
+            return lines + ['Not mined since the bot started.']
+        mines, gold, exp, equipment = counters.totals
+        lines.append('Mines/min: ' + ' | '.join(f'{m}m {counters.rate(m, now):.1f}' for m in RATE_WINDOWS))
+        if cave['max_quantity'] != -1:
+            lines.append(f'Left: {cave["current_quantity"]}/{cave["max_quantity"]}, {self.format_eta(cave_name, now)}')
+        lines.append(
+            f'Last hour: {counters.window_sum(counters.mines, WINDOW_MINUTES, now)} mines, '
+            f'{counters.window_sum(counters.gold, WINDOW_MINUTES, now)} gold, '
+            f'{counters.window_sum(counters.exp, WINDOW_MINUTES, now)} exp, '
+            f'{counters.window_sum(counters.equipment, WINDOW_MINUTES, now)} equipment')
+        lines.append(f'Since start: {mines} mines, {gold} gold, {exp} exp, {equipment} equipment')
+        lines.append(f'{"roll":<10}{"seen":>8}{"expected":>10}{"seen %":>9}{"odds %":>9}')
+        base = sum(cave['drop_odds'])
+        seen = counters.seen()
+        rolls = sum(seen)
+        expected = counters.expected(drop_weights, cave['drop_odds'])
+        for i, name in enumerate(ROLLS):
+            lines.append(
+                f'{name:<10}{seen[i]:>8}{expected[i]:>10.1f}{seen[i] / max(rolls, 1) * 100:>9.2f}'
+                f'{cave["drop_odds"][i] / base * 100:>9.2f}')
+        if None in counters.rolls:
+            lines.append(f'{sum(counters.rolls[None])} rolls past {MAX_LUCKS} luck values have no expected count.')
+        return lines
+
+
+cave_stats = CaveStats()
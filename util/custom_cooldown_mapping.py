@@ -22,3 +22,24 @@ class CustomCooldownMapping(commands.CooldownMapping):
             bucket = self._cache[key]
 
         return bucket
+
+    def clear(self):
+        self._cache.clear()
+
+    def keys(self):
+        return list(self._cache)
+
+    def update_per(self, key, per):
+        '''
+            Changes the cooldown length of a cached bucket without resetting its current window.
+        '''
+        bucket = self._cache.get(key)
+        if bucket is not None:
+            bucket.per = float(per)
+
+    def get_per(self, key):
+        '''
+            Returns the cooldown length of a cached bucket, or None when key has no bucket yet.
+        '''
+        bucket = self._cache.get(key)
+        return bucket.per if bucket is not None else None
@@ -2,6 +2,8 @@ import asyncpg
 import asyncio
 import os
 from dotenv import load_dotenv
+from data.enums import GrantOutcome
+from data.rows import UserRow, EquipmentRow
 
 
 load_dotenv()
@@ -19,10 +21,10 @@ async def get_all_users():
 async def insert_user(id: int):
     '''
         Inserts a user into the database.
-        Columns: user_id, exp, cave, gold
+        Columns: user_id, exp, cave, gold, blessings, level
     '''
     conn = await asyncpg.connect(PSQL_CONNECTION_URL)
-    stmt = await conn.prepare("INSERT INTO users(user_id) VALUES ($1) RETURNING user_id, exp, cave, gold")
+    stmt = await conn.prepare("INSERT INTO users(user_id) VALUES ($1) RETURNING *")
     result = await stmt.fetch(id)
     await conn.close()
     return result
@@ -30,7 +32,7 @@ async def insert_user(id: int):
 
 async def get_user(id: int):
     '''
-        Retrieves an user and returns the columns and values as a dictionary.
+        Retrieves an user as a UserRow.
         If the user is not in the database, the user is first inserted and then returned.
     '''
     conn = await asyncpg.connect(PSQL_CONNECTION_URL)
@@ -39,10 +41,7 @@ async def get_user(id: int):
     if not result:
         result = await insert_user(id)
     await conn.close()
-    user_data = {}
-    for field, value in result[0].items():
-        user_data[field] = value
-    return user_data
+    return UserRow.from_record(result[0])
 
 
 async def update_user_exp(user_id: int, amount: int):
@@ -122,13 +121,111 @@ async def get_top_users_for_exp(amount: int):
     stmt = await conn.prepare("SELECT * FROM users ORDER BY exp DESC LIMIT $1")
     result = await stmt.fetch(amount)
     await conn.close()
-    user_list = []
-    for r in result:
-        user_data = {}
-        for field, value in r.items():
-            user_data[field] = value
-        user_list.append(user_data)
-    return user_list
+    return [UserRow.from_record(r) for r in result]
+
+
+async def get_top_users_for_exp_among(user_ids: list, amount: int):
+    '''
+        Gets the top amount users by exp out of user_ids, such as the members of a guild.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("SELECT * FROM users WHERE user_id = ANY($1::bigint[]) ORDER BY exp DESC LIMIT $2")
+    result = await stmt.fetch(user_ids, amount)
+    await conn.close()
+    return [UserRow.from_record(r) for r in result]
+
+
+async def get_users_at_level(level: int, amount: int):
+    '''
+        Gets up to amount users at the given level or above, highest exp first. Uses the stored level column.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("SELECT * FROM users WHERE level >= $1 ORDER BY exp DESC LIMIT $2")
+    result = await stmt.fetch(level, amount)
+    await conn.close()
+    return [UserRow.from_record(r) for r in result]
+
+
+async def get_usernames(user_ids: list):
+    '''
+        Gets the stored names of user_ids as a dict of user id to {'name', 'updated_at'}.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("SELECT user_id, name, updated_at FROM usernames WHERE user_id = ANY($1::bigint[])")
+    result = await stmt.fetch(user_ids)
+    await conn.close()
+    return {r['user_id']: {'name': r['name'], 'updated_at': r['updated_at']} for r in result}
+
+
+async def upsert_usernames(names: dict):
+    '''
+        Stores a dict of user id to name in one statement.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("""
+        INSERT INTO usernames (user_id, name, updated_at)
+        SELECT user_id, name, now() FROM unnest($1::bigint[], $2::text[]) AS u(user_id, name)
+        ON CONFLICT (user_id) DO UPDATE SET name = EXCLUDED.name, updated_at = EXCLUDED.updated_at""")
+    await stmt.fetch(list(names.keys()), list(names.values()))
+    await conn.close()
+
+
+async def get_digest_channels():
+    '''
+        Gets every digest channel as a dict of channel id to {'guild_id', 'window_seconds'}.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("SELECT channel_id, guild_id, window_seconds FROM digest_channels")
+    result = await stmt.fetch()
+    await conn.close()
+    return {r['channel_id']: {'guild_id': r['guild_id'], 'window_seconds': r['window_seconds']} for r in result}
+
+
+async def set_digest_channel(guild_id: int, channel_id: int, window_seconds: int):
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("""
+        INSERT INTO digest_channels (channel_id, guild_id, window_seconds) VALUES ($1, $2, $3)
+        ON CONFLICT (channel_id) DO UPDATE SET window_seconds = EXCLUDED.window_seconds, updated_at = now()""")
+    await stmt.fetch(channel_id, guild_id, window_seconds)
+    await conn.close()
+
+
+async def delete_digest_channel(channel_id: int):
+    '''
+        Returns True if channel_id was a digest channel.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("DELETE FROM digest_channels WHERE channel_id = $1 RETURNING channel_id")
+    result = await stmt.fetch(channel_id)
+    await conn.close()
+    return len(result) > 0
+
+
+async def get_guild_prefixes():
+    '''
+        Gets the custom prefixes as a dict of guild id to prefix.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("SELECT guild_id, prefix FROM guild_prefixes")
+    result = await stmt.fetch()
+    await conn.close()
+    return {r['guild_id']: r['prefix'] for r in result}
+
+
+async def set_guild_prefix(guild_id: int, prefix: str):
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("""
+        INSERT INTO guild_prefixes (guild_id, prefix) VALUES ($1, $2)
+        ON CONFLICT (guild_id) DO UPDATE SET prefix = EXCLUDED.prefix, updated_at = now()""")
+    await stmt.fetch(guild_id, prefix)
+    await conn.close()
+
+
+async def delete_guild_prefix(guild_id: int):
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("DELETE FROM guild_prefixes WHERE guild_id = $1")
+    await stmt.fetch(guild_id)
+    await conn.close()
 
 
 async def insert_equipment(user_id: int, equipment_id: int, location: str):
@@ -143,22 +240,112 @@ async def insert_equipment(user_id: int, equipment_id: int, location: str):
     return result
 
 
+async def grant_equipment(user_id: int, equipment_id: int, max_stars: int, refund: int):
+    '''
+        Gives the user an equipment in one statement. A new equipment goes to the inventory, a duplicate
+        increases its star level, and a duplicate at max_stars credits refund gold instead.
+        Returns a two tuple of (GrantOutcome, stars after the grant).
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("""
+        WITH ensured AS (
+            INSERT INTO users(user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING
+        ), granted AS (
+            INSERT INTO equipment(equipment_id, user_id, location) VALUES ($2, $1, 'inventory')
+            ON CONFLICT (user_id, equipment_id) DO UPDATE SET stars=equipment.stars + 1
+            WHERE equipment.stars < $3
+            RETURNING xmax = 0 AS inserted, stars
+        ), refunded AS (
+            UPDATE users SET gold=gold + $4
+            WHERE user_id=$1 AND NOT EXISTS (SELECT 1 FROM granted)
+            RETURNING gold
+        )
+        SELECT (SELECT inserted FROM granted) AS inserted, (SELECT stars FROM granted) AS stars""")
+    result = await stmt.fetchrow(user_id, equipment_id, max_stars, refund)
+    await conn.close()
+    if result['inserted'] is None:
+        return (GrantOutcome.REFUND, max_stars)
+    if result['inserted']:
+        return (GrantOutcome.NEW, result['stars'])
+    return (GrantOutcome.STAR, result['stars'])
+
+
+async def bulk_update_users(user_ids: list, column: str, amount: int):
+    '''
+        Adds amount to the gold or exp of every user in user_ids in one statement, creating missing users.
+        Returns a two tuple of (users updated, users created).
+    '''
+    if column not in ('gold', 'exp'):
+        raise ValueError(f'Cannot bulk update {column}.')
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare(f"""
+        WITH updated AS (
+            INSERT INTO users(user_id, {column}) SELECT DISTINCT unnest($1::bigint[]), $2::bigint
+            ON CONFLICT (user_id) DO UPDATE SET {column}=users.{column} + EXCLUDED.{column}
+            RETURNING xmax = 0 AS inserted
+        )
+        SELECT count(*) AS updated, count(*) FILTER (WHERE inserted) AS created FROM updated""")
+    result = await stmt.fetchrow(user_ids, amount)
+    await conn.close()
+    return (result['updated'], result['created'])
+
+
+async def bulk_grant_equipment(user_ids: list, equipment_id: int, max_stars: int, refund: int):
+    '''
+        grant_equipment for every user in user_ids in one statement.
+        Returns a dict of GrantOutcome to the number of users with that outcome.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("""
+        WITH ids AS (
+            SELECT DISTINCT unnest($1::bigint[]) AS user_id
+        ), ensured AS (
+            INSERT INTO users(user_id) SELECT user_id FROM ids ON CONFLICT (user_id) DO NOTHING
+        ), granted AS (
+            INSERT INTO equipment(equipment_id, user_id, location) SELECT $2, user_id, 'inventory' FROM ids
+            ON CONFLICT (user_id, equipment_id) DO UPDATE SET stars=equipment.stars + 1
+            WHERE equipment.stars < $3
+            RETURNING user_id, xmax = 0 AS inserted
+        ), refunded AS (
+            UPDATE users SET gold=gold + $4
+            WHERE user_id IN (SELECT user_id FROM ids EXCEPT SELECT user_id FROM granted)
+            RETURNING user_id
+        )
+        SELECT
+            (SELECT count(*) FROM granted WHERE inserted) AS new,
+            (SELECT count(*) FROM granted WHERE NOT inserted) AS star,
+            (SELECT count(*) FROM refunded) AS refund""")
+    result = await stmt.fetchrow(user_ids, equipment_id, max_stars, refund)
+    await conn.close()
+    return {
+        GrantOutcome.NEW: result['new'],
+        GrantOutcome.STAR: result['star'],
+        GrantOutcome.REFUND: result['refund'],
+    }
+
+
 async def get_equipment_for_user(user_id: int):
     '''
-        Gets all equipment attatched to a user id. Returns as a list of dictionaries.
+        Gets all equipment attatched to a user id. Returns a list of EquipmentRow.
     '''
     await get_user(user_id)
     conn = await asyncpg.connect(PSQL_CONNECTION_URL)
     stmt = await conn.prepare("SELECT * FROM equipment WHERE user_id=$1")
     result = await stmt.fetch(user_id)
     await conn.close()
-    equipment_data_list = []
-    for r in result:
-        equipment_data = {}
-        for field, value in r.items():
-            equipment_data[field] = value
-        equipment_data_list.append(equipment_data)
-    return equipment_data_list
+    return [EquipmentRow.from_record(r) for r in result]
+
+
+async def get_equipped_equipment_for_users(user_ids: list):
+    '''
+        Gets the equipped equipment of every user in user_ids in one query, for data.stats.get_total_stats_batch.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("""
+        SELECT * FROM equipment WHERE user_id = ANY($1::bigint[]) AND location <> 'inventory'""")
+    result = await stmt.fetch(user_ids)
+    await conn.close()
+    return [EquipmentRow.from_record(r) for r in result]
 
 
 async def update_equipment_location(user_id: int, equipment_id: int, location: str):
@@ -169,6 +356,49 @@ async def update_equipment_location(user_id: int, equipment_id: int, location: s
     return result
 
 
+async def equip_equipment(user_id: int, equipment_id: int, location: str):
+    '''
+        Equips the user's equipment into location and moves whatever was there to the inventory in one statement.
+        Returns the user's equipped gear after the swap as a list of EquipmentRow,
+        or None if the user does not own the equipment.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    # Locking the user's row first makes concurrent swaps for the same user queue up instead of deadlocking.
+    stmt = await conn.prepare("""
+        WITH target AS (
+            SELECT e.equipment_instance_id FROM users u
+            JOIN equipment e ON e.user_id=u.user_id
+            WHERE u.user_id=$1 AND e.equipment_id=$2
+            ORDER BY e.equipment_instance_id LIMIT 1
+            FOR UPDATE OF u
+        ), swapped AS (
+            UPDATE equipment
+            SET location=CASE WHEN equipment_instance_id=(SELECT equipment_instance_id FROM target)
+                THEN $3 ELSE 'inventory' END
+            WHERE user_id=$1 AND EXISTS (SELECT 1 FROM target)
+            AND (equipment_instance_id=(SELECT equipment_instance_id FROM target) OR location=$3)
+            RETURNING *
+        )
+        SELECT * FROM swapped WHERE location <> 'inventory'
+        UNION ALL
+        SELECT * FROM equipment
+        WHERE user_id=$1 AND location <> 'inventory' AND location <> $3
+        AND equipment_instance_id NOT IN (SELECT equipment_instance_id FROM swapped)""")
+    try:
+        result = await stmt.fetch(user_id, equipment_id, location)
+    except asyncpg.exceptions.ExclusionViolationError:
+        # A concurrent equip filled the slot after this statement's snapshot was taken.
+        # Holding the user's row lock first gives the retry a snapshot that already includes that equip.
+        async with conn.transaction():
+            await conn.execute("SELECT 1 FROM users WHERE user_id=$1 FOR UPDATE", user_id)
+            result = await stmt.fetch(user_id, equipment_id, location)
+    await conn.close()
+    equipment_list = [EquipmentRow.from_record(r) for r in result]
+    if not any(e.equipment_id == equipment_id for e in equipment_list):
+        return None
+    return equipment_list
+
+
 async def update_equipment_stars(user_id: int, equipment_id: int, amount: int):
     conn = await asyncpg.connect(PSQL_CONNECTION_URL)
     stmt = await conn.prepare("UPDATE equipment SET stars=stars + $3 WHERE user_id=$1 AND equipment_id=$2 RETURNING *")
@@ -185,6 +415,30 @@ async def update_equipment_bonus(user_id: int, equipment_id: int, bonus: str):
     return result
 
 
+async def apply_equipment_bonus(user_id: int, equipment_id: int, bonus: str, cost: int):
+    '''
+        Charges the user cost gold and sets the equipment's bonus in one statement.
+        Nothing changes if the user cannot afford it or does not own the equipment.
+        Returns the updated equipment as an EquipmentRow, or None if nothing changed.
+    '''
+    conn = await asyncpg.connect(PSQL_CONNECTION_URL)
+    stmt = await conn.prepare("""
+        WITH charged AS (
+            UPDATE users SET gold=gold - $4
+            WHERE user_id=$1 AND gold >= $4
+            AND EXISTS (SELECT 1 FROM equipment WHERE user_id=$1 AND equipment_id=$2)
+            RETURNING gold
+        )
+        UPDATE equipment SET bonus=$3
+        WHERE user_id=$1 AND equipment_id=$2 AND EXISTS (SELECT 1 FROM charged)
+        RETURNING *""")
+    result = await stmt.fetchrow(user_id, equipment_id, bonus, cost)
+    await conn.close()
+    if result is None:
+        return None
+    return EquipmentRow.from_record(result)
+
+
 if __name__ == '__main__':
     # print(asyncio.get_event_loop().run_until_complete(update_user_cave(124668192948748288, 'Beginner Cave')))
     # print(asyncio.get_event_loop().run_until_complete(get_equipment_for_user(124668192948748288)))
@@ -0,0 +1,207 @@
+'''
+    Digest mode for busy mining channels.
+
+    In a digest channel, mine results and "too tired" cooldown notices are not sent one message each.
+    They are buffered for the channel's window and then published together into one summary message,
+    which is edited with the entries of every following window until it is older than
+    SUMMARY_MESSAGE_AGE or full. Only then is a new summary message sent. Repeated cooldown hits of a
+    user in one window are a single entry with a count.
+
+    Channels are configured per guild with the ;digest command and stored in the digest_channels table.
+'''
+import asyncio
+import time
+from collections import deque
+import discord
+import util.dbutil as db
+import util.metrics as metrics
+from util.edits import edits
+
+DEFAULT_WINDOW = 15
+MIN_WINDOW = 5
+MAX_WINDOW = 300
+# Seconds between checks for windows that are due.
+TICK = 5
+# Seconds a summary message keeps being edited before a new one is sent.
+SUMMARY_MESSAGE_AGE = 120
+# Discord allows 2048 characters in an embed description.
+MAX_DESCRIPTION = 2000
+
+
+class ChannelDigest:
+    '''
+        The buffered entries and the current summary message of one channel.
+    '''
+
+    def __init__(self, channel: discord.abc.Messageable, window: int):
+        self.channel = channel
+        self.window = window
+        self.mines = []
+        # user id -> [mention, count, monotonic time the cooldown ends]
+        self.cooldowns = {}
+        self.due = None
+        self.message = None
+        self.message_sent = 0.0
+        self.lines = deque()
+
+    def _buffer(self):
+        if self.due is None:
+            self.due = time.monotonic() + self.window
+
+    def add_mine(self, description: str):
+        self.mines.append(' '.join(line.strip() for line in description.splitlines() if line.strip()))
+        self._buffer()
+
+    def add_cooldown(self, user: discord.abc.User, retry_after: float):
+        entry = self.cooldowns.get(user.id)
+        if entry is None:
+            self.cooldowns[user.id] = [user.mention, 1, time.monotonic() + retry_after]
+        else:
+            metrics.increment('digest.cooldowns_deduplicated')
+            entry[1] += 1
+            entry[2] = time.monotonic() + retry_after
+        self._buffer()
+
+    def is_due(self, now: float):
+        return self.due is not None and now >= self.due
+
+    def take_lines(self, now: float):
+        lines = list(self.mines)
+        for mention, count, ready in self.cooldowns.values():
+            repeats = f' (x{count})' if count > 1 else ''
+            lines.append(f'{mention} is too tired to mine{repeats}. Ready in {max(ready - now, 0):.1f}s.')
+        self.mines = []
+        self.cooldowns = {}
+        self.due = None
+        return lines
+
+    def render(self):
+        description = '\n'.join(self.lines)
+        return description if description else 'Nothing mined yet.'
+
+    async def publish(self, now: float):
+        lines = self.take_lines(now)
+        metrics.increment('digest.entries', len(lines))
+        new_message = self.message is None or now - self.message_sent > SUMMARY_MESSAGE_AGE
+        if not new_message and len(self.render()) + sum(len(line) + 1 for line in lines) > MAX_DESCRIPTION:
+            new_message = True
+        if new_message:
+            self.lines.clear()
+        self.lines.extend(lines)
+        # Entries that do not fit even in a new message are dropped from the top.
+        while len(self.lines) > 1 and len(self.render()) > MAX_DESCRIPTION:
+            self.lines.popleft()
+        if len(self.render()) > MAX_DESCRIPTION:
+            self.lines[0] = self.lines[0][:MAX_DESCRIPTION]
+        embed = discord.Embed(title='Mining Digest', color=discord.Color.dark_orange(), description=self.render())
+        if new_message:
+            self.message = await self.channel.send(embed=embed)
+            self.message_sent = now
+            metrics.increment('digest.messages_sent')
+        else:
+            edits.edit(self.message, embed=embed)
+            metrics.increment('digest.messages_edited')
+
+
+class Digests:
+    def __init__(self, client):
+        self.client = client
+        # channel id -> {'guild_id', 'window_seconds'}
+        self.channels = {}
+        # Channels enabled or disabled since the bot started. Loading does not overwrite them.
+        self.changed = set()
+        self.loaded = False
+        self.digests = {}
+        metrics.register_gauge('digest.channels', lambda: len(self.channels))
+
+    async def load(self):
+        '''
+            Merges the digest channels stored in the database into the ones in memory.
+        '''
+        for channel_id, config in (await db.get_digest_channels()).items():
+            if channel_id not in self.changed:
+                self.channels[channel_id] = config
+        self.loaded = True
+
+    def _get(self, channel):
+        config = self.channels.get(channel.id)
+        if config is None:
+            return None
+        digest = self.digests.get(channel.id)
+        if digest is None:
+            digest = self.digests[channel.id] = ChannelDigest(channel, config['window_seconds'])
+        return digest
+
+    def add_mine(self, channel, description: str):
+        '''
+            Buffers a mine result if channel is a digest channel. Returns False if it has to be sent normally.
+        '''
+        digest = self._get(channel)
+        if digest is None:
+            return False
+        digest.add_mine(description)
+        metrics.increment('digest.buffered')
+        return True
+
+    def add_cooldown(self, channel, user, retry_after: float):
+        '''
+            Buffers a cooldown notice if channel is a digest channel. Returns False if it has to be sent normally.
+        '''
+        digest = self._get(channel)
+        if digest is None:
+            return False
+        digest.add_cooldown(user, retry_after)
+        metrics.increment('digest.buffered')
+        return True
+
+    def get_guild_channels(self, guild_id: int):
+        return {
+            channel_id: config['window_seconds']
+            for channel_id, config in self.channels.items() if config['guild_id'] == guild_id}
+
+    async def enable(self, guild_id: int, channel_id: int, window: int):
+        window = max(min(window, MAX_WINDOW), MIN_WINDOW)
+        await db.set_digest_channel(guild_id, channel_id, window)
+        self.changed.add(channel_id)
+        self.channels[channel_id] = {'guild_id': guild_id, 'window_seconds': window}
+        digest = self.digests.get(channel_id)
+        if digest is not None:
+            digest.window = window
+        return window
+
+    async def disable(self, channel_id: int):
+        '''
+            Stops buffering in channel_id and publishes what was buffered. Returns False if it was not a digest channel.
+        '''
+        removed = await db.delete_digest_channel(channel_id)
+        self.changed.add(channel_id)
+        self.channels.pop(channel_id, None)
+        digest = self.digests.pop(channel_id, None)
+        if digest is not None and digest.due is not None:
+            await self._publish(digest, time.monotonic())
+        return removed
+
+    async def forget_channel(self, channel_id: int):
+        '''
+            Drops a deleted channel and its buffered entries without publishing them.
+        '''
+        self.changed.add(channel_id)
+        self.channels.pop(channel_id, None)
+        self.digests.pop(channel_id, None)
+        await db.delete_digest_channel(channel_id)
+
+    async def flush(self):
+        '''
+            Publishes every digest whose window is over. Run every TICK seconds by the scheduler.
+        '''
+        now = time.monotonic()
+        due = [digest for digest in self.digests.values() if digest.is_due(now)]
+        if due:
+            await asyncio.gather(*(self._publish(digest, now) for digest in due))
+
+    async def _publish(self, digest: ChannelDigest, now: float):
+        try:
+            await digest.publish(now)
+        except discord.HTTPException as exception:
+            metrics.increment('digest.failures')
+            print(f'Digest of channel {digest.channel.id} cannot be published. [{exception}]')
@@ -0,0 +1,66 @@
+'''
+    Coalesced message edits.
+
+    Every message has at most one edit in flight. Edits requested meanwhile are merged into one pending
+    edit, and only that latest state is sent once the in-flight edit returns. discord.py waits out the
+    channel's rate limit inside the in-flight edit, so a burst of page flips costs one or two API calls
+    instead of one per reaction, and intermediate pages are never sent.
+'''
+import asyncio
+import discord
+import util.metrics as metrics
+
+
+class EditCoalescer:
+    def __init__(self):
+        # message id -> (message, fields of the next edit)
+        self.pending = {}
+        # message id -> task sending the edits of that message
+        self.senders = {}
+
+    def edit(self, message: discord.Message, **fields):
+        '''
+            Schedules message.edit(**fields) and returns right away. Fields of edits that were not sent yet
+            are merged, later values win. Returns the task sending the edits of message.
+        '''
+        metrics.increment('edits.requested')
+        queued = self.pending.get(message.id)
+        if queued is not None:
+            metrics.increment('edits.coalesced')
+            fields = dict(queued[1], **fields)
+        self.pending[message.id] = (message, fields)
+        sender = self.senders.get(message.id)
+        if sender is None:
+            sender = self.senders[message.id] = asyncio.ensure_future(self._send(message.id))
+        return sender
+
+    async def flush(self, message: discord.Message):
+        '''
+            Waits until every edit requested for message so far was sent.
+        '''
+        sender = self.senders.get(message.id)
+        if sender is not None:
+            await asyncio.shield(sender)
+
+    def in_flight(self):
+        return len(self.senders)
+
+    async def _send(self, message_id: int):
+        try:
+            while message_id in self.pending:
+                message, fields = self.pending.pop(message_id)
+                try:
+                    await message.edit(**fields)
+                    metrics.increment('edits.sent')
+                except discord.NotFound:
+                    # Deleted, for example by a menu that stopped. Nothing left to edit.
+                    self.pending.pop(message_id, None)
+                except discord.HTTPException as exception:
+                    metrics.increment('edits.failures')
+                    print(f'Message {message_id} cannot be edited. [{exception}]')
+        finally:
+            self.senders.pop(message_id, None)
+
+
+edits = EditCoalescer()
+metrics.register_gauge('edits.in_flight', edits.in_flight)
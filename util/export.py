@@ -0,0 +1,135 @@
+'''
+    Streams the users and equipment tables to gzip compressed csv files with COPY.
+
+    Rows are written to disk chunk by chunk as the server sends them, so memory stays flat however
+    large the tables are. Both tables are read in one read only, repeatable read transaction, so the
+    files of a run are one consistent snapshot.
+
+    An incremental export only contains the rows inserted or updated since the previous export into
+    the same directory. updated_at is the writer's now(), the start of its transaction, so a write can
+    commit after a snapshot with an updated_at long before it. The watermark of a run is therefore the
+    start of the oldest transaction in flight at the snapshot, or the snapshot time when there is none.
+    It is kept in <directory>/watermark.json, and the next incremental run starts OVERLAP before it,
+    for clock differences. Consecutive exports can share rows; later files win for a primary key.
+
+    In-flight transactions are read from pg_stat_activity of the server exported from. Transactions it
+    does not show are only covered for OVERLAP: those of other roles when the export role lacks
+    pg_read_all_stats, and every write when exporting from a replica. With a replica, writes whose
+    transaction started more than OVERLAP before the snapshot and committed after it can be missed;
+    run a full export now and then.
+
+    Only client backends on the exported database count, so autovacuum and sessions on other databases
+    do not hold the watermark back. A watermark is never more than MAX_REWIND before the previous one,
+    which bounds how far back one long open transaction can pull every following run.
+
+    Usage (from the repository root):
+        python -m util.export exports                Full export into exports/
+        python -m util.export exports --incremental  Rows changed since the last export into exports/
+        python -m util.export exports --since 2021-05-01T00:00:00+00:00
+
+    EXPORT_CONNECTION_URL, when set, is used instead of PSQL_CONNECTION_URL so exports can read from a replica.
+'''
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+import asyncpg
+from util.dbutil import PSQL_CONNECTION_URL
+
+EXPORT_CONNECTION_URL = os.getenv('EXPORT_CONNECTION_URL') or PSQL_CONNECTION_URL
+TABLES = ['users', 'equipment']
+OVERLAP = timedelta(minutes=1)
+MAX_REWIND = timedelta(minutes=10)
+WATERMARK_FILE = 'watermark.json'
+
+
+def read_watermark(directory: str):
+    path = os.path.join(directory, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return datetime.fromisoformat(json.load(f)['watermark'])
+
+
+def write_watermark(directory: str, watermark: datetime):
+    path = os.path.join(directory, WATERMARK_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'watermark': watermark.isoformat()}, f)
+        f.write('\n')
+    os.replace(path + '.tmp', path)
+
+
+async def export_table(conn, table: str, path: str, since: datetime = None):
+    '''
+        Streams table into a gzip compressed csv file at path, with a header row.
+        With since, only rows updated after since are exported. Returns the number of rows.
+    '''
+    query = f'SELECT * FROM {table}'
+    args = []
+    if since is not None:
+        query += ' WHERE updated_at > $1'
+        args.append(since)
+    with gzip.open(path + '.tmp', 'wb') as f:
+        async def write(chunk):
+            f.write(chunk)
+        status = await conn.copy_from_query(query, *args, output=write, format='csv', header=True)
+    os.replace(path + '.tmp', path)
+    return int(status.split()[-1])
+
+
+async def export(directory: str, since: datetime = None, incremental: bool = False, dsn: str = None):
+    '''
+        Exports every table in TABLES into directory and advances its watermark. Returns the list of files.
+    '''
+    if since is not None and since.tzinfo is None:
+        raise ValueError('since needs a timezone')
+    os.makedirs(directory, exist_ok=True)
+    previous = read_watermark(directory)
+    if incremental and since is None and previous is not None:
+        since = previous - OVERLAP
+    kind = 'full' if since is None else 'incremental'
+    paths = []
+    conn = await asyncpg.connect(dsn or EXPORT_CONNECTION_URL)
+    try:
+        async with conn.transaction(isolation='repeatable_read', readonly=True):
+            snapshot, oldest = await conn.fetchrow(
+                "SELECT now(), (SELECT min(xact_start) FROM pg_stat_activity "
+                "WHERE pid <> pg_backend_pid() AND xact_start IS NOT NULL "
+                "AND datname = current_database() AND backend_type = 'client backend')")
+            watermark = min(snapshot, oldest) if oldest is not None else snapshot
+            if previous is not None:
+                watermark = max(watermark, min(previous - MAX_REWIND, snapshot))
+            stamp = snapshot.strftime('%Y%m%dT%H%M%SZ')
+            for table in TABLES:
+                path = os.path.join(directory, f'{table}-{kind}-{stamp}.csv.gz')
+                rows = await export_table(conn, table, path, since)
+                print(f'{table}: {rows} rows -> {path}')
+                paths.append(path)
+    finally:
+        await conn.close()
+    write_watermark(directory, watermark)
+    return paths
+
+
+def parse_since(value: str):
+    since = datetime.fromisoformat(value)
+    if since.tzinfo is None:
+        raise argparse.ArgumentTypeError(f'{value} has no timezone, add one like +00:00')
+    return since
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the users and equipment tables to csv.gz files.')
+    parser.add_argument('directory', help='Directory for the files and the watermark.')
+    parser.add_argument('--incremental', action='store_true', help='Only export rows changed since the last export.')
+    parser.add_argument('--since', type=parse_since, help='Only export rows changed after this time.')
+    args = parser.parse_args(argv)
+    asyncio.get_event_loop().run_until_complete(export(args.directory, args.since, args.incremental))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+'''
+    Member id sets per guild, kept up to date from gateway events.
+
+    Server scoped queries pass a guild's set to the database instead of loading every user row or
+    filtering the global top list. Entries expire after a short time so repeated commands in a busy
+    server reuse one query.
+
+    Guilds that are not fully cached (see util.member_cache) get their member list requested from
+    Discord on first use. Leave events are only sent for cached members, so those sets are requested
+    again once they are MAX_AGE seconds old.
+'''
+import asyncio
+import time
+import util.metrics as metrics
+
+MAX_AGE = 3600
+
+members = {}
+# Monotonic time the member list of a guild that is not fully cached was requested, None for cached guilds.
+loaded_at = {}
+_loading = {}
+
+
+def add_guild(guild):
+    '''
+        Builds the member id set of the guild from the member cache, if every member is cached.
+    '''
+    if guild.chunked:
+        members[guild.id] = {member.id for member in guild.members}
+        loaded_at[guild.id] = None
+
+
+def remove_guild(guild_id: int):
+    members.pop(guild_id, None)
+    loaded_at.pop(guild_id, None)
+    TTLCache.clear_guild(guild_id)
+
+
+def add_member(guild_id: int, user_id: int):
+    guild_members = members.get(guild_id)
+    if guild_members is not None:
+        guild_members.add(user_id)
+
+
+def remove_member(guild_id: int, user_id: int):
+    guild_members = members.get(guild_id)
+    if guild_members is not None:
+        guild_members.discard(user_id)
+
+
+def get(guild_id: int):
+    '''
+        Returns the set of member ids of the guild, or None if the guild has not been seen yet.
+    '''
+    return members.get(guild_id)
+
+
+async def load_guild(guild):
+    '''
+        Returns the set of member ids of the guild, requesting the member list from Discord if it is
+        unknown or out of date. Concurrent calls for the same guild share one request.
+    '''
+    guild_members = members.get(guild.id)
+    if guild_members is not None:
+        requested = loaded_at.get(guild.id)
+        if requested is None or time.monotonic() - requested < MAX_AGE:
+            return guild_members
+    if guild.chunked:
+        add_guild(guild)
+        return members[guild.id]
+    task = _loading.get(guild.id)
+    if task is None:
+        task = _loading[guild.id] = asyncio.ensure_future(_request_members(guild))
+    return await asyncio.shield(task)
+
+
+async def _request_members(guild):
+    try:
+        with metrics.timed('guild_members.request'):
+            guild_members = await guild.chunk(cache=False) or []
+        members[guild.id] = {member.id for member in guild_members}
+        loaded_at[guild.id] = time.monotonic()
+        return members[guild.id]
+    finally:
+        _loading.pop(guild.id, None)
+
+
+class TTLCache:
+    '''
+        Results per (name, guild id) that expire after ttl seconds.
+    '''
+    entries = {}
+
+    @staticmethod
+    def get(name: str, guild_id: int):
+        entry = TTLCache.entries.get((name, guild_id))
+        if entry is None or entry[0] < time.monotonic():
+            metrics.increment(f'{name}.cache_misses')
+            return None
+        metrics.increment(f'{name}.cache_hits')
+        return entry[1]
+
+    @staticmethod
+    def set(name: str, guild_id: int, value, ttl: float):
+        TTLCache.entries[(name, guild_id)] = (time.monotonic() + ttl, value)
+
+    @staticmethod
+    def clear_guild(guild_id: int):
+        for key in [key for key in TTLCache.entries if key[1] == guild_id]:
+            del TTLCache.entries[key]
+
+    @staticmethod
+    def sweep():
+        now = time.monotonic()
+        for key in [key for key, entry in TTLCache.entries.items() if entry[0] < now]:
+            del TTLCache.entries[key]
+
+
+metrics.register_gauge('guild_members.guilds', lambda: len(members))
+metrics.register_gauge('guild_members.ids', lambda: sum(len(ids) for ids in members.values()))
@@ -0,0 +1,65 @@
+'''
+    Lean member caching. With LEAN_MEMBER_CACHE=True the bot does not chunk guilds at startup and
+    the library caches no members on its own. Only members that recently used a command are kept in
+    the guild member caches, up to MEMBER_CACHE_SIZE of them, and the least recently active are evicted.
+    Anything else is fetched on demand.
+'''
+from collections import OrderedDict
+import discord
+import util.metrics as metrics
+
+# discord.py has no public API to put a member into a guild's member cache or take one out:
+# Guild.get_member only reads it, and the library fills it from gateway events. The private
+# Guild._add_member and Guild._remove_member are what its own event handlers call. They exist with
+# the same signature in every release in this range. Check a new major version before widening it.
+SUPPORTED_VERSIONS = ((1, 0), (3, 0))
+PRIVATE_METHODS = ('_add_member', '_remove_member')
+
+
+def check_support():
+    '''
+        Raises RuntimeError if the installed discord.py cannot be used for lean member caching.
+    '''
+    version = (discord.version_info.major, discord.version_info.minor)
+    missing = [name for name in PRIVATE_METHODS if not callable(getattr(discord.Guild, name, None))]
+    if missing or not SUPPORTED_VERSIONS[0] <= version < SUPPORTED_VERSIONS[1]:
+        raise RuntimeError(
+            f'LEAN_MEMBER_CACHE does not support discord.py {discord.__version__} '
+            f'(missing {", ".join(missing) or "nothing"}). Turn it off or update util/member_cache.py.')
+
+
+def set_cached(member: discord.Member, cached: bool):
+    '''
+        Adds member to, or removes it from, the member cache of its guild. The only use of the private methods.
+    '''
+    if cached:
+        member.guild._add_member(member)
+    else:
+        member.guild._remove_member(member)
+
+
+class ActiveMemberCache:
+    def __init__(self, size: int):
+        # Fails at startup rather than at the first command or eviction.
+        check_support()
+        self.size = size
+        self.members = OrderedDict()
+
+    def touch(self, member: discord.Member):
+        '''
+            Caches member in its guild as the most recently active member, evicting the least recently active.
+        '''
+        key = (member.guild.id, member.id)
+        if key in self.members:
+            self.members.move_to_end(key)
+        self.members[key] = member
+        set_cached(member, True)
+        while len(self.members) > self.size:
+            _, evicted = self.members.popitem(last=False)
+            # The bot's own member always stays cached.
+            if evicted != evicted.guild.me:
+                set_cached(evicted, False)
+            metrics.increment('member_cache.evictions')
+
+    def __len__(self):
+        return len(self.members)
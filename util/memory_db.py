@@ -0,0 +1,250 @@
+'''
+    An in-memory stand-in for util.dbutil, used by util.replay to drive the cogs without Postgres.
+
+    MemoryDB has the functions of util.dbutil that the cogs call, with the same arguments and
+    results, kept in dictionaries. install swaps them into util.dbutil for the current process.
+    An optional latency is awaited on every call to stand in for database round trips.
+'''
+import asyncio
+import bisect
+from datetime import datetime
+import pytz
+from data.enums import GrantOutcome
+from data.rows import UserRow, EquipmentRow
+from data.user import User
+import util.dbutil as dbutil
+
+
+def _now():
+    return datetime.now(pytz.utc)
+
+
+def _level(exp: int):
+    # The stored users.level column: the number of level thresholds reached.
+    return bisect.bisect_right(User.level_thresholds, exp)
+
+
+class MemoryDB:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.users = {}
+        self.equipment = {}
+        self.next_instance_id = 1
+        self.usernames = {}
+        self.digest_channels = {}
+        self.guild_prefixes = {}
+        self.calls = 0
+
+    async def _wait(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        else:
+            await asyncio.sleep(0)
+
+    def _user(self, user_id: int):
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = UserRow(user_id, 0, 'Beginner Cave', 0, 0, 0, _now())
+        return user
+
+    def _update_user(self, user_id: int, **fields):
+        user = self._user(user_id)._replace(updated_at=_now(), **fields)
+        self.users[user_id] = user._replace(level=_level(user.exp))
+        return self.users[user_id]
+
+    def _update_equipment(self, instance_id: int, **fields):
+        self.equipment[instance_id] = self.equipment[instance_id]._replace(updated_at=_now(), **fields)
+        return self.equipment[instance_id]
+
+    def _owned(self, user_id: int, equipment_id: int):
+        for e in self.equipment.values():
+            if e.user_id == user_id and e.equipment_id == equipment_id:
+                return e
+        return None
+
+    async def get_all_users(self):
+        await self._wait()
+        print(list(self.users.values()))
+
+    async def insert_user(self, id: int):
+        await self._wait()
+        return [self._user(id)]
+
+    async def get_user(self, id: int):
+        await self._wait()
+        return self._user(id)
+
+    async def update_user_exp(self, user_id: int, amount: int):
+        await self._wait()
+        return [self._update_user(user_id, exp=self._user(user_id).exp + amount)]
+
+    async def set_user_exp(self, user_id: int, amount: int):
+        await self._wait()
+        return [self._update_user(user_id, exp=amount)]
+
+    async def update_user_gold(self, user_id: int, amount: int):
+        await self._wait()
+        return [self._update_user(user_id, gold=self._user(user_id).gold + amount)]
+
+    async def set_user_gold(self, user_id: int, amount: int):
+        await self._wait()
+        return [self._update_user(user_id, gold=amount)]
+
+    async def update_user_blessings(self, user_id: int, amount: int):
+        await self._wait()
+        return [self._update_user(user_id, blessings=self._user(user_id).blessings + amount)]
+
+    async def update_user_cave(self, user_id: int, cave: str):
+        await self._wait()
+        return [self._update_user(user_id, cave=cave)]
+
+    async def get_top_users_for_exp(self, amount: int):
+        await self._wait()
+        return sorted(self.users.values(), key=lambda u: u.exp, reverse=True)[:amount]
+
+    async def get_top_users_for_exp_among(self, user_ids: list, amount: int):
+        await self._wait()
+        users = [self.users[user_id] for user_id in set(user_ids) if user_id in self.users]
+        return sorted(users, key=lambda u: u.exp, reverse=True)[:amount]
+
+    async def get_users_at_level(self, level: int, amount: int):
+        await self._wait()
+        users = [u for u in self.users.values() if u.level >= level]
+        return sorted(users, key=lambda u: u.exp, reverse=True)[:amount]
+
+    async def get_usernames(self, user_ids: list):
+        await self._wait()
+        return {user_id: self.usernames[user_id] for user_id in user_ids if user_id in self.usernames}
+
+    async def upsert_usernames(self, names: dict):
+        await self._wait()
+        for user_id, name in names.items():
+            self.usernames[user_id] = {'name': name, 'updated_at': _now()}
+
+    async def get_digest_channels(self):
+        await self._wait()
+        return dict(self.digest_channels)
+
+    async def set_digest_channel(self, guild_id: int, channel_id: int, window_seconds: int):
+        await self._wait()
+        self.digest_channels[channel_id] = {'guild_id': guild_id, 'window_seconds': window_seconds}
+
+    async def delete_digest_channel(self, channel_id: int):
+        await self._wait()
+        return self.digest_channels.pop(channel_id, None) is not None
+
+    async def get_guild_prefixes(self):
+        await self._wait()
+        return dict(self.guild_prefixes)
+
+    async def set_guild_prefix(self, guild_id: int, prefix: str):
+        await self._wait()
+        self.guild_prefixes[guild_id] = prefix
+
+    async def delete_guild_prefix(self, guild_id: int):
+        await self._wait()
+        self.guild_prefixes.pop(guild_id, None)
+
+    def _insert_equipment(self, user_id: int, equipment_id: int, location: str):
+        self._user(user_id)
+        instance_id = self.next_instance_id
+        self.next_instance_id += 1
+        self.equipment[instance_id] = EquipmentRow(instance_id, equipment_id, user_id, location, '', 0, _now())
+        return self.equipment[instance_id]
+
+    async def insert_equipment(self, user_id: int, equipment_id: int, location: str):
+        await self._wait()
+        return [self._insert_equipment(user_id, equipment_id, location)]
+
+    def _grant(self, user_id: int, equipment_id: int, max_stars: int, refund: int):
+        owned = self._owned(user_id, equipment_id)
+        if owned is None:
+            self._insert_equipment(user_id, equipment_id, 'inventory')
+            return (GrantOutcome.NEW, 0)
+        if owned.stars < max_stars:
+            return (GrantOutcome.STAR, self._update_equipment(owned.equipment_instance_id, stars=owned.stars + 1).stars)
+        self._update_user(user_id, gold=self._user(user_id).gold + refund)
+        return (GrantOutcome.REFUND, max_stars)
+
+    async def grant_equipment(self, user_id: int, equipment_id: int, max_stars: int, refund: int):
+        await self._wait()
+        return self._grant(user_id, equipment_id, max_stars, refund)
+
+    async def bulk_update_users(self, user_ids: list, column: str, amount: int):
+        if column not in ('gold', 'exp'):
+            raise ValueError(f'Cannot bulk update {column}.')
+        await self._wait()
+        created = 0
+        for user_id in set(user_ids):
+            created += user_id not in self.users
+            self._update_user(user_id, **{column: getattr(self._user(user_id), column) + amount})
+        return (len(set(user_ids)), created)
+
+    async def bulk_grant_equipment(self, user_ids: list, equipment_id: int, max_stars: int, refund: int):
+        await self._wait()
+        outcomes = {GrantOutcome.NEW: 0, GrantOutcome.STAR: 0, GrantOutcome.REFUND: 0}
+        for user_id in set(user_ids):
+            outcomes[self._grant(user_id, equipment_id, max_stars, refund)[0]] += 1
+        return outcomes
+
+    async def get_equipment_for_user(self, user_id: int):
+        await self._wait()
+        self._user(user_id)
+        return [e for e in self.equipment.values() if e.user_id == user_id]
+
+    async def get_equipped_equipment_for_users(self, user_ids: list):
+        await self._wait()
+        user_ids = set(user_ids)
+        return [e for e in self.equipment.values() if e.user_id in user_ids and e.location != 'inventory']
+
+    async def update_equipment_location(self, user_id: int, equipment_id: int, location: str):
+        await self._wait()
+        owned = self._owned(user_id, equipment_id)
+        return [self._update_equipment(owned.equipment_instance_id, location=location)] if owned else []
+
+    async def equip_equipment(self, user_id: int, equipment_id: int, location: str):
+        await self._wait()
+        owned = self._owned(user_id, equipment_id)
+        if owned is None:
+            return None
+        for e in list(self.equipment.values()):
+            if e.user_id == user_id and e.location == location and e is not owned:
+                self._update_equipment(e.equipment_instance_id, location='inventory')
+        self._update_equipment(owned.equipment_instance_id, location=location)
+        return [e for e in self.equipment.values() if e.user_id == user_id and e.location != 'inventory']
+
+    async def update_equipment_stars(self, user_id: int, equipment_id: int, amount: int):
+        await self._wait()
+        owned = self._owned(user_id, equipment_id)
+        return [self._update_equipment(owned.equipment_instance_id, stars=owned.stars + amount)] if owned else []
+
+    async def update_equipment_bonus(self, user_id: int, equipment_id: int, bonus: str):
+        await self._wait()
+        owned = self._owned(user_id, equipment_id)
+        return [self._update_equipment(owned.equipment_instance_id, bonus=bonus)] if owned else []
+
+    async def apply_equipment_bonus(self, user_id: int, equipment_id: int, bonus: str, cost: int):
+        await self._wait()
+        owned = self._owned(user_id, equipment_id)
+        if owned is None or self._user(user_id).gold < cost:
+            return None
+        self._update_user(user_id, gold=self._user(user_id).gold - cost)
+        return self._update_equipment(owned.equipment_instance_id, bonus=bonus)
+
+
+def install(memory_db: MemoryDB, module=dbutil):
+    '''
+        Replaces the functions of module (util.dbutil) that memory_db has. Returns a function that undoes it.
+    '''
+    replaced = {}
+    for name in dir(MemoryDB):
+        if name.startswith('_') or not hasattr(module, name):
+            continue
+        replaced[name] = getattr(module, name)
+        setattr(module, name, getattr(memory_db, name))
+
+    def restore():
+        for name, function in replaced.items():
+            setattr(module, name, function)
+    return restore
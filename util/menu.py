@@ -1,5 +1,6 @@
 from discord.ext import menus
 import discord
+from util.edits import edits
 
 
 class PageMenu(menus.Menu):
@@ -15,13 +16,24 @@ class PageMenu(menus.Menu):
         self.message_embed.set_footer(text=f'page {self.current_page + 1}/{len(self.pages)}')
         return await channel.send(embed=self.message_embed)
 
+    async def update_pages(self, pages):
+        '''
+            Replaces the pages and redraws the current page if the menu is still open.
+        '''
+        self.pages = pages
+        self.current_page = min(self.current_page, len(pages) - 1)
+        if self._running and self.message is not None:
+            self.message_embed.description = self.pages[self.current_page]
+            self.message_embed.set_footer(text=f'page {self.current_page + 1}/{len(self.pages)}')
+            edits.edit(self.message, embed=self.message_embed)
+
     @menus.button('◀')
     async def on_back(self, payload):
         if self.current_page > 0:
             self.current_page -= 1
             self.message_embed.description = self.pages[self.current_page]
             self.message_embed.set_footer(text=f'page {self.current_page + 1}/{len(self.pages)}')
-            await self.message.edit(embed=self.message_embed)
+            edits.edit(self.message, embed=self.message_embed)
 
     @menus.button('▶')
     async def on_next(self, payload):
@@ -29,7 +41,7 @@ class PageMenu(menus.Menu):
             self.current_page += 1
             self.message_embed.description = self.pages[self.current_page]
             self.message_embed.set_footer(text=f'page {self.current_page + 1}/{len(self.pages)}')
-            await self.message.edit(embed=self.message_embed)
+            edits.edit(self.message, embed=self.message_embed)
 
     @menus.button('🛑')
     async def on_stop(self, payload):
@@ -0,0 +1,81 @@
+'''
+    In-process counters, timings and gauges. Everything runs on the bot's event loop, so plain
+    dictionaries are enough. The owner ;metrics command prints a snapshot.
+'''
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+counters = Counter()
+timings = {}
+gauges = {}
+
+
+class Timing:
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+
+
+def increment(name: str, amount: int = 1):
+    counters[name] += amount
+
+
+def record_time(name: str, seconds: float):
+    timing = timings.get(name)
+    if timing is None:
+        timing = timings[name] = Timing()
+    timing.add(seconds)
+
+
+@contextmanager
+def timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_time(name, time.perf_counter() - start)
+
+
+def register_gauge(name: str, func):
+    '''
+        Registers a zero argument function whose value is read when a snapshot is taken.
+    '''
+    gauges[name] = func
+
+
+def snapshot(prefix: str = ''):
+    '''
+        Returns a list of formatted lines for every metric whose name starts with prefix.
+    '''
+    lines = []
+    for name, value in sorted(counters.items()):
+        if name.startswith(prefix):
+            lines.append(f'{name}: {value}')
+    for name, timing in sorted(timings.items()):
+        if name.startswith(prefix):
+            lines.append(
+                f'{name}: n={timing.count} avg={timing.average * 1000:.1f}ms '
+                f'max={timing.max * 1000:.1f}ms last={timing.last * 1000:.1f}ms')
+    for name, func in sorted(gauges.items()):
+        if name.startswith(prefix):
+            try:
+                lines.append(f'{name}: {func()}')
+            except Exception as exception:
+                lines.append(f'{name}: error [{exception}]')
+    return lines
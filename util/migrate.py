@@ -0,0 +1,152 @@
+'''
+    Applies the versioned schema migrations in migrations/ in order. Run on startup.
+
+    A migration is a file named <version>_<name>.sql. Every applied migration is recorded in the
+    schema_migrations table with the sha256 checksum of its file. A recorded migration whose file has
+    changed since is an error, because the database no longer matches the file. Add a new migration
+    instead of editing an applied one.
+
+    Each migration runs in its own transaction. An advisory lock keeps two processes that start at
+    the same time from applying the same migration twice.
+
+    Usage (from the repository root):
+        python -m util.migrate           Apply pending migrations
+        python -m util.migrate --status  List the migrations and whether they are applied
+'''
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import sys
+import asyncpg
+from util.dbutil import PSQL_CONNECTION_URL
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.sql$')
+# Key of the advisory lock held while migrating. Any constant shared by every process works.
+LOCK_KEY = 41_000_001
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    def __init__(self, version: int, name: str, sql: str):
+        self.version = version
+        self.name = name
+        self.sql = sql
+        self.checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+    def __str__(self):
+        return f'{self.version:04d}_{self.name}'
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR):
+    '''
+        Returns the migrations in directory ordered by version.
+    '''
+    migrations = {}
+    for file_name in os.listdir(directory):
+        match = MIGRATION_FILE.match(file_name)
+        if match is None:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f'Two migrations have version {version}: {migrations[version]} and {file_name}')
+        with open(os.path.join(directory, file_name), encoding='utf-8') as f:
+            migrations[version] = Migration(version, match.group(2), f.read())
+    return [migrations[version] for version in sorted(migrations)]
+
+
+async def get_applied(conn):
+    '''
+        Returns a dict of version to the schema_migrations row of every applied migration.
+    '''
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version integer PRIMARY KEY,
+            name text NOT NULL,
+            checksum text NOT NULL,
+            applied_at timestamptz NOT NULL DEFAULT now())""")
+    rows = await conn.fetch("SELECT version, name, checksum, applied_at FROM schema_migrations")
+    return {r['version']: r for r in rows}
+
+
+def verify_applied(migrations, applied):
+    by_version = {m.version: m for m in migrations}
+    for version, row in applied.items():
+        migration = by_version.get(version)
+        if migration is None:
+            raise MigrationError(f'Migration {version:04d}_{row["name"]} is applied but its file is missing.')
+        if migration.checksum != row['checksum']:
+            raise MigrationError(f'Migration {migration} changed after it was applied. Add a new migration instead.')
+
+
+async def migrate(dsn: str = None, directory: str = MIGRATIONS_DIR):
+    '''
+        Applies every pending migration. Raises MigrationError if an applied migration does not match its file.
+        Returns the list of migrations that were applied.
+    '''
+    migrations = load_migrations(directory)
+    conn = await asyncpg.connect(dsn or PSQL_CONNECTION_URL)
+    try:
+        await conn.execute('SELECT pg_advisory_lock($1)', LOCK_KEY)
+        applied = await get_applied(conn)
+        verify_applied(migrations, applied)
+        newly_applied = []
+        for migration in migrations:
+            if migration.version in applied:
+                continue
+            async with conn.transaction():
+                await conn.execute(migration.sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+                    migration.version,
+                    migration.name,
+                    migration.checksum)
+            print(f'Applied migration {migration}')
+            newly_applied.append(migration)
+        return newly_applied
+    finally:
+        await conn.close()
+
+
+async def status(dsn: str = None, directory: str = MIGRATIONS_DIR):
+    migrations = load_migrations(directory)
+    conn = await asyncpg.connect(dsn or PSQL_CONNECTION_URL)
+    try:
+        applied = await get_applied(conn)
+    finally:
+        await conn.close()
+    for migration in migrations:
+        row = applied.get(migration.version)
+        if row is None:
+            state = 'pending'
+        elif row['checksum'] != migration.checksum:
+            state = 'CHANGED since it was applied'
+        else:
+            state = f'applied {row["applied_at"]:%Y-%m-%d %H:%M:%S}'
+        print(f'{migration}: {state}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply the schema migrations.')
+    parser.add_argument('--status', action='store_true', help='List the migrations instead of applying them.')
+    args = parser.parse_args(argv)
+    loop = asyncio.get_event_loop()
+    try:
+        if args.status:
+            loop.run_until_complete(status())
+        else:
+            applied = loop.run_until_complete(migrate())
+            print(f'{len(applied)} migrations applied.')
+    except MigrationError as exception:
+        print(exception)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+'''
+    Resolves user ids to names for lists such as the leaderboard.
+
+    Names come from the client's user cache first, then from the usernames table, so a list renders
+    without waiting on Discord. Names that are unknown or older than REFRESH_AGE are fetched in the
+    background, at most FETCH_CONCURRENCY at a time, and written back to the table.
+'''
+import asyncio
+from datetime import datetime, timedelta
+import pytz
+import util.dbutil as db
+import util.metrics as metrics
+
+REFRESH_AGE = timedelta(days=7)
+FETCH_CONCURRENCY = 3
+UNKNOWN_NAME = 'Unknown'
+
+
+class NameResolver:
+    def __init__(self, client):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+        self.pending = {}
+        # Running writes of cached names, kept so their tasks are not collected before they finish.
+        self.stores = set()
+
+    async def resolve(self, user_ids):
+        '''
+            Returns (names, backfill). names maps every user id to a name, UNKNOWN_NAME if it is not known yet.
+            backfill is None, or a task that fetches the missing and stale names and returns them as a dict.
+        '''
+        stored = await db.get_usernames(user_ids)
+        now = datetime.now(pytz.utc)
+        names = {}
+        to_store = {}
+        to_fetch = []
+        for user_id in user_ids:
+            row = stored.get(user_id)
+            user = self.client.get_user(user_id)
+            if user is not None:
+                names[user_id] = str(user)
+                if row is None or row['name'] != names[user_id] or now - row['updated_at'] > REFRESH_AGE:
+                    to_store[user_id] = names[user_id]
+            elif row is not None:
+                names[user_id] = row['name']
+                if now - row['updated_at'] > REFRESH_AGE:
+                    to_fetch.append(user_id)
+            else:
+                names[user_id] = UNKNOWN_NAME
+                to_fetch.append(user_id)
+        metrics.increment('names.cache_hits', len(user_ids) - len(to_fetch))
+        metrics.increment('names.cache_misses', len(to_fetch))
+        if to_store:
+            store = asyncio.ensure_future(self._store(to_store))
+            self.stores.add(store)
+            store.add_done_callback(self.stores.discard)
+        backfill = asyncio.ensure_future(self._backfill(to_fetch)) if to_fetch else None
+        return names, backfill
+
+    async def _backfill(self, user_ids):
+        tasks = []
+        for user_id in user_ids:
+            task = self.pending.get(user_id)
+            if task is None:
+                task = self.pending[user_id] = asyncio.ensure_future(self._fetch(user_id))
+            tasks.append(task)
+        results = await asyncio.gather(*tasks)
+        fetched = {user_id: name for user_id, name in zip(user_ids, results) if name is not None}
+        if fetched:
+            await self._store(fetched)
+        return fetched
+
+    async def _store(self, names):
+        try:
+            await db.upsert_usernames(names)
+        except Exception as exception:
+            metrics.increment('names.store_failures')
+            print(f'{len(names)} names cannot be stored. [{exception}]')
+
+    async def _fetch(self, user_id):
+        try:
+            async with self.semaphore:
+                # fetch_user waits out rate limits itself. The semaphore keeps a cold leaderboard from
+                # queueing dozens of requests at once.
+                user = await self.client.fetch_user(user_id)
+            metrics.increment('names.fetches')
+            return str(user)
+        except Exception as exception:
+            metrics.increment('names.fetch_failures')
+            print(f'Name for {user_id} cannot be fetched. [{exception}]')
+            return None
+        finally:
+            self.pending.pop(user_id, None)
@@ -0,0 +1,76 @@
+'''
+    Per-guild command prefixes.
+
+    The prefixes of every guild are loaded into a dict at startup and updated together with the
+    guild_prefixes table when they change, so resolving a prefix never waits on the database.
+    The first characters of all prefixes are kept in a set, which lets on_message drop most
+    messages with one lookup before discord.py parses them.
+
+    A mention of the bot always works as a prefix too, so a guild whose prefix was forgotten or
+    cannot be typed can still reach ;prefix.
+'''
+from discord.ext import commands
+import util.dbutil as db
+
+MAX_PREFIX_LENGTH = 5
+# First character of a mention of the bot, <@id> or <@!id>.
+MENTION_START = '<'
+
+
+class PrefixMap:
+    def __init__(self, default: str):
+        self.default = default
+        # guild id -> prefix, only for guilds that do not use the default.
+        self.prefixes = {}
+        self.first_chars = frozenset([default[0], MENTION_START])
+
+    def __call__(self, bot, message):
+        '''
+            The command_prefix of the bot: the prefix of the guild, or a mention of the bot.
+        '''
+        if message.guild is None:
+            prefix = self.default
+        else:
+            prefix = self.prefixes.get(message.guild.id, self.default)
+        return commands.when_mentioned_or(prefix)(bot, message)
+
+    def get(self, guild_id: int):
+        return self.prefixes.get(guild_id, self.default)
+
+    def could_match(self, content: str):
+        '''
+            False if content cannot start with any prefix.
+        '''
+        return content[:1] in self.first_chars
+
+    def _update_first_chars(self):
+        self.first_chars = frozenset(
+            [self.default[0], MENTION_START] + [prefix[0] for prefix in self.prefixes.values()])
+
+    @staticmethod
+    def validate(prefix: str):
+        '''
+            Returns why prefix cannot be used, or None if it can.
+        '''
+        if not 0 < len(prefix) <= MAX_PREFIX_LENGTH:
+            return f'A prefix has 1 to {MAX_PREFIX_LENGTH} characters.'
+        if any(c.isspace() or c == '`' for c in prefix):
+            return 'A prefix cannot contain spaces or backticks.'
+        return None
+
+    async def load(self):
+        self.prefixes = await db.get_guild_prefixes()
+        self._update_first_chars()
+
+    async def set(self, guild_id: int, prefix: str):
+        if prefix == self.default:
+            await self.reset(guild_id)
+            return
+        await db.set_guild_prefix(guild_id, prefix)
+        self.prefixes[guild_id] = prefix
+        self._update_first_chars()
+
+    async def reset(self, guild_id: int):
+        await db.delete_guild_prefix(guild_id)
+        self.prefixes.pop(guild_id, None)
+        self._update_first_chars()
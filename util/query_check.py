@@ -0,0 +1,142 @@
+'''
+    Checks that every query in util/dbutil.py can run from an index. Meant for a local or CI database,
+    not production, since it applies the migrations first.
+
+    The queries are read from the source with ast, so new queries are checked without being listed
+    anywhere. Each one is prepared and explained with enable_seqscan off and plan_cache_mode set to
+    force_generic_plan. The planner then only picks a sequential scan when no index can serve the
+    query, whatever the size of the local tables or the parameter values. Sequential scans are reported
+    unless the function is in ALLOWED_SEQ_SCANS.
+
+    The SQL exp_to_level function is also compared with User.exp_to_level at every level threshold.
+
+    Usage (from the repository root):
+        python -m util.query_check
+'''
+import ast
+import asyncio
+import json
+import os
+import re
+import sys
+import asyncpg
+from data.user import User, MAX_STORED_LEVEL
+from util.dbutil import PSQL_CONNECTION_URL
+from util.migrate import migrate
+
+DBUTIL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dbutil.py')
+QUERY_METHODS = {'prepare', 'execute', 'fetch', 'fetchrow', 'fetchval'}
+# Functions that read whole tables on purpose.
+ALLOWED_SEQ_SCANS = {'get_all_users', 'get_digest_channels', 'get_guild_prefixes'}
+# Values for the names interpolated into f-string queries.
+SAMPLE_VALUES = {'column': 'gold'}
+
+
+def extract_queries(path: str = DBUTIL_PATH):
+    '''
+        Returns (function name, line number, sql) for every query string passed to a connection method in path.
+    '''
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    queries = []
+    for function in ast.walk(tree):
+        if not isinstance(function, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for node in ast.walk(function):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+                continue
+            if node.func.attr not in QUERY_METHODS or not node.args:
+                continue
+            sql = _render(node.args[0])
+            if sql is not None:
+                queries.append((function.name, node.lineno, sql))
+    return queries
+
+
+def _render(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif isinstance(value.value, ast.Name) and value.value.id in SAMPLE_VALUES:
+                parts.append(SAMPLE_VALUES[value.value.id])
+            else:
+                return None
+        return ''.join(parts)
+    return None
+
+
+def _seq_scans(plan):
+    scans = []
+    if plan.get('Node Type') == 'Seq Scan':
+        scans.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        scans.extend(_seq_scans(child))
+    return scans
+
+
+async def explain(conn, sql: str):
+    '''
+        Returns the generic plan of sql as a dict.
+    '''
+    parameters = max((int(n) for n in re.findall(r'\$(\d+)', sql)), default=0)
+    await conn.execute(f'PREPARE query_check AS {sql}')
+    try:
+        arguments = f'({", ".join(["NULL"] * parameters)})' if parameters else ''
+        result = await conn.fetchval(f'EXPLAIN (FORMAT JSON) EXECUTE query_check{arguments}')
+    finally:
+        await conn.execute('DEALLOCATE query_check')
+    return json.loads(result)[0]['Plan']
+
+
+async def check_level_function(conn):
+    thresholds = User.level_thresholds[:MAX_STORED_LEVEL]
+    exps = [0] + [exp for threshold in thresholds for exp in (threshold - 1, threshold)]
+    levels = await conn.fetchval('SELECT array_agg(exp_to_level(exp) ORDER BY n) FROM unnest($1::bigint[]) '
+                                 'WITH ORDINALITY AS e(exp, n)', exps)
+    return [
+        f'exp_to_level({exp}) is {level} in SQL but {User.exp_to_level(exp)} in Python'
+        for exp, level in zip(exps, levels) if level != User.exp_to_level(exp)]
+
+
+async def check(dsn: str = None):
+    '''
+        Returns a list of problems found.
+    '''
+    await migrate(dsn)
+    problems = []
+    conn = await asyncpg.connect(dsn or PSQL_CONNECTION_URL)
+    try:
+        async with conn.transaction():
+            await conn.execute('SET LOCAL enable_seqscan = off')
+            await conn.execute('SET LOCAL plan_cache_mode = force_generic_plan')
+            for function, line, sql in extract_queries():
+                try:
+                    async with conn.transaction():
+                        plan = await explain(conn, sql)
+                except asyncpg.PostgresError as exception:
+                    problems.append(f'{function} (dbutil.py:{line}): cannot be explained [{exception}]')
+                    continue
+                scans = _seq_scans(plan)
+                if scans and function not in ALLOWED_SEQ_SCANS:
+                    problems.append(f'{function} (dbutil.py:{line}): sequential scan of {", ".join(scans)}')
+                else:
+                    print(f'ok {function} (dbutil.py:{line})')
+            problems.extend(await check_level_function(conn))
+    finally:
+        await conn.close()
+    return problems
+
+
+def main():
+    problems = asyncio.get_event_loop().run_until_complete(check())
+    for problem in problems:
+        print(f'PROBLEM {problem}')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+'''
+    Opt-in recorder of the commands the bot runs, for replaying real traffic with util.replay.
+
+    Set RECORD_TRAFFIC to a directory to enable it. Every command becomes one event in an hourly
+    binary log, <directory>/traffic-<YYYYmmddHH>.bin (UTC). An event is a fixed size header
+    (EVENT struct: time, user, duration, outcome, name and argument lengths), then the command
+    name and the arguments as utf-8.
+
+    Events are anonymized. User ids are replaced by a keyed hash, and mentions and ids in the arguments by
+    placeholders. Commands with a member, user or role argument accept names as free text, so only the
+    shape of their arguments is kept: numbers stay, every other word becomes ARGUMENT_PLACEHOLDER.
+    Set RECORD_SALT to keep the same hash for a user across restarts; otherwise a
+    random key is used per process. Events are buffered and appended to the file in batches.
+'''
+import hashlib
+import os
+import re
+import struct
+import time
+from datetime import datetime
+import pytz
+import discord
+from discord.ext import commands
+
+MAGIC = b'ISLAREC1'
+# time (unix seconds), user hash, duration (microseconds), outcome, name length, arguments length
+EVENT = struct.Struct('<dQIBBH')
+FLUSH_BYTES = 64 * 1024
+FLUSH_SECONDS = 10
+MAX_ARGUMENTS = 1000
+USER_MENTION = re.compile(r'<@[!&]?\d+>')
+CHANNEL_MENTION = re.compile(r'<#\d+>')
+SNOWFLAKE = re.compile(r'\b\d{17,20}\b')
+NUMBER = re.compile(r'-?\d+(\.\d+)?')
+ARGUMENT_PLACEHOLDER = '_'
+# Converters that look up people, or roles, by any text such as a name.
+PERSON_TYPES = (discord.abc.User, discord.Role)
+
+
+class Outcome:
+    OK = 0
+    COOLDOWN = 1
+    CHECK_FAILED = 2
+    BAD_ARGUMENT = 3
+    ERROR = 4
+
+    names = {OK: 'ok', COOLDOWN: 'cooldown', CHECK_FAILED: 'check failed', BAD_ARGUMENT: 'bad argument', ERROR: 'error'}
+
+    @staticmethod
+    def from_error(error):
+        if error is None:
+            return Outcome.OK
+        if isinstance(error, commands.CommandOnCooldown):
+            return Outcome.COOLDOWN
+        if isinstance(error, commands.CheckFailure):
+            return Outcome.CHECK_FAILED
+        if isinstance(error, commands.UserInputError):
+            return Outcome.BAD_ARGUMENT
+        return Outcome.ERROR
+
+
+class Event:
+    __slots__ = ('time', 'user', 'duration', 'outcome', 'command', 'arguments')
+
+    def __init__(self, time: float, user: int, duration: float, outcome: int, command: str, arguments: str):
+        self.time = time
+        self.user = user
+        self.duration = duration
+        self.outcome = outcome
+        self.command = command
+        self.arguments = arguments
+
+
+def anonymize_arguments(arguments: str):
+    arguments = USER_MENTION.sub('@user', arguments)
+    arguments = CHANNEL_MENTION.sub('#channel', arguments)
+    return SNOWFLAKE.sub('0', arguments)[:MAX_ARGUMENTS]
+
+
+def argument_shape(arguments: str):
+    '''
+        Returns arguments with every word that is not a number replaced by ARGUMENT_PLACEHOLDER.
+    '''
+    return ' '.join(word if NUMBER.fullmatch(word) else ARGUMENT_PLACEHOLDER for word in arguments.split())
+
+
+def takes_people(command: commands.Command):
+    '''
+        Returns whether any argument of command is converted to a member, user or role.
+    '''
+    for parameter in command.clean_params.values():
+        annotation = parameter.annotation
+        for converter in getattr(annotation, '__args__', None) or (annotation,):
+            if isinstance(converter, type) and issubclass(converter, PERSON_TYPES):
+                return True
+    return False
+
+
+class TrafficRecorder:
+    def __init__(self, directory: str, salt: bytes = None):
+        self.directory = directory
+        self.key = hashlib.blake2b(salt).digest()[:32] if salt else os.urandom(32)
+        self.buffer = bytearray()
+        self.path = None
+        self.last_flush = time.monotonic()
+        # qualified command name -> whether only the shape of its arguments is recorded
+        self.shape_only = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def hash_user(self, user_id: int):
+        digest = hashlib.blake2b(str(user_id).encode(), key=self.key, digest_size=8).digest()
+        # 63 bits, so replayed users fit in a bigint column.
+        return int.from_bytes(digest, 'little') >> 1
+
+    def _path(self, timestamp: float):
+        hour = datetime.fromtimestamp(timestamp, pytz.utc).strftime('%Y%m%d%H')
+        return os.path.join(self.directory, f'traffic-{hour}.bin')
+
+    def record(self, timestamp: float, user_id: int, duration: float, outcome: int, command: str, arguments: str):
+        path = self._path(timestamp)
+        if path != self.path:
+            self.flush()
+            self.path = path
+        name = command.encode('utf-8')[:255]
+        args = anonymize_arguments(arguments).encode('utf-8')[:65535]
+        duration_us = min(int(duration * 1_000_000), 0xFFFFFFFF)
+        self.buffer += EVENT.pack(timestamp, self.hash_user(user_id), duration_us, outcome, len(name), len(args))
+        self.buffer += name
+        self.buffer += args
+        if len(self.buffer) >= FLUSH_BYTES or time.monotonic() - self.last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    def record_context(self, ctx, error=None):
+        '''
+            Records a finished command from its context. Call from on_command_completion and on_command_error.
+            ctx.recorded_at is the (time.time(), time.perf_counter()) the command started at, set in the
+            before_invoke hook. Commands that failed a check or a conversion never got there and are
+            recorded with a duration of 0.
+        '''
+        if ctx.command is None:
+            return
+        timestamp, start = getattr(ctx, 'recorded_at', None) or (time.time(), time.perf_counter())
+        arguments = ctx.message.content[len(ctx.prefix or '') + len(ctx.invoked_with or ''):].strip()
+        name = ctx.command.qualified_name
+        shape_only = self.shape_only.get(name)
+        if shape_only is None:
+            shape_only = self.shape_only[name] = takes_people(ctx.command)
+        if shape_only:
+            arguments = argument_shape(arguments)
+        self.record(
+            timestamp,
+            ctx.author.id,
+            time.perf_counter() - start,
+            Outcome.from_error(error),
+            name,
+            arguments)
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer or self.path is None:
+            return
+        with open(self.path, 'ab') as f:
+            if f.tell() == 0:
+                f.write(MAGIC)
+            f.write(self.buffer)
+        self.buffer.clear()
+
+
+def read_events(path: str):
+    '''
+        Yields the Events of a traffic file in order.
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path} is not a traffic file.')
+    offset = len(MAGIC)
+    while offset + EVENT.size <= len(data):
+        timestamp, user, duration_us, outcome, name_length, args_length = EVENT.unpack_from(data, offset)
+        offset += EVENT.size
+        name = data[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        arguments = data[offset:offset + args_length].decode('utf-8', errors='replace')
+        offset += args_length
+        yield Event(timestamp, user, duration_us / 1_000_000, outcome, name, arguments)
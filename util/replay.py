@@ -0,0 +1,242 @@
+'''
+    Replays recorded command traffic (see util.recorder) against the cogs, faster than real time,
+    and reports throughput and latency per command.
+
+    The cogs run unchanged on a bot that never connects to Discord, with util.dbutil swapped for
+    the in-memory util.memory_db. Sent messages, reactions and edits go nowhere. Monster challenges
+    time out at once, as if ignored, and confirmation prompts are accepted. Commands are started at
+    their recorded offsets divided by the speed, so bursts keep their shape, and each runs as its
+    own task like on the real bot. Every replay starts from an empty database.
+
+    Cooldowns still run on the wall clock, so at higher speeds more mines end on cooldown than were
+    recorded. The report shows the recorded and the replayed outcomes side by side.
+
+    Usage (from the repository root):
+        python -m util.replay traffic/traffic-2021050123.bin --speed 10
+        python -m util.replay traffic/*.bin --speed 100 --db-latency 2
+'''
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter, defaultdict
+import discord
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+from data.catalog import pin_catalog
+from util.memory_db import MemoryDB, install
+from util.menu import PageMenu, ConfirmationMenu
+from util.recorder import Outcome, read_events
+from util.scheduler import Scheduler
+
+PREFIX = ';'
+EXTENSIONS = ['cogs.mining', 'cogs.shop', 'cogs.admin', 'cogs.help']
+MIN_SPEED = 1
+MAX_SPEED = 100
+
+
+class ReplayUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = f'user{user_id % 100000}'
+        self.discriminator = '0000'
+        self.bot = False
+        self.mention = f'<@{user_id}>'
+
+    def __str__(self):
+        return f'{self.name}#{self.discriminator}'
+
+
+class ReplayMessage:
+    def __init__(self, channel, author, content: str = ''):
+        self.id = id(self)
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.guild = None
+        self._state = None
+
+    async def edit(self, **fields):
+        pass
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def delete(self):
+        pass
+
+
+class ReplayChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.mention = f'<#{channel_id}>'
+        self.sent = 0
+
+    async def send(self, content=None, **fields):
+        self.sent += 1
+        return ReplayMessage(self, None, content or '')
+
+
+class ReplayContext(commands.Context):
+    async def send(self, content=None, **fields):
+        return await self.channel.send(content, **fields)
+
+
+class ReplayBot(commands.Bot):
+    '''
+        A bot that is never logged in. Waiting for a reaction times out at once.
+    '''
+
+    async def wait_for(self, event, *, check=None, timeout=None):
+        await asyncio.sleep(0)
+        raise asyncio.TimeoutError()
+
+    async def fetch_user(self, user_id):
+        return ReplayUser(user_id)
+
+
+async def _page_menu_start(self, ctx, *, channel=None, wait=False):
+    self.message = await ctx.send(embed=None)
+
+
+async def _confirmation_prompt(self, ctx):
+    await ctx.send(embed=self.message_embed)
+    return True
+
+
+def create_bot():
+    bot = ReplayBot(command_prefix=PREFIX, intents=discord.Intents.default())
+    bot.remove_command('help')
+    bot.scheduler = Scheduler()
+    bot.member_cache = None
+
+    @bot.check
+    async def pin_catalog_check(ctx):
+        pin_catalog()
+        return True
+
+    async def ignore_error(ctx, error):
+        pass
+    # Any on_command_error listener stops the default handler from printing every expected error.
+    bot.add_listener(ignore_error, 'on_command_error')
+    PageMenu.start = _page_menu_start
+    ConfirmationMenu.prompt = _confirmation_prompt
+    for extension in EXTENSIONS:
+        bot.load_extension(extension)
+    return bot
+
+
+class Result:
+    __slots__ = ('command', 'recorded', 'outcome', 'latency', 'lateness')
+
+    def __init__(self, command, recorded, outcome, latency, lateness):
+        self.command = command
+        self.recorded = recorded
+        self.outcome = outcome
+        self.latency = latency
+        self.lateness = lateness
+
+
+async def run_event(bot, channel, event, lateness: float):
+    author = ReplayUser(event.user)
+    message = ReplayMessage(channel, author, f'{PREFIX}{event.command} {event.arguments}'.strip())
+    view = StringView(message.content)
+    view.skip_string(PREFIX)
+    invoked_with = view.get_word()
+    ctx = ReplayContext(prefix=PREFIX, view=view, bot=bot, message=message)
+    ctx.invoked_with = invoked_with
+    ctx.command = bot.all_commands.get(invoked_with)
+    start = time.perf_counter()
+    outcome = Outcome.OK
+    if ctx.command is None:
+        outcome = Outcome.BAD_ARGUMENT
+    else:
+        try:
+            if not await bot.can_run(ctx, call_once=True):
+                raise commands.CheckFailure('The global check once functions failed.')
+            await ctx.command.invoke(ctx)
+        except commands.CommandError as error:
+            outcome = Outcome.from_error(error)
+            await ctx.command.dispatch_error(ctx, error)
+        except Exception as exception:
+            outcome = Outcome.ERROR
+            print(f'{event.command} {event.arguments} failed. [{exception!r}]')
+    return Result(event.command, event.outcome, outcome, time.perf_counter() - start, lateness)
+
+
+async def replay(paths, speed: float, db_latency: float = 0.0, limit: int = None):
+    '''
+        Replays the events of the traffic files in paths at speed times real time. Returns (results, seconds, db).
+    '''
+    events = sorted((event for path in paths for event in read_events(path)), key=lambda e: e.time)
+    if limit:
+        events = events[:limit]
+    db = MemoryDB(db_latency)
+    restore = install(db)
+    try:
+        bot = create_bot()
+        channel = ReplayChannel(1)
+        loop = asyncio.get_event_loop()
+        tasks = []
+        start = loop.time()
+        for event in events:
+            due = start + (event.time - events[0].time) / speed
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(run_event(bot, channel, event, max(loop.time() - due, 0.0))))
+        results = await asyncio.gather(*tasks)
+        seconds = loop.time() - start
+    finally:
+        restore()
+    return results, seconds, db
+
+
+def _percentile(values, fraction: float):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def report(results, seconds: float, speed: float, db: MemoryDB):
+    if not results:
+        print('No events to replay.')
+        return
+    print(f'Replayed {len(results)} commands at {speed:g}x in {seconds:.1f}s: '
+          f'{len(results) / max(seconds, 1e-9):.1f} commands/s, {db.calls} database calls, '
+          f'max start lateness {max(r.lateness for r in results) * 1000:.1f} ms')
+    by_command = defaultdict(list)
+    for result in results:
+        by_command[result.command].append(result)
+    print(f'{"command":<16}{"count":>7}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"max ms":>9}  '
+          'outcomes (recorded -> replayed)')
+    for command, command_results in sorted(by_command.items(), key=lambda pair: -len(pair[1])):
+        latencies = sorted(r.latency * 1000 for r in command_results)
+        recorded = Counter(Outcome.names[r.recorded] for r in command_results)
+        replayed = Counter(Outcome.names[r.outcome] for r in command_results)
+        outcomes = ', '.join(
+            f'{name} {recorded[name]} -> {replayed[name]}' for name in sorted(set(recorded) | set(replayed)))
+        print(f'{command:<16}{len(latencies):>7}{_percentile(latencies, 0.5):>9.2f}{_percentile(latencies, 0.95):>9.2f}'
+              f'{_percentile(latencies, 0.99):>9.2f}{latencies[-1]:>9.2f}  {outcomes}')
+
+
+def speed_type(value: str):
+    speed = float(value)
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        raise argparse.ArgumentTypeError(f'speed must be between {MIN_SPEED} and {MAX_SPEED}')
+    return speed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay recorded command traffic against the cogs.')
+    parser.add_argument('paths', nargs='+', help='Traffic files written by util.recorder.')
+    parser.add_argument('--speed', type=speed_type, default=1.0, help='Times real time, 1 to 100.')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='Milliseconds added to every database call.')
+    parser.add_argument('--limit', type=int, help='Only replay the first LIMIT events.')
+    args = parser.parse_args(argv)
+    loop = asyncio.get_event_loop()
+    results, seconds, db = loop.run_until_complete(replay(args.paths, args.speed, args.db_latency / 1000, args.limit))
+    report(results, seconds, args.speed, db)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
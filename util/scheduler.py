@@ -0,0 +1,120 @@
+'''
+    Runs periodic game tasks on the bot's event loop.
+
+    Jobs are either periodic (every n seconds) or cron-like (at a minute of some or all hours, UTC).
+    Each run can be delayed by a random jitter. A job that is still running when it is due again is
+    skipped instead of overlapping. Runs, failures, skips and durations are recorded in util.metrics.
+'''
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+import pytz
+import util.metrics as metrics
+
+
+class Job:
+    def __init__(self, name, func, interval=None, minute=None, hours=None, jitter=0.0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.minute = minute
+        self.hours = set(hours) if hours else None
+        self.jitter = jitter
+        self.running = False
+        self.next_run = None
+        self.last_run = None
+
+    def schedule_next(self, now: datetime):
+        if self.interval is not None:
+            next_run = now + timedelta(seconds=self.interval)
+        else:
+            next_run = now.replace(minute=self.minute, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(hours=1)
+            while self.hours and next_run.hour not in self.hours:
+                next_run += timedelta(hours=1)
+        if self.jitter:
+            next_run += timedelta(seconds=random.uniform(0, self.jitter))
+        self.next_run = next_run
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = {}
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    @staticmethod
+    def now():
+        return datetime.now(pytz.utc)
+
+    def _add(self, job: Job, run_now: bool):
+        job.schedule_next(self.now())
+        if run_now:
+            job.next_run = self.now()
+        self.jobs[job.name] = job
+        self._wakeup.set()
+        return job
+
+    def every(self, name: str, seconds: float, func, jitter: float = 0.0, run_now: bool = False):
+        '''
+            Runs the coroutine function func every seconds seconds. Replaces any job with the same name.
+        '''
+        return self._add(Job(name, func, interval=seconds, jitter=jitter), run_now)
+
+    def cron(self, name: str, func, minute: int = 0, hours=None, jitter: float = 0.0, run_now: bool = False):
+        '''
+            Runs the coroutine function func at minute past every hour in hours (UTC), or every hour if hours is None.
+            Replaces any job with the same name.
+        '''
+        return self._add(Job(name, func, minute=minute, hours=hours, jitter=jitter), run_now)
+
+    def remove(self, name: str):
+        self.jobs.pop(name, None)
+
+    def next_run(self, name: str):
+        job = self.jobs.get(name)
+        return job.next_run if job else None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = self.now()
+            for job in list(self.jobs.values()):
+                if job.next_run <= now:
+                    job.schedule_next(now)
+                    if job.running:
+                        metrics.increment(f'scheduler.{job.name}.skipped')
+                    else:
+                        asyncio.ensure_future(self._run_job(job))
+            delay = 60.0
+            if self.jobs:
+                delay = min(delay, min((job.next_run - self.now()).total_seconds() for job in self.jobs.values()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job: Job):
+        job.running = True
+        start = time.perf_counter()
+        try:
+            await job.func()
+            metrics.increment(f'scheduler.{job.name}.runs')
+        except Exception as exception:
+            metrics.increment(f'scheduler.{job.name}.failures')
+            print(f'Scheduled job {job.name} failed. [{exception}]')
+        finally:
+            job.running = False
+            job.last_run = self.now()
+            metrics.record_time(f'scheduler.{job.name}', time.perf_counter() - start)
@@ -0,0 +1,48 @@
+'''
+    Per user locks so the state changing parts of a user's commands run one at a time.
+
+    A lock only exists while a command holds or waits for it, so memory is bounded by the number of
+    users with a command in flight. Commands of different users never wait on each other.
+    Wait times are recorded in util.metrics as user_locks.wait, and waits that were not immediate
+    are counted as user_locks.contended.
+'''
+import asyncio
+import time
+from contextlib import asynccontextmanager
+import util.metrics as metrics
+
+
+class UserLocks:
+    def __init__(self):
+        # user id -> [lock, number of holders and waiters]
+        self.locks = {}
+
+    @asynccontextmanager
+    async def hold(self, user_id: int):
+        entry = self.locks.get(user_id)
+        if entry is None:
+            entry = self.locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            if entry[0].locked():
+                metrics.increment('user_locks.contended')
+                start = time.perf_counter()
+                await entry[0].acquire()
+                metrics.record_time('user_locks.wait', time.perf_counter() - start)
+            else:
+                await entry[0].acquire()
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[user_id]
+
+    def __len__(self):
+        return len(self.locks)
+
+
+user_locks = UserLocks()
+metrics.register_gauge('user_locks.active', lambda: len(user_locks))
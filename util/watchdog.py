@@ -0,0 +1,115 @@
+'''
+    Detects stalls of the event loop.
+
+    The gateway, the cogs, logging and rendering all share one event loop, so anything that blocks it
+    delays heartbeats until the gateway disconnects. A daemon thread schedules a probe on the loop every
+    PROBE_INTERVAL seconds. The probe records how late it ran as the watchdog.lag timing. When a probe has
+    not run after the threshold, the thread captures the stack of the loop thread and the command running
+    in the current task, while the loop is still blocked, and logs them as one JSON line. It logs again
+    with the total duration once the loop is back, and the stall is counted in watchdog.stalls.
+
+    Metrics are only touched from the loop, in the probe, so they need no locking.
+'''
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+import util.metrics as metrics
+
+STALL_THRESHOLD = 0.5
+PROBE_INTERVAL = 0.1
+# Innermost frames kept in a report.
+MAX_FRAMES = 40
+
+log = logging.getLogger('watchdog')
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = STALL_THRESHOLD, interval: float = PROBE_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.loop = None
+        self.loop_thread_id = None
+        # task -> qualified name of the command it runs. Read from the watchdog thread.
+        self.commands = weakref.WeakKeyDictionary()
+        self._answered = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, loop=None):
+        '''
+            Starts watching loop, by default the current one. Call from the loop's thread. Does nothing if
+            already started, so it is safe in on_ready.
+        '''
+        if self._thread is not None:
+            return
+        self.loop = loop or asyncio.get_event_loop()
+        self.loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._answered.set()
+        self._thread = None
+
+    def command_started(self, ctx):
+        task = asyncio.current_task()
+        if task is not None and ctx.command is not None:
+            self.commands[task] = ctx.command.qualified_name
+
+    def command_finished(self, ctx):
+        task = asyncio.current_task()
+        if task is not None:
+            self.commands.pop(task, None)
+
+    def _probe(self, sent: float):
+        lag = time.monotonic() - sent
+        metrics.record_time('watchdog.lag', lag)
+        if lag >= self.threshold:
+            metrics.increment('watchdog.stalls')
+        self._answered.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            sent = time.monotonic()
+            self._answered.clear()
+            try:
+                self.loop.call_soon_threadsafe(self._probe, sent)
+            except RuntimeError:
+                # The loop is closed.
+                return
+            if not self._answered.wait(self.threshold):
+                report = self.capture(time.monotonic() - sent)
+                log.warning(json.dumps(report))
+                where = report['stack'][-1] if report['stack'] else 'an unknown frame'
+                print(f'Event loop blocked for over {self.threshold:.2f}s in '
+                      f'{report["command"] or report["task"] or "no task"} at {where}')
+                self._answered.wait()
+                if self._stopped.is_set():
+                    return
+                duration = time.monotonic() - sent
+                log.warning(json.dumps({'event': 'loop_stall_end', 'duration': round(duration, 3)}))
+                print(f'Event loop was blocked for {duration:.2f}s')
+            self._stopped.wait(self.interval)
+
+    def capture(self, blocked_for: float):
+        '''
+            Returns a report of what the loop thread is doing right now. Runs on the watchdog thread.
+        '''
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = traceback.extract_stack(frame)[-MAX_FRAMES:] if frame is not None else []
+        task = asyncio.current_task(self.loop)
+        return {
+            'event': 'loop_stall',
+            'blocked_for': round(blocked_for, 3),
+            'threshold': self.threshold,
+            'task': task.get_name() if task is not None else None,
+            'command': self.commands.get(task) if task is not None else None,
+            'stack': [f'{f.filename}:{f.lineno} in {f.name}' for f in stack],
+        }